@@ -1,62 +1,103 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import analytics_cache
 from app.core.database import get_db
-from app.services.ai_analysis_service import AIAnalysisService
+from app.services.ai_analysis_service import AIAnalysisService, STANDARD_INSIGHT_PROMPTS
 from pydantic import BaseModel
+from typing import Any, Dict, Optional
 
 router = APIRouter()
 
 class AIAnalysisRequest(BaseModel):
     query: str
     context: str = ""
+    dataset_id: int
 
 class AIAnalysisResponse(BaseModel):
     query: str
     analysis: str
     insights: list = []
+    plan: Optional[Dict[str, Any]] = None
+    plan_source: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
 
 @router.post("/analyze", response_model=AIAnalysisResponse)
 async def analyze_financial_data(
     request: AIAnalysisRequest,
     db: AsyncSession = Depends(get_db)
 ):
-    """Analyze financial data using AI"""
+    """Answer a natural-language question with figures computed from the dataset"""
+    from app.services.query_service import QueryService
+
     try:
-        # For now, return a mock response since OpenAI integration needs API key
-        mock_analysis = f"Analysis for query: '{request.query}'"
-        mock_insights = [
-            "Revenue trends show positive growth",
-            "Expense optimization opportunities identified",
-            "Cash flow analysis indicates healthy liquidity"
+        answer = await QueryService(db).answer(request.dataset_id, request.query)
+        plan = answer["plan"]
+        insights = [
+            f"{row['group']}: {row['value']:,}" if row.get("change_pct") is None
+            else f"{row['group']}: {row['value']:,} ({row['change_pct']:+.1f}%)"
+            for row in answer["rows"][:5]
+            if plan["group_by"] != "none" and row["value"] is not None
         ]
+        if "expenses" in plan["metrics"]:
+            from app.services.budget_service import BudgetService
+
+            # expense findings come from the dataset's budget variance
+            insights.extend(await BudgetService(db).expense_insights(request.dataset_id))
         
         return AIAnalysisResponse(
             query=request.query,
-            analysis=mock_analysis,
-            insights=mock_insights
+            analysis=answer["answer"],
+            insights=insights,
+            plan=plan,
+            plan_source=answer["plan_source"],
+            result={key: value for key, value in answer.items() if key not in ("question", "plan", "plan_source", "answer")}
         )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/insights")
 async def get_predefined_insights():
     """Get predefined financial insights"""
-    return {
-        "insights": [
-            {
-                "title": "Revenue Analysis",
-                "description": "Analyze revenue trends and patterns",
-                "query": "What are the revenue trends over the last 12 months?"
-            },
-            {
-                "title": "Expense Breakdown",
-                "description": "Break down expenses by category",
-                "query": "Show me the expense breakdown by category"
-            },
-            {
-                "title": "Profit Margins",
-                "description": "Calculate and analyze profit margins",
-                "query": "What are the profit margins for each product line?"
-            }
-        ]
-    }
+    return {"insights": STANDARD_INSIGHT_PROMPTS}
+
+@router.get("/insights/{dataset_id}")
+async def get_dataset_insights(dataset_id: int):
+    """Get the precomputed answers to the predefined insights for a dataset"""
+    try:
+        insights = []
+        for insight in STANDARD_INSIGHT_PROMPTS:
+            result = await analytics_cache.get(dataset_id, "insight", query=insight["query"])
+            insights.append({**insight, "result": result, "ready": result is not None})
+        return {"dataset_id": dataset_id, "insights": insights}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/history")
+async def get_analysis_history(
+    user_id: int,
+    dataset_id: Optional[int] = None,
+    analysis_type: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+    cursor: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """List a user's saved analyses (summary and scores only); pass next_cursor as cursor for the next page"""
+    try:
+        return await AIAnalysisService(db).get_analysis_history(user_id, dataset_id, analysis_type, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/history/{analysis_id}")
+async def get_analysis(analysis_id: int, user_id: int, db: AsyncSession = Depends(get_db)):
+    """Get one of a user's saved analyses with its full result"""
+    try:
+        analysis = await AIAnalysisService(db).get_analysis(analysis_id, user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return analysis
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, AsyncSessionLocal
+from app.core.metrics import timer
+from app.services.chunked_upload_service import ChunkedUploadService, UploadNotFoundError
 from pydantic import BaseModel
-import pandas as pd
+from typing import Optional
 import io
 
 router = APIRouter()
@@ -11,13 +14,28 @@ class UploadResponse(BaseModel):
     message: str
     filename: str
     records_processed: int
+    new_records: Optional[int] = None
+    duplicate_records: Optional[int] = None
+    categorized_by_rules: Optional[int] = None
+    categorized_by_model: Optional[int] = None
+
+class ChunkedUploadCreate(BaseModel):
+    filename: str
+    total_size: int
+    dataset_id: int
+    chunk_size: Optional[int] = None
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_financial_data(
     file: UploadFile = File(...),
+    dataset_id: Optional[int] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """Upload and process financial data file"""
+    # pandas is loaded by the first upload rather than at worker start
+    import pandas as pd
+    from app.services.ingestion_service import IngestionService
+
     try:
         if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
             raise HTTPException(
@@ -27,12 +45,18 @@ async def upload_financial_data(
         
         # Read file content
         content = await file.read()
+        if len(content) > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File exceeds {settings.MAX_FILE_SIZE} bytes; use the chunked upload API"
+            )
         
         # Process based on file type
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        else:
-            df = pd.read_excel(io.BytesIO(content))
+        with timer("upload_parse"):
+            if file.filename.endswith('.csv'):
+                df = pd.read_csv(io.StringIO(content.decode('utf-8')))
+            else:
+                df = pd.read_excel(io.BytesIO(content))
         
         # Basic validation
         if df.empty:
@@ -40,15 +64,30 @@ async def upload_financial_data(
         
         records_count = len(df)
         
-        # For now, just return success without actually saving to DB
-        # In full implementation, this would process and save the data
+        # Without a target dataset the file is only validated
+        if dataset_id is None:
+            return UploadResponse(
+                message="File uploaded and processed successfully",
+                filename=file.filename,
+                records_processed=records_count
+            )
+        
+        stats = await IngestionService(db).ingest_dataframe(dataset_id, df)
         
         return UploadResponse(
             message="File uploaded and processed successfully",
             filename=file.filename,
-            records_processed=records_count
+            records_processed=stats.successful_records,
+            new_records=stats.new_records,
+            duplicate_records=stats.duplicate_records,
+            categorized_by_rules=stats.categorized_by_rules,
+            categorized_by_model=stats.categorized_by_model
         )
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
@@ -58,5 +97,131 @@ async def get_upload_status():
     return {
         "status": "ready",
         "supported_formats": ["CSV", "Excel (.xlsx, .xls)"],
-        "max_file_size": "10MB"
+        "max_file_size": f"{settings.MAX_FILE_SIZE // (1024 * 1024)}MB",
+        "chunked_upload": {
+            "max_file_size": f"{settings.MAX_CHUNKED_UPLOAD_SIZE // (1024 * 1024)}MB",
+            "default_chunk_size": settings.UPLOAD_CHUNK_SIZE
+        }
     }
+
+@router.post("/fx-rates")
+async def upload_fx_rates(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """Import exchange rates from a CSV with date, base, quote (or pair) and rate columns"""
+    import pandas as pd
+    from app.services.fx_service import FxService, parse_rates_frame
+
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Rates must be uploaded as CSV")
+    try:
+        frame = parse_rates_frame(pd.read_csv(io.BytesIO(await file.read())))
+        if frame.empty:
+            raise HTTPException(status_code=400, detail="File contains no valid rates")
+        imported = await FxService(db).import_rates(frame)
+        return {
+            "message": "Exchange rates imported successfully",
+            "filename": file.filename,
+            "rates_imported": imported,
+            "pairs": sorted({f"{base}/{quote}" for base, quote in zip(frame["base"], frame["quote"])})
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing rates: {str(e)}")
+
+@router.post("/budgets")
+async def upload_budgets(
+    dataset_id: int,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """Import budget lines from a CSV or Excel file with period, category, planned amount and optional type columns"""
+    import pandas as pd
+    from app.services.budget_service import BudgetService
+
+    if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Only CSV and Excel files are supported")
+    try:
+        content = await file.read()
+        if len(content) > settings.MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail=f"File exceeds {settings.MAX_FILE_SIZE} bytes")
+        with timer("upload_parse"):
+            if file.filename.endswith('.csv'):
+                df = pd.read_csv(io.BytesIO(content))
+            else:
+                df = pd.read_excel(io.BytesIO(content))
+        if df.empty:
+            raise HTTPException(status_code=400, detail="File is empty")
+        stats = await BudgetService(db).load_budget_frame(dataset_id, df)
+        if not stats["budget_lines"]:
+            raise HTTPException(status_code=400, detail="File contains no valid budget lines")
+        return {"message": "Budgets imported successfully", "filename": file.filename, **stats}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing budgets: {str(e)}")
+
+async def _advance_chunked_ingestion(upload_id: str):
+    """Background step: parse newly completed prefix chunks with a fresh session"""
+    async with AsyncSessionLocal() as db:
+        await ChunkedUploadService(db).advance_ingestion(upload_id)
+
+@router.post("/uploads")
+async def initiate_chunked_upload(
+    request: ChunkedUploadCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """Start a resumable chunked upload"""
+    try:
+        return await ChunkedUploadService(db).initiate(
+            filename=request.filename,
+            total_size=request.total_size,
+            dataset_id=request.dataset_id,
+            chunk_size=request.chunk_size
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/uploads/{upload_id}/chunks/{index}")
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
+):
+    """Store one numbered chunk; parsing of the received prefix continues in the background"""
+    try:
+        status = await ChunkedUploadService(db).write_chunk(upload_id, index, request.stream())
+    except UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    background_tasks.add_task(_advance_chunked_ingestion, upload_id)
+    return status
+
+@router.get("/uploads/{upload_id}")
+async def get_chunked_upload_status(upload_id: str, db: AsyncSession = Depends(get_db)):
+    """Report received chunk ranges so an interrupted client can resume"""
+    try:
+        return await ChunkedUploadService(db).get_status(upload_id)
+    except UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_chunked_upload(upload_id: str, db: AsyncSession = Depends(get_db)):
+    """Finish ingestion of a fully received upload"""
+    try:
+        return await ChunkedUploadService(db).finalize(upload_id)
+    except UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing upload: {str(e)}")
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+from app.core.config import settings
+from app.core.events import ALL_DATASETS, dataset_channel, event_bus
+
+router = APIRouter()
+
+
+def _channel(dataset_id: Optional[int]) -> str:
+    return dataset_channel(dataset_id) if dataset_id is not None else ALL_DATASETS
+
+
+@router.get("/stream")
+async def stream_events(request: Request, dataset_id: Optional[int] = None):
+    """Server-sent events for one dataset, or for every dataset when none is given"""
+
+    async def generate():
+        async with event_bus.subscribe(_channel(dataset_id)) as queue:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=settings.EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.websocket("/ws")
+async def websocket_events(websocket: WebSocket, dataset_id: Optional[int] = None):
+    """The same events as /stream over a WebSocket; messages from the client are ignored"""
+    await websocket.accept()
+    async with event_bus.subscribe(_channel(dataset_id)) as queue:
+        disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+        try:
+            while True:
+                next_message = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait({next_message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    next_message.cancel()
+                    break
+                await websocket.send_text(next_message.result())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            disconnected.cancel()
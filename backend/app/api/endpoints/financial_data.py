@@ -1,34 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
-from app.core.database import get_db
+from sqlalchemy import select, func
+from typing import List, Optional
+from datetime import date, datetime
+import csv
+import io
+from app.core.database import get_db, get_read_db
+from app.core.etag import collection_etag, dataset_etag
+from app.core.money import FxRateNotFoundError, normalize_currency, to_decimal, to_number
+from app.core.responses import ORJSONResponse, rows_response
 from app.models.financial_models import FinancialRecord, FinancialDataset
-from app.schemas.financial_schemas import FinancialRecordResponse, FinancialDatasetResponse
+from app.schemas.financial_schemas import FinancialRecordResponse, FinancialDatasetResponse, DataSummary, KPIMetricResponse, DatasetScoreResponse, CategoryRuleCreate, CategoryRuleResponse
+from app.services.financial_data_service import FinancialDataService
+from app.services.search_service import SearchService
+from app.services.precompute_service import cached_summary, cached_analysis, cached_budget_variance, cached_forecast, cached_period_analytics
 
 router = APIRouter()
 
-@router.get("/records", response_model=List[FinancialRecordResponse])
+# Rows fetched per round trip when streaming an export
+EXPORT_BATCH_SIZE = 5000
+
+# Columns of FinancialRecordResponse, selected directly for the listing fast path;
+# amount_minor is turned into ``amount`` by _record_rows
+RECORD_COLUMNS = [
+    FinancialRecord.id,
+    FinancialRecord.dataset_id,
+    FinancialRecord.date,
+    FinancialRecord.category,
+    FinancialRecord.amount_minor,
+    FinancialRecord.currency,
+    FinancialRecord.description,
+    FinancialRecord.record_type
+]
+
+def _reporting_currency(currency: Optional[str]) -> Optional[str]:
+    """Validate the optional ``currency`` query parameter of the analytics routes"""
+    if currency is None:
+        return None
+    try:
+        return normalize_currency(currency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _record_rows(rows):
+    for row in rows:
+        record = dict(row)
+        record["amount"] = to_number(record.pop("amount_minor"), record["currency"])
+        yield record
+
+@router.get("/records", response_model=List[FinancialRecordResponse], dependencies=[Depends(collection_etag)])
 async def get_financial_records(
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get financial records with pagination"""
     try:
         result = await db.execute(
-            select(FinancialRecord).offset(skip).limit(limit)
+            select(*RECORD_COLUMNS).offset(skip).limit(limit)
         )
-        records = result.scalars().all()
-        return records
+        return rows_response(_record_rows(result.mappings()))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/datasets", response_model=List[FinancialDatasetResponse])
+@router.get("/datasets", response_model=List[FinancialDatasetResponse], dependencies=[Depends(collection_etag)])
 async def get_datasets(
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get financial datasets with pagination"""
     try:
@@ -40,18 +80,18 @@ async def get_datasets(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/analytics/summary")
-async def get_analytics_summary(db: AsyncSession = Depends(get_db)):
+@router.get("/analytics/summary", dependencies=[Depends(collection_etag)])
+async def get_analytics_summary(db: AsyncSession = Depends(get_read_db)):
     """Get basic analytics summary"""
     try:
         # Get total records count
-        records_result = await db.execute(select(FinancialRecord))
-        total_records = len(records_result.scalars().all())
-        
+        records_result = await db.execute(select(func.count(FinancialRecord.id)))
+        total_records = records_result.scalar()
+
         # Get datasets count
-        datasets_result = await db.execute(select(FinancialDataset))
-        total_datasets = len(datasets_result.scalars().all())
-        
+        datasets_result = await db.execute(select(func.count(FinancialDataset.id)))
+        total_datasets = datasets_result.scalar()
+
         return {
             "total_records": total_records,
             "total_datasets": total_datasets,
@@ -59,3 +99,314 @@ async def get_analytics_summary(db: AsyncSession = Depends(get_db)):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/records", response_model=List[FinancialRecordResponse], dependencies=[Depends(dataset_etag)])
+async def get_dataset_records(
+    dataset_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    category: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Get a dataset's records with optional category and date filters"""
+    try:
+        service = FinancialDataService(db, read_db)
+        rows = await service.get_financial_record_rows(
+            dataset_id, RECORD_COLUMNS, skip, limit, category, date_from, date_to
+        )
+        return rows_response(_record_rows(rows))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/search", dependencies=[Depends(dataset_etag)])
+async def search_dataset_records(
+    dataset_id: int,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in descriptions and categories"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Search a dataset's records by description and category; ranked, with prefix and typo matching"""
+    try:
+        return ORJSONResponse(await SearchService(read_db).search(dataset_id, q, skip, limit, date_from, date_to))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/summary", response_model=DataSummary, dependencies=[Depends(dataset_etag)])
+async def get_dataset_summary(
+    dataset_id: int,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    currency: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Get revenue, expense and profit totals for a dataset, optionally converted to a reporting currency"""
+    currency = _reporting_currency(currency)
+    try:
+        return await cached_summary(FinancialDataService(db, read_db), dataset_id, date_from, date_to, currency)
+    except FxRateNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/revenue", dependencies=[Depends(dataset_etag)])
+async def get_dataset_revenue_analysis(
+    dataset_id: int,
+    period: str = "monthly",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    currency: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Get revenue by category and revenue trends for a dataset"""
+    currency = _reporting_currency(currency)
+    try:
+        # returned as a Response so FastAPI skips jsonable_encoder on the large trend lists
+        return ORJSONResponse(await cached_analysis(
+            FinancialDataService(db, read_db), "revenue", dataset_id, period, date_from, date_to, currency
+        ))
+    except FxRateNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/expenses", dependencies=[Depends(dataset_etag)])
+async def get_dataset_expense_analysis(
+    dataset_id: int,
+    period: str = "monthly",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    currency: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Get expenses by category and expense trends for a dataset"""
+    currency = _reporting_currency(currency)
+    try:
+        # returned as a Response so FastAPI skips jsonable_encoder on the large trend lists
+        return ORJSONResponse(await cached_analysis(
+            FinancialDataService(db, read_db), "expenses", dataset_id, period, date_from, date_to, currency
+        ))
+    except FxRateNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/profit", dependencies=[Depends(dataset_etag)])
+async def get_dataset_profit_analysis(
+    dataset_id: int,
+    period: str = "monthly",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    currency: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Get profit trends and margins for a dataset"""
+    currency = _reporting_currency(currency)
+    try:
+        # returned as a Response so FastAPI skips jsonable_encoder on the large trend lists
+        return ORJSONResponse(await cached_analysis(
+            FinancialDataService(db, read_db), "profit", dataset_id, period, date_from, date_to, currency
+        ))
+    except FxRateNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/periods", dependencies=[Depends(dataset_etag)])
+async def get_dataset_period_analytics(
+    dataset_id: int,
+    window: int = Query(3, ge=1, le=24, description="Months in the rolling sum and moving average"),
+    record_type: Optional[str] = None,
+    category: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Get monthly rolling sums, moving averages, MoM/QoQ/YoY changes and YTD per category"""
+    try:
+        return ORJSONResponse(await cached_period_analytics(
+            read_db, dataset_id, window, record_type, category, date_from, date_to
+        ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/forecast", dependencies=[Depends(dataset_etag)])
+async def get_dataset_forecast(
+    dataset_id: int,
+    horizon: int = Query(6, ge=1, le=36, description="Months to simulate"),
+    simulations: Optional[int] = Query(None, ge=100, le=100000, description="Monte Carlo paths"),
+    method: str = Query("bootstrap", pattern="^(bootstrap|normal)$"),
+    seed: Optional[int] = Query(None, ge=0),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Get Monte Carlo percentile bands for revenue, expenses, profit and cash position"""
+    try:
+        return ORJSONResponse(await cached_forecast(read_db, dataset_id, horizon, simulations, method, seed))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/budget-variance")
+async def get_dataset_budget_variance(
+    dataset_id: int,
+    as_of: Optional[date] = Query(None, description="Day burn-to-date is measured at (default today)"),
+    period_from: Optional[date] = None,
+    period_to: Optional[date] = None,
+    category: Optional[str] = None,
+    record_type: Optional[str] = None,
+    alerts_only: bool = False,
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Get budget vs actual, variance, % variance and burn-to-date per category and month, with alert status"""
+    try:
+        return ORJSONResponse(await cached_budget_variance(
+            read_db, dataset_id, as_of, period_from, period_to, category, record_type, alerts_only
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/fx/currencies")
+async def get_reporting_currencies(db: AsyncSession = Depends(get_read_db)):
+    """Currencies the analytics routes can report in: those in the FX rate table"""
+    from app.services.fx_service import FxService
+
+    try:
+        return {"currencies": await FxService(db).available_currencies()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/category-rules", response_model=List[CategoryRuleResponse])
+async def get_category_rules(
+    owner_id: int,
+    dataset_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """List an owner's categorization rules (those applying to a dataset when given), highest priority first"""
+    from app.services.categorization_service import CategorizationService
+
+    try:
+        return await CategorizationService(db).list_rules(owner_id, dataset_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/category-rules", response_model=CategoryRuleResponse)
+async def create_category_rule(rule: CategoryRuleCreate, db: AsyncSession = Depends(get_db)):
+    """Add a rule that categorizes uncategorized uploaded rows by description, type or amount"""
+    from app.services.categorization_service import CategorizationService
+
+    try:
+        return await CategorizationService(db).create_rule(rule)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/category-rules/{rule_id}")
+async def delete_category_rule(rule_id: int, owner_id: int, db: AsyncSession = Depends(get_db)):
+    """Delete one of an owner's categorization rules"""
+    from app.services.categorization_service import CategorizationService
+
+    try:
+        deleted = await CategorizationService(db).delete_rule(rule_id, owner_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return {"deleted": rule_id}
+
+@router.get("/scores/leaderboard", response_model=List[DatasetScoreResponse])
+async def get_score_leaderboard(
+    order_by: str = Query("health", pattern="^(health|risk)$"),
+    limit: int = Query(50, ge=1, le=1000),
+    scored_on: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Datasets ranked by their latest (or a given day's) batch health or risk score"""
+    # NumPy-backed; loaded by the first scoring request rather than at worker start
+    from app.services.scoring_service import ScoringService
+
+    try:
+        return await ScoringService(db).leaderboard(order_by, limit, scored_on)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/scores", response_model=List[DatasetScoreResponse])
+async def get_dataset_score_history(
+    dataset_id: int,
+    limit: int = Query(90, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Daily health and risk score history of a dataset, newest first"""
+    from app.services.scoring_service import ScoringService
+
+    try:
+        return await ScoringService(db).history(dataset_id, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/kpis", response_model=List[KPIMetricResponse], dependencies=[Depends(dataset_etag)])
+async def get_dataset_kpis(
+    dataset_id: int,
+    metric_type: Optional[str] = None,
+    period_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """Get stored KPI metrics for a dataset"""
+    try:
+        return await FinancialDataService(db, read_db).get_kpi_metrics(dataset_id, metric_type, period_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/datasets/{dataset_id}/export", dependencies=[Depends(dataset_etag)])
+async def export_dataset_records(dataset_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Stream a dataset's records as CSV without loading them all into memory"""
+    columns = [
+        FinancialRecord.id,
+        FinancialRecord.date,
+        FinancialRecord.record_type,
+        FinancialRecord.category,
+        FinancialRecord.amount_minor,
+        FinancialRecord.currency,
+        FinancialRecord.description
+    ]
+
+    async def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["id", "date", "record_type", "category", "amount", "currency", "description"])
+        result = await db.stream(
+            select(*columns)
+            .where(FinancialRecord.dataset_id == dataset_id)
+            .order_by(FinancialRecord.date, FinancialRecord.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions(EXPORT_BATCH_SIZE):
+            writer.writerows(
+                (id_, date, record_type, category, to_decimal(amount_minor, currency), currency, description)
+                for id_, date, record_type, category, amount_minor, currency, description in rows
+            )
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=dataset_{dataset_id}.csv"}
+    )
@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+from app.core.config import settings
+from app.core.database import get_read_db
+from app.core.etag import portfolio_etag
+from app.core.money import DEFAULT_CURRENCY, FxRateNotFoundError, normalize_currency
+from app.core.responses import ORJSONResponse, streamed_object_response
+
+router = APIRouter()
+
+
+async def _portfolio_section(
+    section: str,
+    dataset_ids: Optional[List[int]],
+    owner_id: Optional[int],
+    currency: str,
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    db: AsyncSession
+):
+    """
+    Build one portfolio section. Portfolios above PORTFOLIO_STREAM_THRESHOLD
+    datasets are streamed entry by entry; the JSON document is the same.
+    """
+    if not dataset_ids and owner_id is None:
+        raise HTTPException(status_code=400, detail="Pass dataset_ids or owner_id")
+    try:
+        currency = normalize_currency(currency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # pandas-backed; loaded by the first portfolio request rather than at worker start
+    from app.services.portfolio_service import PortfolioService
+
+    try:
+        head, entries = await PortfolioService(db).section(section, currency, dataset_ids, owner_id, date_from, date_to)
+    except FxRateNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if head["dataset_count"] > settings.PORTFOLIO_STREAM_THRESHOLD:
+        return streamed_object_response(head, "datasets", entries)
+    return ORJSONResponse({**head, "datasets": list(entries)})
+
+
+@router.get("/summary", dependencies=[Depends(portfolio_etag)])
+async def get_portfolio_summary(
+    dataset_ids: Optional[List[int]] = Query(None),
+    owner_id: Optional[int] = None,
+    currency: str = DEFAULT_CURRENCY,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Revenue, expense and profit totals across datasets, with each dataset's own totals"""
+    return await _portfolio_section("summary", dataset_ids, owner_id, currency, date_from, date_to, db)
+
+
+@router.get("/categories", dependencies=[Depends(portfolio_etag)])
+async def get_portfolio_categories(
+    dataset_ids: Optional[List[int]] = Query(None),
+    owner_id: Optional[int] = None,
+    currency: str = DEFAULT_CURRENCY,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Revenue and expenses by category across datasets, with each dataset's breakdown"""
+    return await _portfolio_section("categories", dataset_ids, owner_id, currency, date_from, date_to, db)
+
+
+@router.get("/trends", dependencies=[Depends(portfolio_etag)])
+async def get_portfolio_trends(
+    dataset_ids: Optional[List[int]] = Query(None),
+    owner_id: Optional[int] = None,
+    currency: str = DEFAULT_CURRENCY,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Monthly revenue, expense and profit across datasets, with each dataset's trend"""
+    return await _portfolio_section("trends", dataset_ids, owner_id, currency, date_from, date_to, db)
+
+
+@router.get("/forecast", dependencies=[Depends(portfolio_etag)])
+async def get_portfolio_forecast(
+    dataset_ids: Optional[List[int]] = Query(None),
+    owner_id: Optional[int] = None,
+    currency: str = DEFAULT_CURRENCY,
+    horizon: int = Query(6, ge=1, le=36, description="Months to simulate"),
+    simulations: Optional[int] = Query(None, ge=100, le=100000, description="Monte Carlo paths"),
+    method: str = Query("bootstrap", pattern="^(bootstrap|normal)$"),
+    seed: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Monte Carlo cash-flow scenarios for the combined portfolio and for each dataset"""
+    if not dataset_ids and owner_id is None:
+        raise HTTPException(status_code=400, detail="Pass dataset_ids or owner_id")
+    try:
+        currency = normalize_currency(currency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    from app.services.simulation_service import SimulationService
+
+    try:
+        return ORJSONResponse(await SimulationService(db).portfolio_forecast(
+            currency, dataset_ids, owner_id, horizon, simulations, method, seed
+        ))
+    except FxRateNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
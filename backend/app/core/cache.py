@@ -0,0 +1,123 @@
+"""
+Analytics cache with in-memory and Redis backends.
+
+Entries are namespaced by a per-dataset generation number. Writing records
+bumps the generation, which orphans every cached result for that dataset
+at once without having to enumerate keys; orphans expire through the TTL.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+import json
+import time
+
+from app.core.config import settings
+
+# Generation scope shared by every result converted with FX rates; bumped on rate imports
+FX_SCOPE = "fx"
+# Generation scope of compiled category rules; bumped when rules change
+CATEGORY_RULES_SCOPE = "category_rules"
+
+
+class MemoryCacheBackend:
+    """Process-local TTL cache for single-node deployments and tests"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, str]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    async def incr(self, key: str) -> int:
+        current = int(await self.get(key) or 0) + 1
+        # generation counters must outlive the entries they namespace
+        self._data[key] = (float("inf"), str(current))
+        return current
+
+    async def close(self) -> None:
+        self._data.clear()
+
+
+class RedisCacheBackend:
+    """Shared cache for multi-worker deployments"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        await self._client.set(key, value, ex=ttl)
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+class AnalyticsCache:
+    def __init__(self, backend, ttl: int = settings.ANALYTICS_CACHE_TTL, prefix: str = "analytics"):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def generation(self, scope: Union[int, str]) -> str:
+        """Current generation of a dataset id, or of a shared scope such as FX rates"""
+        return await self.backend.get(f"{self.prefix}:gen:{scope}") or "0"
+
+    async def _key(self, dataset_id: int, name: str, params: Dict[str, Any]) -> str:
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        return f"{self.prefix}:{dataset_id}:{await self.generation(dataset_id)}:{name}:{encoded}"
+
+    async def get(self, dataset_id: int, name: str, **params) -> Optional[Any]:
+        value = await self.backend.get(await self._key(dataset_id, name, params))
+        return json.loads(value) if value is not None else None
+
+    async def set(self, dataset_id: int, name: str, value: Any, **params) -> None:
+        await self.backend.set(await self._key(dataset_id, name, params), json.dumps(value, default=str), self.ttl)
+
+    async def get_or_compute(
+        self,
+        dataset_id: int,
+        name: str,
+        compute: Callable[[], Awaitable[Any]],
+        **params
+    ) -> Any:
+        """Return the cached value or compute, store and return it"""
+        key = await self._key(dataset_id, name, params)
+        cached = await self.backend.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        value = await compute()
+        await self.backend.set(key, json.dumps(value, default=str), self.ttl)
+        return value
+
+    async def invalidate(self, scope: Union[int, str]) -> None:
+        await self.backend.incr(f"{self.prefix}:gen:{scope}")
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def _create_backend():
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCacheBackend(settings.REDIS_URL)
+    return MemoryCacheBackend()
+
+
+analytics_cache = AnalyticsCache(_create_backend())
+# Query plans by normalised question: not tied to any dataset, and kept longer than results
+plan_cache = AnalyticsCache(analytics_cache.backend, ttl=settings.QUERY_PLAN_CACHE_TTL, prefix="query_plans")
@@ -0,0 +1,86 @@
+"""
+Celery application for the worker and beat services in docker-compose.yml.
+
+Every job registered in app.core.scheduler becomes a ``jobs.<name>`` task,
+and periodic jobs are added to the beat schedule.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from app.core.config import settings
+from app.core.scheduler import load_jobs, periodic_jobs, run_job
+
+logger = logging.getLogger(__name__)
+
+app = Celery("financial_analyzer", broker=settings.REDIS_URL, backend=settings.REDIS_URL)
+app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
+
+# One event loop per worker process. The engine pools, the Redis cache and
+# event clients and the OpenAI client are module-level and bind to the loop
+# they were first used on, so every task must run on the same one.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _worker_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+@worker_process_init.connect
+def _init_worker_process(**_):
+    from app.core.database import async_engine
+
+    # connections inherited from the parent must not be shared with it after the fork
+    async_engine.sync_engine.dispose(close=False)
+    _worker_loop()
+    if settings.EVENT_BACKEND != "redis":
+        logger.warning("EVENT_BACKEND=%s: events published by jobs will not reach API subscribers", settings.EVENT_BACKEND)
+
+
+async def _close_clients() -> None:
+    from app.core.cache import analytics_cache
+    from app.core.database import async_engine, session_router
+    from app.core.events import event_bus
+    from app.services.ai_analysis_service import close_openai_client
+
+    await close_openai_client()
+    await analytics_cache.close()
+    await event_bus.close()
+    await session_router.dispose()
+    await async_engine.dispose()
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process(**_):
+    if _loop is not None and not _loop.is_closed():
+        _loop.run_until_complete(_close_clients())
+        _loop.close()
+
+
+def _make_task(name: str):
+    def task(**kwargs):
+        return _worker_loop().run_until_complete(run_job(name, **kwargs))
+    task.__name__ = name
+    return app.task(name=f"jobs.{name}")(task)
+
+
+for _name in load_jobs():
+    _make_task(_name)
+
+app.conf.beat_schedule = {
+    name: {"task": f"jobs.{name}", "schedule": entry["every_seconds"], "kwargs": entry["kwargs"]}
+    for name, entry in periodic_jobs().items()
+}
@@ -0,0 +1,70 @@
+"""
+Response compression with Brotli when available and GZip otherwise.
+
+Responses under COMPRESSION_MINIMUM_SIZE bytes and server-sent event
+streams are sent as-is. Brotli is used only if the ``brotli`` package is
+installed and the client accepts ``br``; at the low quality levels used
+here it compresses JSON better than gzip for about the same CPU.
+"""
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+class _BrotliWriter:
+    """File-like shim so GZipResponder's buffering drives a Brotli stream"""
+
+    def __init__(self, buffer, quality: int):
+        self.buffer = buffer
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def write(self, data: bytes) -> None:
+        self.buffer.write(self.compressor.process(data))
+        # flush so each streamed chunk can be decoded as it arrives
+        self.buffer.write(self.compressor.flush())
+
+    def close(self) -> None:
+        self.buffer.write(self.compressor.finish())
+
+
+class BrotliResponder(GZipResponder):
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int) -> None:
+        super().__init__(app, minimum_size)
+        self.gzip_file = _BrotliWriter(self.gzip_buffer, quality)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async def send_as_brotli(message: Message) -> None:
+            if message["type"] == "http.response.start" and not self.content_encoding_set:
+                headers = MutableHeaders(raw=message["headers"])
+                if headers.get("content-encoding") == "gzip":
+                    headers["Content-Encoding"] = "br"
+            await send(message)
+
+        self.send = send_as_brotli
+        await self.app(scope, receive, self.send_with_gzip)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # event streams must reach the client chunk by chunk, which the buffering responders prevent
+        if scope["type"] == "http" and "text/event-stream" not in Headers(scope=scope).get("accept", ""):
+            accept = Headers(scope=scope).get("accept-encoding", "")
+            if brotli is not None and "br" in accept:
+                await BrotliResponder(self.app, self.minimum_size, self.brotli_quality)(scope, receive, send)
+                return
+            if "gzip" in accept:
+                await GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
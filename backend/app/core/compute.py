@@ -0,0 +1,52 @@
+"""
+Process pool for CPU-bound NumPy work.
+
+Long vectorized runs (Monte Carlo simulations over many datasets) would
+hold the GIL for their whole duration if run on the event loop's threads.
+They are shipped to a shared pool of COMPUTE_WORKERS processes instead,
+started on first use. Workers are spawned rather than forked, so they do
+not inherit the event loop, database connections or open sockets; the
+callables and their arguments must be picklable module-level objects.
+With COMPUTE_WORKERS=0 the work runs in threads.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+from app.core.config import settings
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """The shared pool, or None when COMPUTE_WORKERS is 0"""
+    global _pool
+    if settings.COMPUTE_WORKERS <= 0:
+        return None
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.COMPUTE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+async def run_in_process(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    pool = get_process_pool()
+    if pool is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(pool, partial(func, *args, **kwargs))
+
+
+async def map_in_processes(func: Callable[..., Any], calls: Iterable[Sequence[Any]]) -> List[Any]:
+    """func(*args) for each args tuple, spread over the pool; results in call order"""
+    return list(await asyncio.gather(*(run_in_process(func, *args) for args in calls)))
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,120 @@
+"""
+Conditional GET for analytics and listing endpoints.
+
+Every dataset carries a version that is bumped whenever its records, or
+the rollups and KPIs derived from them, change. The dependencies here
+look that version up, derive a strong ETag for the requested
+representation (path plus query string) and answer a matching
+If-None-Match with 304 before the endpoint runs any query of its own.
+ETagMiddleware puts the tag on successful responses, including the
+Response objects that routes return directly.
+"""
+
+from typing import Optional
+import hashlib
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.cache import FX_SCOPE, analytics_cache
+from app.core.database import get_read_db
+from app.models.financial_models import FinancialDataset
+
+# Clients may store the response but must revalidate it on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(request: Request, version_token: str) -> str:
+    query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+    digest = hashlib.blake2b(
+        f"{request.url.path}?{query}|{version_token}".encode(), digest_size=12
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+
+def _conditional(request: Request, version_token: str) -> str:
+    etag = make_etag(request, version_token)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    request.state.etag = etag
+    return etag
+
+
+async def dataset_etag(request: Request, dataset_id: int, db: AsyncSession = Depends(get_read_db)) -> Optional[str]:
+    """
+    Version check for routes scoped to one dataset.
+
+    The version is read from the same session the route reads its data
+    from, so a lagging replica can only produce an older tag, never a
+    newer tag on older data. Unknown datasets get no tag.
+    """
+    version = await db.scalar(select(FinancialDataset.version).where(FinancialDataset.id == dataset_id))
+    if version is None:
+        return None
+    token = f"dataset:{dataset_id}:{version}"
+    if "currency" in request.query_params:
+        # reporting-currency views also change when FX rates are imported
+        token += f":fx:{await analytics_cache.generation(FX_SCOPE)}"
+    return _conditional(request, token)
+
+
+async def _collection_token(db: AsyncSession) -> str:
+    count, last_id, versions = (await db.execute(
+        select(
+            func.count(FinancialDataset.id),
+            func.max(FinancialDataset.id),
+            func.coalesce(func.sum(FinancialDataset.version), 0)
+        )
+    )).one()
+    return f"datasets:{count}:{last_id}:{versions}"
+
+
+async def collection_etag(request: Request, db: AsyncSession = Depends(get_read_db)) -> str:
+    """
+    Version check for routes spanning all datasets.
+
+    Record writes raise the version sum, new datasets raise the highest
+    id and deletes lower the count.
+    """
+    return _conditional(request, await _collection_token(db))
+
+
+async def portfolio_etag(request: Request, db: AsyncSession = Depends(get_read_db)) -> str:
+    """collection_etag for cross-dataset routes, which also depend on FX rates"""
+    token = await _collection_token(db)
+    return _conditional(request, f"{token}:fx:{await analytics_cache.generation(FX_SCOPE)}")
+
+
+class ETagMiddleware:
+    """Adds the ETag chosen by a route's version dependency to its 2xx response"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_etag(message: Message) -> None:
+            if message["type"] == "http.response.start" and 200 <= message["status"] < 300:
+                etag = scope.get("state", {}).get("etag")
+                if etag:
+                    headers = MutableHeaders(scope=message)
+                    headers.setdefault("ETag", etag)
+                    headers.setdefault("Cache-Control", CACHE_CONTROL)
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
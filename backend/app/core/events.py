@@ -0,0 +1,147 @@
+"""
+Live update events with in-process and Redis pub/sub backends.
+
+Writers publish compact delta events (what changed and the new totals)
+instead of clients re-polling the analytics endpoints. Each event goes to
+its dataset's channel and to the ``datasets`` channel that dashboards
+spanning every dataset listen on. WebSocket and SSE endpoints live in
+api/endpoints/events.py.
+"""
+
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional, Set
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.core.responses import dumps
+
+logger = logging.getLogger(__name__)
+
+ALL_DATASETS = "datasets"
+
+# Events buffered per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def dataset_channel(dataset_id: int) -> str:
+    return f"dataset:{dataset_id}"
+
+
+class MemoryEventBackend:
+    """Fans events out to subscribers in this process"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    async def publish(self, channel: str, message: str) -> None:
+        self.deliver(channel, message)
+
+    def deliver(self, channel: str, message: str) -> None:
+        for queue in list(self._subscribers.get(channel, ())):
+            if queue.full():
+                # a slow client loses its oldest event rather than holding up writers
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[channel].add(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[channel]
+
+    async def close(self) -> None:
+        self._subscribers.clear()
+
+
+class RedisEventBackend(MemoryEventBackend):
+    """
+    Publishes through Redis so subscribers on every worker see every event.
+
+    Each process holds a single pattern subscription, started with its
+    first local subscriber, and fans messages out to its own queues.
+    """
+
+    def __init__(self, url: str, prefix: str = "events"):
+        import redis.asyncio as redis
+
+        super().__init__()
+        self._client = redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._listener: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self._client.publish(f"{self._prefix}:{channel}", message)
+
+    async def subscribe(self, channel: str) -> asyncio.Queue:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        return await super().subscribe(channel)
+
+    async def _listen(self) -> None:
+        pubsub = self._client.pubsub()
+        await pubsub.psubscribe(f"{self._prefix}:*")
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "pmessage":
+                    self.deliver(message["channel"][len(self._prefix) + 1:], message["data"])
+        finally:
+            await pubsub.close()
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+        await self._client.close()
+        await super().close()
+
+
+class EventBus:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def publish(self, event_type: str, dataset_id: int, **data) -> None:
+        """
+        Publish an event for a dataset. Live updates are best effort: a
+        failed publish is logged as a warning and never fails the write
+        that caused it.
+        """
+        message = dumps({
+            "type": event_type,
+            "dataset_id": dataset_id,
+            "at": datetime.now(timezone.utc),
+            **data
+        }).decode()
+        try:
+            for channel in (dataset_channel(dataset_id), ALL_DATASETS):
+                await self.backend.publish(channel, message)
+        except Exception:
+            logger.warning("Publishing %s for dataset %s failed", event_type, dataset_id, exc_info=True)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        """Queue of JSON-encoded events on a channel, for the duration of the block"""
+        queue = await self.backend.subscribe(channel)
+        try:
+            yield queue
+        finally:
+            self.backend.unsubscribe(channel, queue)
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def _create_backend():
+    if settings.EVENT_BACKEND == "redis":
+        return RedisEventBackend(settings.REDIS_URL)
+    return MemoryEventBackend()
+
+
+event_bus = EventBus(_create_backend())
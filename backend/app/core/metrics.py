@@ -0,0 +1,292 @@
+"""
+Request instrumentation exported in the Prometheus text format.
+
+- InstrumentationMiddleware records per-route latency and attaches the
+  request's query count and DB time as response headers.
+- instrument_engine hooks SQLAlchemy cursor events so every statement is
+  counted against the request that issued it.
+- timed() wraps hot paths (OpenAI calls, upload parsing, pandas work) in an
+  operation latency histogram.
+- ``?profile=1`` (when PROFILING_ENABLED) returns a profile of one request,
+  using pyinstrument if it is installed and cProfile otherwise.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import cProfile
+import functools
+import inspect
+import io
+import pstats
+import threading
+import time
+
+from sqlalchemy import event
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, PlainTextResponse, Response
+
+from app.core.config import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelValues, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            series["sum"] += value
+            series["count"] += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bucket_labels = self.labelnames + ("le",)
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series["buckets"]):
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + (bound,))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + ('+Inf',))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route, method and status", ("method", "route", "status")
+)
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+request_queries = registry.histogram(
+    "http_request_db_queries", "Database statements issued per request", ("route",), QUERY_COUNT_BUCKETS
+)
+request_db_time = registry.histogram(
+    "http_request_db_seconds", "Time spent in database statements per request", ("route",)
+)
+db_queries = registry.counter("db_queries_total", "Database statements executed", ("engine",))
+db_query_latency = registry.histogram("db_query_duration_seconds", "Database statement latency", ("engine",))
+operation_latency = registry.histogram(
+    "operation_duration_seconds", "Latency of instrumented hot-path operations", ("operation",)
+)
+
+
+class RequestStats:
+    """Per-request accumulator, shared through a context variable"""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Count statements and DB time on an (async) engine's cursor events"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_queries.inc(engine=name)
+        db_query_latency.observe(elapsed, engine=name)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+
+@contextmanager
+def timer(operation: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        operation_latency.observe(time.perf_counter() - started, operation=operation)
+
+
+def timed(operation: str):
+    """Decorator recording a sync or async function's latency under ``operation``"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(operation):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _route_label(request: Request) -> str:
+    # the route template keeps label cardinality bounded (no raw ids)
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+async def _profile_request(request: Request, call_next) -> Response:
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        await call_next(request)
+        profiler.stop()
+        return HTMLResponse(profiler.output_html())
+
+    # cProfile cannot follow a single coroutine, so concurrent requests on the
+    # same loop show up in the output too; run it against an idle server
+    profiler = cProfile.Profile()
+    profiler.enable()
+    await call_next(request)
+    profiler.disable()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(60)
+    return PlainTextResponse(output.getvalue())
+
+
+class InstrumentationMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next) -> Response:
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            if settings.PROFILING_ENABLED and request.query_params.get("profile") == "1":
+                response = await _profile_request(request, call_next)
+            else:
+                response = await call_next(request)
+        finally:
+            _request_stats.reset(token)
+
+        elapsed = time.perf_counter() - started
+        route = _route_label(request)
+        http_requests.inc(method=request.method, route=route, status=response.status_code)
+        http_latency.observe(elapsed, method=request.method, route=route)
+        request_queries.observe(stats.queries, route=route)
+        request_db_time.observe(stats.db_seconds, route=route)
+
+        response.headers["X-DB-Query-Count"] = str(stats.queries)
+        response.headers["Server-Timing"] = f"db;dur={stats.db_seconds * 1000:.2f}, total;dur={elapsed * 1000:.2f}"
+        return response
+
+
+def render_pool_metrics(pool_snapshot: Dict[str, Dict[str, Any]], replicas: List[Dict[str, Any]]) -> str:
+    """Render the connection pool and replica status in the exposition format"""
+    lines = [
+        "# HELP db_pool_checked_out Connections currently checked out",
+        "# TYPE db_pool_checked_out gauge",
+    ]
+    for name, pool in pool_snapshot.items():
+        lines.append(f'db_pool_checked_out{{pool="{name}"}} {pool["checked_out"] or 0}')
+    lines += [
+        "# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection",
+        "# TYPE db_pool_checkout_wait_seconds histogram",
+    ]
+    for name, pool in pool_snapshot.items():
+        for bound, count in pool["checkout_wait_buckets"].items():
+            lines.append(f'db_pool_checkout_wait_seconds_bucket{{pool="{name}",le="{bound}"}} {count}')
+        lines.append(f'db_pool_checkout_wait_seconds_bucket{{pool="{name}",le="+Inf"}} {pool["checkout_wait_count"]}')
+        lines.append(f'db_pool_checkout_wait_seconds_sum{{pool="{name}"}} {pool["checkout_wait_seconds_sum"]}')
+        lines.append(f'db_pool_checkout_wait_seconds_count{{pool="{name}"}} {pool["checkout_wait_count"]}')
+    lines += [
+        "# HELP db_replica_lag_seconds Replication lag observed at the last check",
+        "# TYPE db_replica_lag_seconds gauge",
+    ]
+    for replica in replicas:
+        if replica.get("lag_seconds") is not None:
+            lines.append(f'db_replica_lag_seconds{{replica="{replica["name"]}"}} {replica["lag_seconds"]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,96 @@
+"""
+Money as integer minor units.
+
+Amounts are stored and aggregated as whole numbers of the currency's minor
+unit (cents for USD) next to an ISO 4217 code. Every aggregation path is
+then exact: SUM over a BIGINT column, int64 NumPy arrays and Python ints.
+Conversion to decimal happens at the API boundary only, either as Decimal
+(``Money`` fields) or as a float whose shortest repr is the exact decimal
+(``to_number``, for prebuilt JSON payloads).
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import TYPE_CHECKING, Annotated, Any, Optional
+
+from pydantic import PlainSerializer
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+DEFAULT_CURRENCY = settings.DEFAULT_CURRENCY
+
+# ISO 4217 minor unit exponents other than 2
+CURRENCY_EXPONENTS = {
+    "BIF": 0, "CLP": 0, "DJF": 0, "GNF": 0, "ISK": 0, "JPY": 0, "KMF": 0, "KRW": 0,
+    "PYG": 0, "RWF": 0, "UGX": 0, "VND": 0, "VUV": 0, "XAF": 0, "XOF": 0, "XPF": 0,
+    "BHD": 3, "IQD": 3, "JOD": 3, "KWD": 3, "LYD": 3, "OMR": 3, "TND": 3,
+}
+
+# Scaled amounts are rounded to this many places before rounding half-up to
+# an integer, which absorbs binary float error (0.285 * 100 = 28.499999...)
+_FLOAT_NOISE_DECIMALS = 6
+
+
+class FxRateNotFoundError(LookupError):
+    """No exchange rate path between two currencies (see services/fx_service.py)"""
+
+
+def exponent(currency: str) -> int:
+    return CURRENCY_EXPONENTS.get(currency, 2)
+
+
+def normalize_currency(code: Optional[str]) -> str:
+    """Upper-case a currency code, defaulting blanks to DEFAULT_CURRENCY"""
+    if code is None or not str(code).strip():
+        return DEFAULT_CURRENCY
+    code = str(code).strip().upper()
+    if len(code) != 3 or not code.isalpha():
+        raise ValueError(f"Invalid currency code: {code!r}")
+    return code
+
+
+def to_minor(amount: Any, currency: str = DEFAULT_CURRENCY) -> int:
+    """Exact minor units of a decimal amount, rounding half away from zero"""
+    value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    return int(value.scaleb(exponent(currency)).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def to_decimal(minor: int, currency: str = DEFAULT_CURRENCY) -> Decimal:
+    return Decimal(int(minor)).scaleb(-exponent(currency))
+
+
+def to_number(minor: int, currency: str = DEFAULT_CURRENCY) -> float:
+    """
+    JSON-ready amount. Integer true division is correctly rounded, so the
+    float's shortest repr is the exact decimal for any amount under 2**53
+    minor units.
+    """
+    return int(minor) / 10 ** exponent(currency)
+
+
+def to_minor_array(amounts: "pd.Series", currencies: "pd.Series") -> "np.ndarray":
+    """Vectorized to_minor for parsed (float) amounts; returns int64"""
+    import numpy as np
+
+    scale = 10.0 ** currencies.map(exponent).to_numpy(dtype=np.int64)
+    return round_minor_array(amounts.to_numpy(dtype=np.float64) * scale)
+
+
+def round_minor_array(scaled: "np.ndarray") -> "np.ndarray":
+    """Round float minor-unit amounts half away from zero to int64"""
+    import numpy as np
+
+    scaled = np.round(scaled, _FLOAT_NOISE_DECIMALS)
+    return (np.sign(scaled) * np.floor(np.abs(scaled) + 0.5)).astype(np.int64)
+
+
+def _decimal_to_json(value: Decimal) -> float:
+    # float(Decimal) is correctly rounded, so JSON carries the exact decimal text
+    return float(value)
+
+
+# Decimal in Python, a JSON number in responses
+Money = Annotated[Decimal, PlainSerializer(_decimal_to_json, return_type=float, when_used="json")]
@@ -0,0 +1,280 @@
+"""
+Native PostgreSQL partitioning for financial_records.
+
+The table is range-partitioned by month on ``date`` and, when
+``DB_PARTITION_DATASET_HASH_MODULUS`` is set, each month is hash
+sub-partitioned by ``dataset_id``. Filters of the form
+``dataset_id = :id AND date >= :from AND date <= :to`` prune down to the
+relevant months (and hash bucket), and dropping an old fiscal year becomes a
+partition detach instead of a multi-million-row DELETE.
+
+Maintenance entry points::
+
+    python -m app.core.partitioning ensure
+    python -m app.core.partitioning migrate [--drop-legacy]
+    python -m app.core.partitioning drop-fiscal-year 2019 [--start-month 4]
+"""
+
+from datetime import date, datetime
+from typing import List, Optional, Set, Tuple
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.core.config import settings
+from app.core.database import Base
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "financial_records"
+LEGACY_TABLE = "financial_records_legacy"
+DEFAULT_PARTITION = "financial_records_default"
+
+# Month partitions already known to exist in this process
+_known_partitions: Set[str] = set()
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(start: date, end: date) -> List[date]:
+    """First days of every month from ``start`` through ``end`` inclusive"""
+    months = []
+    current = month_start(start)
+    while current <= end:
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def is_enabled(engine: AsyncEngine) -> bool:
+    return settings.DB_PARTITIONING_ENABLED and engine.dialect.name == "postgresql"
+
+
+def _partitioned_table_ddl(engine: AsyncEngine) -> List[str]:
+    """
+    Render the parent table from the ORM definition so new columns carry over.
+
+    Postgres requires the partition key in every unique constraint, so the
+    primary key becomes (id, date); the content-hash constraint already
+    includes the date.
+    """
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    table = metadata.tables[PARENT_TABLE]
+    table.c.id.autoincrement = True
+    table.c.date.nullable = False
+    table.c.date.primary_key = True
+    table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.date))
+    table.dialect_options["postgresql"]["partition_by"] = "RANGE (date)"
+
+    dialect = engine.dialect
+    statements = [str(CreateTable(table).compile(dialect=dialect))]
+    statements += [str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes]
+    return statements
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    result = await conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name)"
+    ), {"name": PARENT_TABLE})
+    return bool(result.scalar())
+
+
+async def table_exists(conn: AsyncConnection, name: str) -> bool:
+    result = await conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+    return bool(result.scalar())
+
+
+async def create_partitioned_table(conn: AsyncConnection) -> None:
+    for statement in _partitioned_table_ddl(conn.engine):
+        await conn.execute(text(statement))
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+
+
+async def create_month_partition(conn: AsyncConnection, month: date) -> None:
+    """
+    Create one month's partition (and its hash sub-partitions) if missing.
+
+    Rows that already landed in the default partition for that month would
+    make the CREATE fail; ingestion calls ensure_partitions before inserting
+    so the default partition only catches stray dates.
+    """
+    name = partition_name(month)
+    if name in _known_partitions:
+        return
+    modulus = settings.DB_PARTITION_DATASET_HASH_MODULUS
+    statement = (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+    if modulus > 1:
+        statement += " PARTITION BY HASH (dataset_id)"
+    await conn.execute(text(statement))
+    for remainder in range(modulus if modulus > 1 else 0):
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name}_h{remainder} PARTITION OF {name} "
+            f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+        ))
+    _known_partitions.add(name)
+
+
+async def ensure_partitions(engine: AsyncEngine, start: datetime, end: datetime) -> None:
+    """Create month partitions covering [start, end] in a short transaction of their own"""
+    months = [m for m in month_range(start.date() if isinstance(start, datetime) else start,
+                                     end.date() if isinstance(end, datetime) else end)
+              if partition_name(m) not in _known_partitions]
+    if not months:
+        return
+    async with engine.begin() as conn:
+        for month in months:
+            await create_month_partition(conn, month)
+
+
+async def ensure_future_partitions(engine: AsyncEngine, months_ahead: Optional[int] = None) -> None:
+    months_ahead = settings.DB_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    today = date.today()
+    await ensure_partitions(engine, month_start(today), add_months(month_start(today), months_ahead))
+
+
+async def list_month_partitions(conn: AsyncConnection) -> List[Tuple[date, str]]:
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :name"
+    ), {"name": PARENT_TABLE})
+    partitions = []
+    prefix = f"{PARENT_TABLE}_y"
+    for (name,) in result:
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split("m")
+            partitions.append((date(int(year), int(month), 1), name))
+    return sorted(partitions)
+
+
+async def detach_months(engine: AsyncEngine, start: date, end: date, drop: bool = True) -> List[str]:
+    """Detach (and by default drop) every month partition fully inside [start, end)"""
+    detached = []
+    async with engine.begin() as conn:
+        for month, name in await list_month_partitions(conn):
+            if month >= start and add_months(month, 1) <= end:
+                await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+                if drop:
+                    await conn.execute(text(f"DROP TABLE {name}"))
+                _known_partitions.discard(name)
+                detached.append(name)
+    return detached
+
+
+async def drop_fiscal_year(engine: AsyncEngine, fiscal_year: int, start_month: int = 1) -> List[str]:
+    """Drop a fiscal year's partitions; FY2024 with start_month=4 spans Apr 2024 - Mar 2025"""
+    start = date(fiscal_year, start_month, 1)
+    return await detach_months(engine, start, add_months(start, 12))
+
+
+async def setup_partitioned_schema(engine: AsyncEngine) -> None:
+    """Create the partitioned parent on a fresh database and keep future months ready"""
+    async with engine.begin() as conn:
+        if not await table_exists(conn, PARENT_TABLE):
+            await create_partitioned_table(conn)
+        elif not await is_partitioned(conn):
+            logger.warning(
+                "%s exists unpartitioned; run 'python -m app.core.partitioning migrate'", PARENT_TABLE
+            )
+            return
+    await ensure_future_partitions(engine)
+
+
+async def migrate_to_partitioned(engine: AsyncEngine, drop_legacy: bool = False) -> int:
+    """
+    Move an existing unpartitioned table into the partitioned layout.
+
+    The old table is renamed to financial_records_legacy (its indexes get a
+    _legacy suffix so names stay free), partitions are created for its full
+    date span, and rows are copied one month per transaction so progress
+    survives interruption and each statement touches a single partition.
+    """
+    async with engine.begin() as conn:
+        if await is_partitioned(conn):
+            return 0
+        if not await table_exists(conn, LEGACY_TABLE):
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}"))
+            indexes = await conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = :name"
+            ), {"name": LEGACY_TABLE})
+            for (index_name,) in indexes.all():
+                await conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_legacy"'))
+        await create_partitioned_table(conn)
+        bounds = (await conn.execute(text(f"SELECT min(date), max(date) FROM {LEGACY_TABLE}"))).first()
+
+    if bounds[0] is None:
+        await ensure_future_partitions(engine)
+        return 0
+
+    await ensure_partitions(engine, bounds[0], bounds[1])
+    await ensure_future_partitions(engine)
+
+    columns = ", ".join(column.name for column in Base.metadata.tables[PARENT_TABLE].columns)
+    copied = 0
+    for month in month_range(bounds[0].date(), bounds[1].date()):
+        async with engine.begin() as conn:
+            result = await conn.execute(text(
+                f"INSERT INTO {PARENT_TABLE} ({columns}) SELECT {columns} FROM {LEGACY_TABLE} "
+                f"WHERE date >= :start AND date < :end ON CONFLICT DO NOTHING"
+            ), {"start": month, "end": add_months(month, 1)})
+            copied += result.rowcount
+
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{PARENT_TABLE}', 'id'), "
+            f"(SELECT COALESCE(max(id), 1) FROM {PARENT_TABLE}))"
+        ))
+        if drop_legacy:
+            await conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+    return copied
+
+
+async def _main(argv: Optional[List[str]] = None) -> None:
+    import app.models  # noqa: F401 - registers the tables on Base.metadata
+    from app.core.database import async_engine
+
+    parser = argparse.ArgumentParser(description="financial_records partition maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("ensure", help="create partitions for the coming months")
+    migrate = commands.add_parser("migrate", help="convert an unpartitioned table")
+    migrate.add_argument("--drop-legacy", action="store_true")
+    drop = commands.add_parser("drop-fiscal-year", help="detach and drop a fiscal year")
+    drop.add_argument("fiscal_year", type=int)
+    drop.add_argument("--start-month", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "ensure":
+            await setup_partitioned_schema(async_engine)
+        elif args.command == "migrate":
+            print(f"Copied {await migrate_to_partitioned(async_engine, args.drop_legacy)} records")
+        else:
+            dropped = await drop_fiscal_year(async_engine, args.fiscal_year, args.start_month)
+            print(f"Dropped partitions: {', '.join(dropped) or 'none'}")
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,70 @@
+"""
+orjson-based JSON responses.
+
+ORJSONResponse is the application's default response class. It serialises
+datetimes, dates, enums and NumPy arrays/scalars natively and falls back
+to ``_default`` for Decimal, pandas timestamps and Pydantic models.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, Mapping
+
+import orjson
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        # pandas.Timestamp subclasses datetime but is not handled natively
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "item"):
+        # NumPy scalar types orjson does not cover (e.g. float16)
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_response(rows: Iterable[Mapping[str, Any]], status_code: int = 200) -> ORJSONResponse:
+    """
+    Serialise trusted database rows without per-row Pydantic validation.
+
+    Returning a Response from a route skips FastAPI's response_model
+    validation, so only use this for rows selected column-by-column
+    from our own tables in the shape the response_model documents.
+    """
+    return ORJSONResponse([dict(row) for row in rows], status_code=status_code)
+
+
+def streamed_object_response(head: Mapping[str, Any], key: str, items: Iterable[Any]) -> StreamingResponse:
+    """
+    Stream the JSON object ``{**head, key: [*items]}`` one item at a time.
+
+    The body is byte-for-byte the document ORJSONResponse would render, so
+    clients parse it the same way, but the server never holds the whole
+    list or its encoding in memory.
+    """
+    def generate():
+        opening = dumps(dict(head))[:-1]
+        yield opening + (b"," if head else b"") + dumps(key) + b":["
+        for position, item in enumerate(items):
+            yield (b"," if position else b"") + dumps(item)
+        yield b"]}"
+
+    return StreamingResponse(generate(), media_type="application/json")
@@ -0,0 +1,202 @@
+"""
+Background job framework with pluggable execution backends.
+
+Jobs are async functions registered by name. Production runs them on
+Celery workers with periodic jobs driven by celery beat (see
+app/core/celery.py); single-node deployments and tests run them on the
+event loop with AsyncioJobBackend. Set JOB_BACKEND to choose. With
+several API workers on PostgreSQL, one of them leads the periodic schedule.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import hashlib
+import importlib
+import json
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[..., Awaitable[Any]]
+
+# Modules whose import registers jobs
+JOB_MODULES = [
+    "app.services.precompute_service",
+    "app.services.fx_service",
+    "app.services.scoring_service",
+    "app.services.budget_service",
+    "app.services.ai_analysis_service",
+]
+
+# How often a process leading the periodic schedule checks its lock, and others retry taking it
+LEADER_CHECK_SECONDS = 30
+
+_jobs: Dict[str, JobFunc] = {}
+_periodic: Dict[str, Dict[str, Any]] = {}
+
+
+def job(name: str, every_seconds: int = None, **periodic_kwargs):
+    """Register an async job; with ``every_seconds`` it also runs periodically"""
+    def decorator(func: JobFunc) -> JobFunc:
+        _jobs[name] = func
+        if every_seconds:
+            _periodic[name] = {"every_seconds": every_seconds, "kwargs": periodic_kwargs}
+        return func
+    return decorator
+
+
+def load_jobs() -> Dict[str, JobFunc]:
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+    return _jobs
+
+
+def periodic_jobs() -> Dict[str, Dict[str, Any]]:
+    load_jobs()
+    return _periodic
+
+
+async def run_job(name: str, **kwargs) -> Any:
+    jobs = load_jobs()
+    if name not in jobs:
+        raise KeyError(f"Unknown job: {name}")
+    return await jobs[name](**kwargs)
+
+
+class AsyncioJobBackend:
+    """
+    Runs jobs as tasks on the current event loop.
+
+    An enqueue that matches a job still waiting to start is dropped: the
+    waiting run will see the newer writes anyway, so a burst of uploads to
+    one dataset costs one refresh instead of one per upload.
+    """
+
+    def __init__(self, concurrency: int = settings.JOB_CONCURRENCY):
+        self._tasks: Set[asyncio.Task] = set()
+        self._periodic_tasks: List[asyncio.Task] = []
+        self._leader_task: Optional[asyncio.Task] = None
+        self._waiting: Set[str] = set()
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def _run(self, name: str, kwargs: Dict[str, Any], key: Optional[str] = None) -> None:
+        async with self._slots:
+            self._waiting.discard(key)
+            try:
+                await run_job(name, **kwargs)
+            except Exception:
+                logger.exception("Job %s failed", name)
+
+    async def enqueue(self, name: str, **kwargs) -> None:
+        key = f"{name}:{json.dumps(kwargs, sort_keys=True, default=str)}"
+        if key in self._waiting:
+            return
+        self._waiting.add(key)
+        task = asyncio.create_task(self._run(name, kwargs, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _every(self, name: str, every_seconds: int, kwargs: Dict[str, Any]) -> None:
+        while True:
+            await asyncio.sleep(every_seconds)
+            await self._run(name, kwargs)
+
+    def _start_periodic(self) -> None:
+        for name, entry in periodic_jobs().items():
+            self._periodic_tasks.append(
+                asyncio.create_task(self._every(name, entry["every_seconds"], entry["kwargs"]))
+            )
+
+    async def _stop_periodic(self) -> None:
+        for task in self._periodic_tasks:
+            task.cancel()
+        await asyncio.gather(*self._periodic_tasks, return_exceptions=True)
+        self._periodic_tasks.clear()
+
+    async def _lead(self) -> None:
+        """
+        Run the periodic schedule only while holding the scheduler's advisory lock.
+
+        Every API worker starts this backend; the session-level lock makes
+        one of them the leader, so each sweep runs once per interval rather
+        than once per worker. The others retry, and take over when the
+        leader's connection (and with it the lock) goes away.
+        """
+        from sqlalchemy import func, select
+
+        from app.core.database import async_engine
+
+        key = int.from_bytes(hashlib.blake2b(b"scheduler:periodic", digest_size=8).digest(), "big", signed=True)
+        while True:
+            try:
+                async with async_engine.connect() as conn:
+                    acquired = (await conn.execute(select(func.pg_try_advisory_lock(key)))).scalar()
+                    # the lock outlives the transaction; don't sit idle in one
+                    await conn.commit()
+                    if acquired:
+                        logger.info("This process runs the periodic jobs")
+                        self._start_periodic()
+                        try:
+                            while True:
+                                await asyncio.sleep(LEADER_CHECK_SECONDS)
+                                await conn.execute(select(1))
+                                await conn.commit()
+                        finally:
+                            await self._stop_periodic()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Periodic job leadership check failed; retrying", exc_info=True)
+            await asyncio.sleep(LEADER_CHECK_SECONDS)
+
+    async def start(self) -> None:
+        from app.core.database import async_engine
+
+        if async_engine.dialect.name == "postgresql":
+            self._leader_task = asyncio.create_task(self._lead())
+        else:
+            # SQLite deployments are a single process
+            self._start_periodic()
+
+    async def drain(self) -> None:
+        """Wait for every enqueued job to finish (tests and benchmarks)"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def stop(self) -> None:
+        if self._leader_task is not None:
+            self._leader_task.cancel()
+            await asyncio.gather(self._leader_task, return_exceptions=True)
+            self._leader_task = None
+        await self._stop_periodic()
+        await self.drain()
+
+
+class CeleryJobBackend:
+    """Sends jobs to Celery workers; beat owns the periodic schedule"""
+
+    async def enqueue(self, name: str, **kwargs) -> None:
+        from app.core.celery import app as celery_app
+
+        await asyncio.to_thread(celery_app.send_task, f"jobs.{name}", kwargs=kwargs)
+
+    async def start(self) -> None:
+        pass
+
+    async def drain(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+_backend = None
+
+
+def get_job_backend():
+    global _backend
+    if _backend is None:
+        _backend = CeleryJobBackend() if settings.JOB_BACKEND == "celery" else AsyncioJobBackend()
+    return _backend
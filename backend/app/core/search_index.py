@@ -0,0 +1,229 @@
+"""
+In-process inverted index over record descriptions and categories.
+
+Postgres answers searches from trigram and tsvector indexes. Other
+databases have no text indexing worth using, so each worker keeps an
+inverted index per searched dataset instead: term -> {record id: term
+frequency}, a sorted vocabulary for prefix matches and a trigram map for
+typo-tolerant (edit distance) matches. Ranking is BM25.
+
+Indexes are built from the database on a dataset's first search and then
+only grow: ingestion in this process adds the rows it inserted, and a
+search that sees a newer dataset version reads just the records above the
+id it last synced to. Records are never updated in place, so appends
+plus dropping a deleted dataset's index keep it exact. The least recently
+searched datasets are evicted beyond SEARCH_INDEX_MAX_DATASETS.
+"""
+
+import math
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Dropped from queries, as Postgres' english configuration does
+STOPWORDS = frozenset(
+    "a all an and any are as at be by for from has have in is it its of on or our the this to was were with".split()
+)
+
+# Weight of a query term's matches by kind; exact terms always rank first
+EXACT_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.7
+FUZZY_WEIGHT = 0.5
+# Shortest query term completed as a prefix
+MIN_PREFIX_LENGTH = 2
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct query tokens without stopwords, in query order"""
+    return list(dict.fromkeys(token for token in tokenize(query) if token not in STOPWORDS))
+
+
+def _trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(term: str) -> int:
+    """Typos tolerated in a query term: none for short terms, which match too much"""
+    if len(term) <= 3:
+        return 0
+    return 1 if len(term) <= 7 else 2
+
+
+def within_distance(a: str, b: str, limit: int) -> bool:
+    """Levenshtein distance <= limit, abandoning rows that already exceed it"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+class DatasetIndex:
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.dates: Dict[int, datetime] = {}
+        self.lengths: Dict[int, int] = {}
+        self.grams: Dict[str, Set[str]] = {}
+        self.total_length = 0
+        # Every record up to this id, as of dataset ``version``, is indexed
+        self.synced_id = 0
+        self.version: Optional[int] = None
+        self._vocabulary: Optional[List[str]] = None
+
+    def add(self, record_id: int, when: datetime, *texts: Optional[str]) -> None:
+        if record_id in self.dates:
+            return
+        tokens = [token for text in texts for token in tokenize(text)]
+        self.dates[record_id] = when or datetime.min
+        self.lengths[record_id] = len(tokens)
+        self.total_length += len(tokens)
+        for token in tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                for gram in _trigrams(token):
+                    self.grams.setdefault(gram, set()).add(token)
+                self._vocabulary = None
+            postings[record_id] = postings.get(record_id, 0) + 1
+
+    @property
+    def vocabulary(self) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def expand(self, term: str) -> Dict[str, float]:
+        """Indexed terms matching a query term, with their match weight"""
+        matches: Dict[str, float] = {}
+        if term in self.postings:
+            matches[term] = EXACT_WEIGHT
+        if len(term) >= MIN_PREFIX_LENGTH:
+            vocabulary = self.vocabulary
+            for position in range(bisect_left(vocabulary, term), len(vocabulary)):
+                if not vocabulary[position].startswith(term):
+                    break
+                matches.setdefault(vocabulary[position], PREFIX_WEIGHT)
+        limit = max_edits(term)
+        if limit:
+            candidates = set().union(*(self.grams.get(gram, ()) for gram in _trigrams(term)))
+            for candidate in candidates - matches.keys():
+                if within_distance(term, candidate, limit):
+                    matches[candidate] = FUZZY_WEIGHT
+        return matches
+
+    def search(
+        self,
+        query: str,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        (record id, score) of records matching every query term, best first.
+
+        A term matches exactly, as a prefix or within its typo allowance;
+        each record scores the best-weighted BM25 of each term's matches.
+        Ties go to the newest record, as in the record listing.
+        """
+        terms = query_terms(query)
+        if not terms or not self.dates:
+            return []
+        documents = len(self.dates)
+        average_length = self.total_length / documents or 1
+
+        scores: Optional[Dict[int, float]] = None
+        for term in terms:
+            term_scores: Dict[int, float] = {}
+            for match, weight in self.expand(term).items():
+                postings = self.postings[match]
+                idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for record_id, frequency in postings.items():
+                    if scores is not None and record_id not in scores:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[record_id] / average_length)
+                    score = weight * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    if score > term_scores.get(record_id, 0):
+                        term_scores[record_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {record_id: scores[record_id] + score for record_id, score in term_scores.items()}
+            if not scores:
+                return []
+
+        hits = [
+            (record_id, score) for record_id, score in scores.items()
+            if (date_from is None or self.dates[record_id] >= date_from)
+            and (date_to is None or self.dates[record_id] <= date_to)
+        ]
+        hits.sort(key=lambda hit: (hit[1], self.dates[hit[0]], hit[0]), reverse=True)
+        return hits
+
+
+class SearchIndex:
+    """Per-dataset indexes of this process, least recently searched evicted first"""
+
+    def __init__(self, max_datasets: int):
+        self.max_datasets = max_datasets
+        self._datasets: "OrderedDict[int, DatasetIndex]" = OrderedDict()
+
+    def get(self, dataset_id: int) -> Optional[DatasetIndex]:
+        index = self._datasets.get(dataset_id)
+        if index is not None:
+            self._datasets.move_to_end(dataset_id)
+        return index
+
+    def create(self, dataset_id: int) -> DatasetIndex:
+        index = self._datasets[dataset_id] = DatasetIndex()
+        while len(self._datasets) > self.max_datasets:
+            self._datasets.popitem(last=False)
+        return index
+
+    def add_records(
+        self,
+        dataset_id: int,
+        rows: Iterable[Tuple[int, datetime, Optional[str], Optional[str]]],
+        version: Optional[int] = None
+    ) -> None:
+        """
+        Index (id, date, description, category) rows if the dataset's index is loaded here.
+
+        ``version`` is the dataset version the rows were committed at; when it
+        directly follows the index's, no other writer came in between and the
+        index counts as synced without a catch-up read.
+        """
+        index = self._datasets.get(dataset_id)
+        if index is None:
+            return
+        ids = []
+        for record_id, when, description, category in rows:
+            index.add(record_id, when, description, category)
+            ids.append(record_id)
+        if version is not None and index.version is not None and version == index.version + 1:
+            index.version = version
+            index.synced_id = max([index.synced_id, *ids])
+
+    def drop(self, dataset_id: int) -> None:
+        self._datasets.pop(dataset_id, None)
+
+
+search_index = SearchIndex(settings.SEARCH_INDEX_MAX_DATASETS)
@@ -1,3 +1,3 @@
-from .financial_models import User, FinancialDataset, FinancialRecord, KPIMetric, Analysis
+from .financial_models import User, FinancialDataset, FinancialRecord, CategoryRule, Budget, DailyRollup, DatasetScore, FxRate, KPIMetric, Analysis, RecordType, AnalysisType, AnalysisStatus
 
-__all__ = ["User", "FinancialDataset", "FinancialRecord", "KPIMetric", "Analysis"]
+__all__ = ["User", "FinancialDataset", "FinancialRecord", "CategoryRule", "Budget", "DailyRollup", "DatasetScore", "FxRate", "KPIMetric", "Analysis", "RecordType", "AnalysisType", "AnalysisStatus"]
@@ -1,7 +1,41 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Boolean
+import enum
+from decimal import Decimal
+from sqlalchemy import DDL, BigInteger, Column, Integer, LargeBinary, String, Float, Date, DateTime, Text, ForeignKey, Boolean, UniqueConstraint, Index, event, literal_column, true
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
+from app.core.money import DEFAULT_CURRENCY, to_decimal
+
+# Text search configuration of the records' tsvector index (Postgres)
+SEARCH_CONFIG = "english"
+
+def search_document(description, category):
+    """
+    A record's description and category as a tsvector. Queries must build it
+    with this same function: Postgres only uses an expression index for the
+    identical expression, so every constant is inlined rather than bound.
+    """
+    return func.to_tsvector(
+        literal_column(f"'{SEARCH_CONFIG}'"),
+        func.coalesce(description, literal_column("''")).op("||")(literal_column("' '")).op("||")(func.coalesce(category, literal_column("''")))
+    )
+
+class RecordType(str, enum.Enum):
+    REVENUE = "revenue"
+    EXPENSE = "expense"
+
+class AnalysisType(str, enum.Enum):
+    TREND = "trend"
+    HEALTH = "health"
+    COMPARATIVE = "comparative"
+    RISK = "risk"
+    FORECAST = "forecast"
+    CUSTOM = "custom"
+
+class AnalysisStatus(str, enum.Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
 
 class User(Base):
     __tablename__ = "users"
@@ -20,8 +54,17 @@ class FinancialDataset(Base):
     name = Column(String, index=True)
     description = Column(Text)
     file_path = Column(String)
+    # ISO 4217 code assumed for uploaded rows that do not name a currency
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY, server_default=DEFAULT_CURRENCY)
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
     owner_id = Column(Integer, ForeignKey("users.id"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Date span of records written since the last precompute run; NULL when clean
+    pending_refresh_from = Column(DateTime, index=True)
+    pending_refresh_to = Column(DateTime)
+    precomputed_at = Column(DateTime(timezone=True))
+    # Bumped on every change to the dataset's records or derived data; keys ETags (see core/etag.py)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
     
     owner = relationship("User", back_populates="datasets")
     records = relationship("FinancialRecord", back_populates="dataset")
@@ -33,26 +76,179 @@ class FinancialRecord(Base):
     dataset_id = Column(Integer, ForeignKey("financial_datasets.id"))
     date = Column(DateTime)
     category = Column(String)
-    amount = Column(Float)
+    # Integer minor units (cents) of ``currency``; see core/money.py
+    amount_minor = Column(BigInteger, nullable=False)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY, server_default=DEFAULT_CURRENCY)
+    # The amount in the dataset's currency at the record date's FX rate; all aggregates sum this
+    base_amount_minor = Column(BigInteger, nullable=False)
     description = Column(Text)
     record_type = Column(String)  # revenue, expense, etc.
+    # Stable digest of the record content, used to skip re-uploaded rows
+    content_hash = Column(String(32), index=True)
     
     dataset = relationship("FinancialDataset", back_populates="records")
 
+    @property
+    def amount(self) -> Decimal:
+        return to_decimal(self.amount_minor, self.currency)
+
+    # The hash already covers the date; including it keeps the constraint
+    # valid when the table is range-partitioned by date (see core/partitioning.py)
+    __table_args__ = (
+        UniqueConstraint("dataset_id", "content_hash", "date", name="uq_financial_records_dataset_content"),
+        Index("ix_financial_records_dataset_date", "dataset_id", "date"),
+        # Full-text and trigram (fuzzy, substring) search; other databases use app/core/search_index.py
+        Index("ix_financial_records_search", search_document(description, category), postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index(
+            "ix_financial_records_description_trgm", "description",
+            postgresql_using="gin", postgresql_ops={"description": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_financial_records_category_trgm", "category",
+            postgresql_using="gin", postgresql_ops={"category": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
+
+# The trigram indexes need pg_trgm before the tables are created
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+class DailyRollup(Base):
+    __tablename__ = "financial_daily_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("financial_datasets.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    record_type = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    total_minor = Column(BigInteger, nullable=False)
+    record_count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("dataset_id", "day", "record_type", "category", name="uq_daily_rollups_key"),
+    )
+
+class FxRate(Base):
+    __tablename__ = "fx_rates"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    base = Column(String(3), nullable=False)
+    quote = Column(String(3), nullable=False)
+    rate = Column(Float, nullable=False)  # units of quote per unit of base
+
+    __table_args__ = (
+        UniqueConstraint("base", "quote", "day", name="uq_fx_rates_pair_day"),
+    )
+
+class CategoryRule(Base):
+    __tablename__ = "category_rules"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    dataset_id = Column(Integer, ForeignKey("financial_datasets.id"))  # NULL: all of the owner's datasets
+    name = Column(String)
+    category = Column(String, nullable=False)
+    # Conditions, all of which must hold; unset ones are ignored
+    pattern = Column(Text)  # regular expression searched in the description, case-insensitive
+    keywords = Column(Text)  # comma-separated words or phrases, any of which must appear in the description
+    record_type = Column(String)
+    min_amount = Column(Float)  # bounds on the absolute amount, in the record's currency
+    max_amount = Column(Float)
+    priority = Column(Integer, nullable=False, default=0, server_default="0")  # the highest matching rule wins
+    is_active = Column(Boolean, nullable=False, default=True, server_default=true())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Budget(Base):
+    __tablename__ = "budgets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("financial_datasets.id"), nullable=False)
+    category = Column(String, nullable=False)
+    record_type = Column(String, nullable=False, default="expense", server_default="expense")
+    period = Column(Date, nullable=False)  # first day of the budgeted month
+    # Planned amount in minor units of the dataset's currency, compared against its rollups
+    planned_minor = Column(BigInteger, nullable=False)
+    # Highest alert level already published for this budget line (see services/budget_service.py)
+    alert_level = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("dataset_id", "period", "record_type", "category", name="uq_budgets_line"),
+    )
+
 class KPIMetric(Base):
     __tablename__ = "kpi_metrics"
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String)
-    value = Column(Float)
-    period = Column(String)
-    calculated_at = Column(DateTime(timezone=True), server_default=func.now())
+    dataset_id = Column(Integer, ForeignKey("financial_datasets.id"), nullable=False)
+    metric_type = Column(String, nullable=False)
+    period_type = Column(String, nullable=False)  # monthly
+    period_start = Column(DateTime, nullable=False)
+    period_end = Column(DateTime, nullable=False)
+    value = Column(Float)  # NULL when undefined, e.g. growth without a prior period
+    calculated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("dataset_id", "metric_type", "period_type", "period_start", name="uq_kpi_metrics_key"),
+    )
+
+class DatasetScore(Base):
+    __tablename__ = "dataset_scores"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("financial_datasets.id"), nullable=False)
+    scored_on = Column(Date, nullable=False)  # one row per dataset and scoring day keeps the history
+    health_score = Column(Float, nullable=False)
+    risk_score = Column(Float, nullable=False)
+    health_rank = Column(Integer, nullable=False)
+    risk_rank = Column(Integer, nullable=False)
+    currency = Column(String(3), nullable=False)  # of total_revenue
+    total_revenue = Column(Float)  # NULL when the dataset's currency has no FX rate
+    profit_margin = Column(Float)
+    total_records = Column(Integer, nullable=False)
+    months_active = Column(Integer, nullable=False)
+    revenue_volatility = Column(Float)
+    expense_volatility = Column(Float)
+    revenue_concentration_hhi = Column(Float)
+    expense_concentration_hhi = Column(Float)
+    loss_month_share = Column(Float)
+    calculated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("dataset_id", "scored_on", name="uq_dataset_scores_day"),
+        Index("ix_dataset_scores_day_health", "scored_on", "health_rank"),
+    )
 
 class Analysis(Base):
     __tablename__ = "analyses"
     
     id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("financial_datasets.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     query = Column(Text)
+    prompt = Column(Text)
+    # Legacy uncompressed JSON; new rows use result_blob and the compaction job converts old ones
     result = Column(Text)
+    # Compressed JSON of the full result (see ai_analysis_service.pack_result), read only by the detail fetch
+    result_blob = Column(LargeBinary)
     analysis_type = Column(String)
+    status = Column(String)
+    # Listing projection, so history pages never touch the result
+    summary = Column(String(300))
+    health_score = Column(Float)
+    risk_score = Column(Float)
+    result_size = Column(Integer)  # uncompressed bytes
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Keyset pagination of a user's history, newest first
+        Index("ix_analyses_user_id_id", "user_id", "id"),
+    )
+
+# Results are compressed already; keep TOAST from trying pglz on them again
+event.listen(
+    Analysis.__table__,
+    "after_create",
+    DDL("ALTER TABLE analyses ALTER COLUMN result_blob SET STORAGE EXTERNAL").execute_if(dialect="postgresql")
+)
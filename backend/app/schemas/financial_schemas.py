@@ -1,11 +1,13 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from datetime import date, datetime
+from typing import Optional, List, Dict, Any, Literal
+from app.core.money import DEFAULT_CURRENCY, Money
 
 class FinancialRecordBase(BaseModel):
     date: datetime
     category: str
-    amount: float
+    amount: Money
+    currency: str = DEFAULT_CURRENCY
     description: Optional[str] = None
     record_type: str
 
@@ -19,22 +21,136 @@ class FinancialRecordResponse(FinancialRecordBase):
     class Config:
         from_attributes = True
 
+class BulkFinancialRecordCreate(BaseModel):
+    dataset_id: int
+    records: List[FinancialRecordCreate]
+
+class BulkOperationResponse(BaseModel):
+    total_records: int
+    successful_records: int
+    failed_records: int
+    new_records: int = 0
+    duplicate_records: int = 0
+    errors: List[Dict[str, Any]] = []
+    # Date span of newly inserted records, used to refresh only touched periods
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    # Uncategorized rows given a category by a rule or by the learned classifier
+    categorized_by_rules: int = 0
+    categorized_by_model: int = 0
+
+class DataSummary(BaseModel):
+    total_records: int
+    total_revenue: Money
+    total_expenses: Money
+    net_profit: Money
+    profit_margin: float
+    revenue_transactions: int
+    expense_transactions: int
+    date_range_start: Optional[datetime] = None
+    date_range_end: Optional[datetime] = None
+    currency: str = DEFAULT_CURRENCY
+
+class KPIMetricResponse(BaseModel):
+    metric_type: str
+    period_type: str
+    period_start: datetime
+    period_end: datetime
+    value: Optional[float] = None
+    calculated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class DatasetScoreResponse(BaseModel):
+    dataset_id: int
+    dataset_name: Optional[str] = None
+    scored_on: date
+    health_score: float
+    risk_score: float
+    health_rank: int
+    risk_rank: int
+    currency: str
+    total_revenue: Optional[float] = None
+    profit_margin: Optional[float] = None
+    total_records: int
+    months_active: int
+    revenue_volatility: Optional[float] = None
+    expense_volatility: Optional[float] = None
+    revenue_concentration_hhi: Optional[float] = None
+    expense_concentration_hhi: Optional[float] = None
+    loss_month_share: Optional[float] = None
+    
+    class Config:
+        from_attributes = True
+
 class FinancialDatasetBase(BaseModel):
     name: str
     description: Optional[str] = None
+    currency: str = DEFAULT_CURRENCY
 
 class FinancialDatasetCreate(FinancialDatasetBase):
     owner_id: int
 
+class FinancialDatasetUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+
 class FinancialDatasetResponse(FinancialDatasetBase):
     id: int
     file_path: Optional[str] = None
     upload_date: datetime
     owner_id: int
+    version: int = 0
     
     class Config:
         from_attributes = True
 
+class CategoryRuleBase(BaseModel):
+    name: Optional[str] = None
+    category: str
+    dataset_id: Optional[int] = None
+    pattern: Optional[str] = None
+    keywords: Optional[str] = None
+    record_type: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    priority: int = 0
+
+class CategoryRuleCreate(CategoryRuleBase):
+    owner_id: int
+
+class CategoryRuleResponse(CategoryRuleBase):
+    id: int
+    owner_id: int
+    is_active: bool
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class QueryPlan(BaseModel):
+    """
+    A question about a dataset as a structured query over its daily rollups.
+    Produced by the query planner (LLM or rules); every number in the answer
+    is computed from the plan, never by the planner.
+    """
+    metrics: List[Literal["revenue", "expenses", "profit", "margin", "transactions"]] = ["revenue", "expenses", "profit"]
+    group_by: Literal["none", "category", "record_type", "month", "quarter"] = "none"
+    # Relative periods end at the dataset's latest data, so uploaded history reads like live books
+    period: Literal[
+        "all", "this_month", "last_month", "this_quarter", "last_quarter",
+        "this_year", "last_year", "last_n_months", "custom"
+    ] = "all"
+    months: Optional[int] = Field(None, ge=1, le=120)  # for last_n_months
+    date_from: Optional[date] = None  # for custom
+    date_to: Optional[date] = None
+    compare: Literal["none", "previous_period", "previous_year"] = "none"
+    # Category names or words in them, matched case-insensitively
+    categories: List[str] = []
+    limit: Optional[int] = Field(None, ge=1, le=1000)
+    order: Literal["desc", "asc"] = "desc"
+
 class UserBase(BaseModel):
     username: str
     email: str
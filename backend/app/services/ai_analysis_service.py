@@ -2,24 +2,129 @@
 AI Analysis Service - OpenAI integration for financial data analysis
 """
 
-import openai
-from typing import Dict, Any, List, Optional
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
 import json
-import pandas as pd
-from datetime import datetime, timedelta
-import asyncio
+import logging
+import zlib
+from datetime import datetime, timedelta, timezone
+import orjson
+from sqlalchemy import and_, delete, desc, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import analytics_cache
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.events import event_bus
+from app.core.metrics import timed
+from app.core.scheduler import job
 from app.services.financial_data_service import FinancialDataService
-from app.models.analysis import Analysis, AnalysisType, AnalysisStatus
+from app.models.financial_models import Analysis, AnalysisType, AnalysisStatus
+
+try:
+    import zstandard
+except ImportError:  # optional; results are compressed with zlib without it
+    zstandard = None
+
+if TYPE_CHECKING:
+    import openai
+
+logger = logging.getLogger(__name__)
+
+# First bytes of a zstd frame; anything else in result_blob is zlib
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# Legacy rows converted per statement by the compaction job
+COMPACTION_BATCH_SIZE = 500
+# Columns of a history listing; the result itself is only read by the detail fetch
+HISTORY_COLUMNS = [
+    Analysis.id,
+    Analysis.dataset_id,
+    Analysis.analysis_type,
+    Analysis.status,
+    Analysis.summary,
+    Analysis.health_score,
+    Analysis.risk_score,
+    Analysis.result_size,
+    Analysis.created_at,
+]
+
+# Standard questions offered on /ai-analysis/insights and precomputed per dataset
+STANDARD_INSIGHT_PROMPTS = [
+    {
+        "title": "Revenue Analysis",
+        "description": "Analyze revenue trends and patterns",
+        "query": "What are the revenue trends over the last 12 months?"
+    },
+    {
+        "title": "Expense Breakdown",
+        "description": "Break down expenses by category",
+        "query": "Show me the expense breakdown by category"
+    },
+    {
+        "title": "Profit Margins",
+        "description": "Calculate and analyze profit margins",
+        "query": "What are the profit margins for each product line?"
+    }
+]
+
+_openai_client = None
+
+
+def get_openai_client() -> "openai.AsyncOpenAI":
+    """Shared async OpenAI client, created on first use"""
+    global _openai_client
+    if _openai_client is None:
+        # the SDK takes ~0.5s to import; only workers that call it pay for it
+        import openai
+
+        _openai_client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None
+        )
+    return _openai_client
+
+
+async def close_openai_client() -> None:
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
+
+def pack_result(result: Dict[str, Any]) -> Tuple[bytes, int]:
+    """
+    Analysis result as compact JSON, compressed with zstd when installed and
+    zlib otherwise, plus the uncompressed size in bytes
+    """
+    data = orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY)
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), len(data)
+    return zlib.compress(data, 6), len(data)
+
+
+def unpack_result(blob: bytes) -> Dict[str, Any]:
+    if blob[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("Result is zstd-compressed; install the zstandard package to read it")
+        return orjson.loads(zstandard.ZstdDecompressor().decompress(blob))
+    return orjson.loads(zlib.decompress(blob))
+
+
+def result_projection(result: Dict[str, Any], size: int) -> Dict[str, Any]:
+    """Listing fields of a result: a one-line summary and its scores"""
+    text = result.get("insights") if isinstance(result.get("insights"), str) else ""
+    summary = " ".join(text.split())
+    return {
+        "summary": summary[:297] + "..." if len(summary) > 300 else summary or None,
+        "health_score": result.get("health_score"),
+        "risk_score": result.get("risk_score"),
+        "result_size": size,
+    }
 
 
 class AIAnalysisService:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None):
         self.db = db
-        self.financial_service = FinancialDataService(db)
-        openai.api_key = settings.OPENAI_API_KEY
+        self.financial_service = FinancialDataService(db, read_db)
 
     async def analyze_financial_data(
         self,
@@ -54,15 +159,19 @@ class AIAnalysisService:
             if analysis_type == "trend":
                 result = await self._trend_analysis(data_context, custom_prompt)
             elif analysis_type == "health":
+                data_context["budget"] = await self._budget_findings(dataset_id)
                 result = await self._financial_health_assessment(data_context, custom_prompt)
             elif analysis_type == "comparative":
+                data_context["period_comparison"] = await self._period_comparison(dataset_id)
                 result = await self._comparative_analysis(data_context, custom_prompt)
             elif analysis_type == "risk":
                 result = await self._risk_assessment(data_context, custom_prompt)
             elif analysis_type == "forecast":
+                data_context["simulation"] = await self._simulation(dataset_id)
                 result = await self._forecast_analysis(data_context, custom_prompt)
             elif analysis_type == "custom":
-                result = await self._custom_analysis(data_context, custom_prompt)
+                computed = await self._answer(dataset_id, custom_prompt) if custom_prompt else None
+                result = await self._custom_analysis(data_context, custom_prompt, computed)
             else:
                 raise ValueError(f"Unsupported analysis type: {analysis_type}")
 
@@ -74,6 +183,12 @@ class AIAnalysisService:
                 result=result,
                 custom_prompt=custom_prompt
             )
+            await event_bus.publish(
+                "analysis_completed",
+                dataset_id,
+                analysis_id=analysis_record.id,
+                analysis_type=analysis_type
+            )
 
             return {
                 "analysis_id": analysis_record.id,
@@ -86,6 +201,37 @@ class AIAnalysisService:
         except Exception as e:
             raise Exception(f"AI analysis failed: {str(e)}")
 
+    async def precompute_insights(self, dataset_id: int) -> Dict[str, Any]:
+        """
+        Answer the standard insight prompts for a dataset and cache the results.
+
+        Runs from the precompute job so the insights page is served from the
+        analytics cache. Figures come from the query engine; without an
+        OpenAI key the computed answer is cached without a narrative.
+        """
+        if not settings.OPENAI_API_KEY:
+            insights = {}
+            for insight in STANDARD_INSIGHT_PROMPTS:
+                computed = await self._answer(dataset_id, insight["query"])
+                result = {"analysis_type": "query", "insights": computed["answer"], "computed": computed}
+                insights[insight["query"]] = result
+                await analytics_cache.set(dataset_id, "insight", result, query=insight["query"])
+            await event_bus.publish("insights_ready", dataset_id, queries=list(insights))
+            return insights
+
+        data_summary = await self.financial_service.get_data_summary(dataset_id)
+        recent_records = await self.financial_service.get_financial_records(dataset_id=dataset_id, limit=100)
+        data_context = self._prepare_data_context(data_summary, recent_records)
+
+        insights = {}
+        for insight in STANDARD_INSIGHT_PROMPTS:
+            computed = await self._answer(dataset_id, insight["query"])
+            result = await self._custom_analysis(data_context, insight["query"], computed)
+            insights[insight["query"]] = result
+            await analytics_cache.set(dataset_id, "insight", result, query=insight["query"])
+        await event_bus.publish("insights_ready", dataset_id, queries=list(insights))
+        return insights
+
     def _prepare_data_context(
         self,
         data_summary: Any,
@@ -99,8 +245,8 @@ class AIAnalysisService:
         for record in recent_records[:20]:  # Limit to recent 20 records
             records_data.append({
                 "date": record.date.isoformat(),
-                "type": record.record_type.value,
-                "category": record.category.value if record.category else "Unknown",
+                "type": record.record_type,
+                "category": record.category or "Unknown",
                 "amount": float(record.amount),
                 "description": record.description or ""
             })
@@ -108,9 +254,9 @@ class AIAnalysisService:
         context = {
             "summary": {
                 "total_records": data_summary.total_records,
-                "total_revenue": data_summary.total_revenue,
-                "total_expenses": data_summary.total_expenses,
-                "net_profit": data_summary.net_profit,
+                "total_revenue": float(data_summary.total_revenue),
+                "total_expenses": float(data_summary.total_expenses),
+                "net_profit": float(data_summary.net_profit),
                 "profit_margin": data_summary.profit_margin,
                 "revenue_transactions": data_summary.revenue_transactions,
                 "expense_transactions": data_summary.expense_transactions,
@@ -125,6 +271,30 @@ class AIAnalysisService:
         
         return context
 
+    async def _period_comparison(self, dataset_id: int) -> Dict[str, Any]:
+        """Latest month's MoM/QoQ/YoY figures and biggest category moves, computed server-side"""
+        from app.services.period_analytics_service import PeriodAnalyticsService
+
+        return await PeriodAnalyticsService(self.financial_service.read_db).latest_comparison(dataset_id)
+
+    async def _answer(self, dataset_id: int, question: str) -> Dict[str, Any]:
+        """A question planned and answered exactly from the dataset's rollups"""
+        from app.services.query_service import QueryService
+
+        return await QueryService(self.financial_service.read_db).answer(dataset_id, question)
+
+    async def _budget_findings(self, dataset_id: int) -> List[str]:
+        """Budget-vs-actual findings for the latest budgeted month; empty without budgets"""
+        from app.services.budget_service import BudgetService
+
+        return await BudgetService(self.financial_service.read_db).expense_insights(dataset_id)
+
+    async def _simulation(self, dataset_id: int) -> Dict[str, Any]:
+        """Monte Carlo cash-flow bands for the dataset, served from the analytics cache"""
+        from app.services.precompute_service import cached_forecast
+
+        return await cached_forecast(self.financial_service.read_db, dataset_id)
+
     async def _trend_analysis(self, data_context: Dict[str, Any], custom_prompt: Optional[str] = None) -> Dict[str, Any]:
         """Perform trend analysis using OpenAI"""
         
@@ -177,6 +347,9 @@ class AIAnalysisService:
         - Revenue Transactions: {data_context['summary']['revenue_transactions']}
         - Expense Transactions: {data_context['summary']['expense_transactions']}
 
+        Budget vs Actual:
+        {chr(10).join(f'- {finding}' for finding in data_context.get('budget') or ['No budgets loaded'])}
+
         Please provide:
         1. Overall financial health score (1-10)
         2. Strengths and weaknesses analysis
@@ -206,6 +379,7 @@ class AIAnalysisService:
 
     async def _comparative_analysis(self, data_context: Dict[str, Any], custom_prompt: Optional[str] = None) -> Dict[str, Any]:
         """Perform comparative analysis using OpenAI"""
+        comparison = data_context.get("period_comparison") or {"period": None, "currency": "", "totals": [], "movers": []}
         
         base_prompt = f"""
         Perform a comparative analysis of this financial data:
@@ -216,6 +390,13 @@ class AIAnalysisService:
         - Profit: ${data_context['summary']['net_profit']:,.2f}
         - Margin: {data_context['summary']['profit_margin']:.2f}%
 
+        Period-over-period figures for {comparison['period'] or 'the latest month'} in {comparison['currency']}
+        (MoM: vs previous month; QoQ: trailing 3 months vs the 3 before; YoY: vs same month last year; percentages null without a base):
+        Totals by record type:
+        {json.dumps(comparison['totals'], indent=2)}
+        Largest category moves month over month:
+        {json.dumps(comparison['movers'], indent=2)}
+
         Please provide:
         1. Period-over-period comparison insights
         2. Revenue vs expense ratio analysis
@@ -233,7 +414,8 @@ class AIAnalysisService:
             "insights": response,
             "comparisons": {
                 "revenue_expense_ratio": data_context['summary']['total_revenue'] / max(data_context['summary']['total_expenses'], 1),
-                "profit_margin_category": "excellent" if data_context['summary']['profit_margin'] > 20 else "good" if data_context['summary']['profit_margin'] > 10 else "needs_improvement"
+                "profit_margin_category": "excellent" if data_context['summary']['profit_margin'] > 20 else "good" if data_context['summary']['profit_margin'] > 10 else "needs_improvement",
+                "period_over_period": comparison
             }
         }
 
@@ -281,7 +463,26 @@ class AIAnalysisService:
 
     async def _forecast_analysis(self, data_context: Dict[str, Any], custom_prompt: Optional[str] = None) -> Dict[str, Any]:
         """Perform forecast analysis using OpenAI"""
-        
+        simulation = data_context.get("simulation") or {}
+        if simulation.get("months"):
+            scenarios = json.dumps({
+                "months": simulation["months"],
+                "profit": simulation["bands"]["profit"],
+                "cash_position": simulation["bands"]["cash_position"],
+                "probability_negative_profit": simulation["probability_negative_profit"],
+                "revenue_growth_pct": simulation["revenue_growth_pct"],
+                "expense_growth_pct": simulation["expense_growth_pct"],
+            }, indent=2)
+            simulation_text = (
+                f"{simulation['simulations']} Monte Carlo paths of the next {simulation['horizon_months']} months "
+                f"in {simulation['currency']}, resampled from {simulation['history_months']} months of history "
+                f"(p5/p25/p50/p75/p95 per month; growth is vs the latest months' average):\n{scenarios}\n"
+                f"Probability that total profit over the period is negative: "
+                f"{simulation['probability_negative_horizon_profit']:.1%}"
+            )
+        else:
+            simulation_text = "No monthly history to simulate."
+
         base_prompt = f"""
         Provide financial forecasting insights based on this data:
 
@@ -294,32 +495,68 @@ class AIAnalysisService:
         Transaction Trends:
         {json.dumps(data_context['recent_transactions'][:10], indent=2)}
 
+        Simulated Scenarios:
+        {simulation_text}
+
         Please provide:
         1. Revenue growth projections for next 3-6 months
         2. Expense trend forecasts
         3. Profit margin predictions
         4. Seasonal adjustments and considerations
         5. Growth opportunities and constraints
-        6. Scenario planning (best/worst/most likely cases)
+        6. Scenario planning (best/worst/most likely cases), grounded in the simulated percentiles
 
         {f'Additional context: {custom_prompt}' if custom_prompt else ''}
         """
 
         response = await self._call_openai(base_prompt)
-        
+
+        revenue_growth = simulation.get("revenue_growth_pct")
+        expense_growth = simulation.get("expense_growth_pct")
+        loss_probability = simulation.get("probability_negative_horizon_profit")
+        if expense_growth is None:
+            expense_trend = "stable"
+        else:
+            expense_trend = "rising" if expense_growth["p50"] > 5 else "falling" if expense_growth["p50"] < -5 else "stable"
+        if loss_probability is None:
+            profit_outlook = "positive" if data_context['summary']['profit_margin'] > 10 else "cautious"
+        else:
+            profit_outlook = "positive" if loss_probability < 0.2 else "cautious" if loss_probability < 0.5 else "negative"
+
         return {
             "analysis_type": "forecast",
             "insights": response,
             "projections": {
-                "revenue_growth_estimate": "5-15%",  # Would use ML models for accurate forecasting
-                "expense_trend": "stable",
-                "profit_outlook": "positive" if data_context['summary']['profit_margin'] > 10 else "cautious"
+                "revenue_growth_estimate": (
+                    f"{revenue_growth['p25']:+.1f}% to {revenue_growth['p75']:+.1f}%" if revenue_growth else None
+                ),
+                "revenue_growth_pct": revenue_growth,
+                "expense_trend": expense_trend,
+                "profit_outlook": profit_outlook,
+                "probability_negative_profit": loss_probability,
+                "cash_position": simulation.get("bands", {}).get("cash_position"),
+                "months": simulation.get("months", []),
+                "simulations": simulation.get("simulations"),
+                "currency": simulation.get("currency")
             }
         }
 
-    async def _custom_analysis(self, data_context: Dict[str, Any], custom_prompt: str) -> Dict[str, Any]:
-        """Perform custom analysis based on user prompt"""
+    async def _custom_analysis(
+        self,
+        data_context: Dict[str, Any],
+        custom_prompt: str,
+        computed: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Perform custom analysis based on user prompt, grounded in the query engine's computed answer"""
         
+        computed_section = ""
+        if computed:
+            computed_section = f"""
+        Computed Answer (exact figures over all records; do not recompute or contradict them):
+        {computed['answer']}
+        {json.dumps(computed['rows'][:20], indent=2)}
+"""
+
         base_prompt = f"""
         Analyze the following financial data based on the user's specific request:
 
@@ -331,7 +568,7 @@ class AIAnalysisService:
 
         Recent Transactions:
         {json.dumps(data_context['recent_transactions'][:15], indent=2)}
-
+{computed_section}
         User Request: {custom_prompt}
 
         Please provide a comprehensive analysis addressing the user's specific question or request.
@@ -342,14 +579,15 @@ class AIAnalysisService:
         return {
             "analysis_type": "custom",
             "insights": response,
-            "custom_prompt": custom_prompt
+            "custom_prompt": custom_prompt,
+            "computed": computed
         }
 
+    @timed("openai_chat_completion")
     async def _call_openai(self, prompt: str) -> str:
         """Make API call to OpenAI"""
         try:
-            response = await asyncio.to_thread(
-                openai.ChatCompletion.create,
+            response = await get_openai_client().chat.completions.create(
                 model=settings.OPENAI_MODEL,
                 messages=[
                     {
@@ -372,45 +610,16 @@ class AIAnalysisService:
 
     def _calculate_health_score(self, summary: Dict[str, Any]) -> float:
         """Calculate financial health score (1-10)"""
-        score = 5.0  # Base score
-        
-        # Profit margin impact
-        if summary['profit_margin'] > 20:
-            score += 2
-        elif summary['profit_margin'] > 10:
-            score += 1
-        elif summary['profit_margin'] < 0:
-            score -= 3
-        
-        # Revenue size impact
-        if summary['total_revenue'] > 1000000:
-            score += 1
-        elif summary['total_revenue'] < 10000:
-            score -= 1
-        
-        # Transaction volume impact
-        if summary['total_records'] > 100:
-            score += 0.5
-        
-        return max(1.0, min(10.0, score))
+        # Same rules the nightly leaderboard applies to every dataset at once
+        from app.services.scoring_service import health_scores
+
+        return float(health_scores(summary['profit_margin'], summary['total_revenue'], summary['total_records']))
 
     def _calculate_risk_score(self, summary: Dict[str, Any]) -> float:
         """Calculate risk score (1-10, higher = more risky)"""
-        score = 5.0  # Base score
-        
-        # Profit margin risk
-        if summary['profit_margin'] < 0:
-            score += 3
-        elif summary['profit_margin'] < 5:
-            score += 2
-        elif summary['profit_margin'] > 20:
-            score -= 2
-        
-        # Revenue size risk
-        if summary['total_revenue'] < 50000:
-            score += 1
-        
-        return max(1.0, min(10.0, score))
+        from app.services.scoring_service import risk_scores
+
+        return float(risk_scores(summary['profit_margin'], summary['total_revenue']))
 
     async def _save_analysis(
         self,
@@ -420,15 +629,16 @@ class AIAnalysisService:
         result: Dict[str, Any],
         custom_prompt: Optional[str] = None
     ) -> Analysis:
-        """Save analysis results to database"""
-        
+        """Save analysis results to database, compressed, with the listing projection alongside"""
+        blob, size = pack_result(result)
         analysis = Analysis(
             dataset_id=dataset_id,
             user_id=user_id,
-            analysis_type=AnalysisType(analysis_type),
-            status=AnalysisStatus.COMPLETED,
-            result=result,
-            prompt=custom_prompt
+            analysis_type=AnalysisType(analysis_type).value,
+            status=AnalysisStatus.COMPLETED.value,
+            result_blob=blob,
+            prompt=custom_prompt,
+            **result_projection(result, size)
         )
         
         self.db.add(analysis)
@@ -442,20 +652,93 @@ class AIAnalysisService:
         user_id: int,
         dataset_id: Optional[int] = None,
         analysis_type: Optional[str] = None,
-        limit: int = 50
-    ) -> List[Analysis]:
-        """Get analysis history for user"""
-        from sqlalchemy import select, and_, desc
-        
-        query = select(Analysis).where(Analysis.user_id == user_id)
-        
+        limit: int = 50,
+        before: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        One page of a user's analyses, newest first, without their results.
+
+        Keyset-paginated on id: pass a page's ``next_cursor`` as ``before``
+        for the next page, which stays cheap however deep the history is.
+        """
+        conditions = [Analysis.user_id == user_id]
         if dataset_id:
-            query = query.where(Analysis.dataset_id == dataset_id)
-        
+            conditions.append(Analysis.dataset_id == dataset_id)
         if analysis_type:
-            query = query.where(Analysis.analysis_type == AnalysisType(analysis_type))
-        
-        query = query.order_by(desc(Analysis.created_at)).limit(limit)
-        
-        result = await self.db.execute(query)
-        return result.scalars().all()
+            conditions.append(Analysis.analysis_type == AnalysisType(analysis_type).value)
+        if before is not None:
+            conditions.append(Analysis.id < before)
+
+        # one extra row tells whether another page exists
+        rows = (await self.db.execute(
+            select(*HISTORY_COLUMNS).where(and_(*conditions)).order_by(desc(Analysis.id)).limit(limit + 1)
+        )).mappings().all()
+        items = [dict(row) for row in rows[:limit]]
+        return {"items": items, "next_cursor": items[-1]["id"] if len(rows) > limit else None}
+
+    async def get_analysis(self, analysis_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        """One of a user's stored analyses with its full, decompressed result; None if it is not theirs"""
+        analysis = await self.db.scalar(
+            select(Analysis).where(Analysis.id == analysis_id, Analysis.user_id == user_id)
+        )
+        if analysis is None:
+            return None
+        if analysis.result_blob is not None:
+            result = unpack_result(analysis.result_blob)
+        else:
+            result = json.loads(analysis.result) if analysis.result else None
+        return {
+            **{column.key: getattr(analysis, column.key) for column in HISTORY_COLUMNS},
+            "user_id": analysis.user_id,
+            "prompt": analysis.prompt,
+            "result": result,
+        }
+
+    async def compact_history(self) -> Dict[str, int]:
+        """
+        Delete analyses past ANALYSIS_RETENTION_DAYS and compress rows still
+        holding the legacy JSON text, filling in their listing projection.
+        """
+        deleted = 0
+        if settings.ANALYSIS_RETENTION_DAYS > 0:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=settings.ANALYSIS_RETENTION_DAYS)
+            deleted = (await self.db.execute(delete(Analysis).where(Analysis.created_at < cutoff))).rowcount
+            await self.db.commit()
+
+        compacted = 0
+        while True:
+            rows = (await self.db.execute(
+                select(Analysis.id, Analysis.result)
+                .where(Analysis.result.is_not(None))
+                .order_by(Analysis.id)
+                .limit(COMPACTION_BATCH_SIZE)
+            )).all()
+            if not rows:
+                break
+            changes = []
+            for analysis_id, text in rows:
+                try:
+                    result = json.loads(text)
+                except ValueError:
+                    result = {"insights": text}
+                if not isinstance(result, dict):
+                    result = {"insights": text}
+                blob, size = pack_result(result)
+                changes.append({
+                    "id": analysis_id,
+                    "result": None,
+                    "result_blob": blob,
+                    **result_projection(result, size)
+                })
+            # bulk UPDATE by primary key
+            await self.db.execute(update(Analysis), changes)
+            await self.db.commit()
+            compacted += len(changes)
+        return {"deleted": deleted, "compacted": compacted}
+
+
+@job("compact_analyses", every_seconds=settings.ANALYSIS_COMPACTION_INTERVAL_SECONDS)
+async def compact_analyses() -> Dict[str, int]:
+    """Periodic retention and compression of stored analyses"""
+    async with AsyncSessionLocal() as db:
+        return await AIAnalysisService(db).compact_history()
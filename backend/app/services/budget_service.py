@@ -0,0 +1,429 @@
+"""
+Budget Service - Planned amounts per category and month, variance against actuals and threshold alerts
+"""
+
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import analytics_cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, dialect_insert
+from app.core.events import event_bus
+from app.core.metrics import timed
+from app.core.money import DEFAULT_CURRENCY, exponent, to_minor_array
+from app.core.scheduler import job
+from app.models.financial_models import Budget, DailyRollup, FinancialDataset, RecordType
+from app.services.rollup_service import month_bucket
+
+logger = logging.getLogger(__name__)
+
+# Rows per upsert statement (5 columns each)
+UPSERT_BATCH_SIZE = 5000
+
+# Accepted spellings for each column of a budget file
+BUDGET_COLUMN_ALIASES = {
+    "period": ("period", "month", "budget_month", "date"),
+    "category": ("category", "account", "account_name"),
+    "planned": ("planned", "planned_amount", "budget", "budget_amount", "amount"),
+    "record_type": ("record_type", "type", "transaction_type"),
+}
+
+# Alert levels of a budget line; a line's level is stored so each crossing is published once
+ALERT_NONE, ALERT_WARNING, ALERT_EXCEEDED = 0, 1, 2
+ALERT_STATUS = np.array(["ok", "warning", "exceeded"], dtype=object)
+
+VARIANCE_COLUMNS = [
+    "id", "category", "record_type", "period", "planned_minor", "alert_level",
+    "actual_minor", "burned_minor", "variance_minor", "variance_pct", "burn_pct",
+]
+
+
+def parse_budget_frame(df: pd.DataFrame, currency: str = DEFAULT_CURRENCY) -> pd.DataFrame:
+    """
+    Map a budget file onto (period, category, record_type, planned_minor).
+
+    Periods are truncated to their month ("2024-03" and "2024-03-15" are
+    the same line), the record type defaults to expense and planned
+    amounts are minor units of ``currency``. Rows with an unparseable
+    period, a blank category, an unknown type or a negative or missing
+    amount are dropped; a line given twice keeps the last row.
+    """
+    lookup = {str(column).strip().lower().replace(" ", "_"): column for column in df.columns}
+    resolved = {}
+    for canonical, aliases in BUDGET_COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lookup:
+                resolved[canonical] = df[lookup[alias]]
+                break
+
+    if not {"period", "category", "planned"} <= resolved.keys():
+        raise ValueError("Budget file must contain period, category and planned amount columns")
+
+    frame = pd.DataFrame({
+        "period": pd.to_datetime(resolved["period"].astype("string"), errors="coerce").dt.to_period("M").dt.to_timestamp(),
+        "category": resolved["category"].astype("string").str.strip(),
+        "planned": pd.to_numeric(resolved["planned"], errors="coerce"),
+    })
+    if "record_type" in resolved:
+        frame["record_type"] = resolved["record_type"].astype("string").str.strip().str.lower().fillna(RecordType.EXPENSE.value)
+    else:
+        frame["record_type"] = RecordType.EXPENSE.value
+
+    valid = (
+        frame["period"].notna()
+        & frame["category"].fillna("").ne("")
+        & (frame["planned"] >= 0)
+        & frame["record_type"].isin([record_type.value for record_type in RecordType])
+    )
+    frame = frame[valid].drop_duplicates(subset=["period", "record_type", "category"], keep="last").reset_index(drop=True)
+    frame["planned_minor"] = to_minor_array(frame.pop("planned"), pd.Series(currency, index=frame.index))
+    return frame.astype({"category": str, "record_type": str})
+
+
+@timed("budget_alert_levels")
+def alert_levels(
+    record_types: np.ndarray,
+    planned: np.ndarray,
+    burned: np.ndarray,
+    elapsed: np.ndarray,
+    warning_pct: float,
+    alert_pct: float
+) -> np.ndarray:
+    """
+    Alert level per budget line from what was burned by the as-of date.
+
+    Expense lines warn at ``warning_pct`` of plan burned, or when the
+    current month's pace projects past ``alert_pct``, and are exceeded
+    past ``alert_pct`` burned. Revenue lines are the mirror image: a closed
+    month below ``warning_pct`` of plan is exceeded (a shortfall), below
+    ``alert_pct`` or an open month pacing under ``warning_pct`` warns.
+    Months that have not started never alert.
+    """
+    planned = planned.astype(np.float64)
+    burned = burned.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # an unplanned line is fully burned by any spend
+        burn_pct = np.where(planned > 0, burned * 100 / planned, np.where(burned > 0, np.inf, 0.0))
+        projected_pct = np.where(elapsed > 0, burn_pct / elapsed, 0.0)
+    started = elapsed > 0
+    closed = elapsed >= 1
+    revenue = record_types == RecordType.REVENUE.value
+
+    expense_level = np.select(
+        [burn_pct > alert_pct, (burn_pct >= warning_pct) | (projected_pct > alert_pct)],
+        [ALERT_EXCEEDED, ALERT_WARNING],
+        ALERT_NONE
+    )
+    revenue_level = np.select(
+        [closed & (burn_pct < warning_pct), closed & (burn_pct < alert_pct), ~closed & (projected_pct < warning_pct)],
+        [ALERT_EXCEEDED, ALERT_WARNING, ALERT_WARNING],
+        ALERT_NONE
+    )
+    return np.where(started, np.where(revenue, revenue_level, expense_level), ALERT_NONE)
+
+
+def month_labels(periods: pd.Series) -> np.ndarray:
+    """"YYYY-MM" per row, formatting each distinct month once"""
+    codes, months = pd.factorize(periods)
+    return np.asarray(months.strftime("%Y-%m"), dtype=object)[codes]
+
+
+def records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Row dicts without DataFrame.to_dict's per-row overhead (tens of thousands of lines)"""
+    columns = list(frame.columns)
+    return [dict(zip(columns, row)) for row in zip(*(frame[column].tolist() for column in columns))]
+
+
+def elapsed_fraction(periods: pd.Series, as_of: date) -> np.ndarray:
+    """Share of each month elapsed by the end of ``as_of``: 1 for past months, 0 for future ones"""
+    days = periods.dt.days_in_month.to_numpy(dtype=np.float64)
+    into = (pd.Timestamp(as_of) - periods).dt.days.to_numpy(dtype=np.float64) + 1
+    return np.clip(into, 0, days) / days
+
+
+class BudgetService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.bind.dialect.name
+
+    async def _dataset_currency(self, dataset_id: int) -> str:
+        """Raises ValueError for an unknown dataset"""
+        currency = await self.db.scalar(select(FinancialDataset.currency).where(FinancialDataset.id == dataset_id))
+        if currency is None:
+            raise ValueError("Dataset not found")
+        return currency
+
+    async def load_budget_frame(self, dataset_id: int, df: pd.DataFrame) -> Dict[str, Any]:
+        """Parse an uploaded budget file in the dataset's currency and import it"""
+        frame = parse_budget_frame(df, await self._dataset_currency(dataset_id))
+        imported = await self.import_budgets(dataset_id, frame)
+        return {
+            "total_rows": len(df),
+            "budget_lines": imported,
+            "skipped_rows": len(df) - imported,
+            "periods": frame["period"].drop_duplicates().sort_values().dt.strftime("%Y-%m").tolist(),
+            "categories": int(frame["category"].nunique()),
+        }
+
+    async def import_budgets(self, dataset_id: int, frame: pd.DataFrame) -> int:
+        """
+        Upsert parsed budget lines, replacing the planned amount of lines
+        already loaded, then re-check the dataset's alerts against the new plan.
+        """
+        if frame.empty:
+            return 0
+        rows = [
+            {"dataset_id": dataset_id, "period": period.date(), "record_type": record_type, "category": category, "planned_minor": int(planned)}
+            for period, record_type, category, planned in zip(
+                frame["period"], frame["record_type"], frame["category"], frame["planned_minor"]
+            )
+        ]
+        insert = dialect_insert(self.db)
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            statement = insert(Budget).values(rows[start:start + UPSERT_BATCH_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=["dataset_id", "period", "record_type", "category"],
+                set_={"planned_minor": statement.excluded.planned_minor, "updated_at": func.now()}
+            )
+            await self.db.execute(statement)
+        await self.db.commit()
+        await analytics_cache.invalidate(dataset_id)
+        await self.check_alerts(dataset_id)
+        return len(rows)
+
+    @timed("budget_variance_query")
+    async def variance_frame(
+        self,
+        dataset_id: int,
+        as_of: date,
+        period_from: Optional[date] = None,
+        period_to: Optional[date] = None,
+        category: Optional[str] = None,
+        record_type: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        One row per budget line with its actual, burned-to-date, variance and
+        percentages, from a single query.
+
+        Rollups are aggregated to (month, type, category) once and hash-joined
+        to the budget lines, rather than each line range-scanning its month,
+        so the cost is one pass over the dataset's rollups from the first
+        budgeted month however many lines there are.
+        """
+        conditions = [Budget.dataset_id == dataset_id]
+        if period_from:
+            conditions.append(Budget.period >= period_from.replace(day=1))
+        if period_to:
+            conditions.append(Budget.period <= period_to)
+        if category:
+            conditions.append(Budget.category == category)
+        if record_type:
+            conditions.append(Budget.record_type == record_type)
+
+        rollup_conditions = [
+            DailyRollup.dataset_id == dataset_id,
+            DailyRollup.day >= select(func.min(Budget.period)).where(and_(*conditions)).scalar_subquery(),
+        ]
+        if period_to:
+            rollup_conditions.append(DailyRollup.day < (pd.Timestamp(period_to).to_period("M") + 1).to_timestamp().date())
+        if category:
+            rollup_conditions.append(DailyRollup.category == category)
+        if record_type:
+            rollup_conditions.append(DailyRollup.record_type == record_type)
+
+        month = month_bucket(DailyRollup.day, self.dialect).label("period")
+        actuals = select(
+            month,
+            DailyRollup.record_type,
+            DailyRollup.category,
+            func.sum(DailyRollup.total_minor).label("actual_minor"),
+            func.sum(DailyRollup.total_minor).filter(DailyRollup.day <= as_of).label("burned_minor")
+        ).where(and_(*rollup_conditions)).group_by(month, DailyRollup.record_type, DailyRollup.category).subquery("actuals")
+
+        actual = func.coalesce(actuals.c.actual_minor, 0)
+        burned = func.coalesce(actuals.c.burned_minor, 0)
+        planned = func.nullif(Budget.planned_minor, 0)
+        result = await self.db.execute(
+            select(
+                Budget.id,
+                Budget.category,
+                Budget.record_type,
+                Budget.period,
+                Budget.planned_minor,
+                Budget.alert_level,
+                actual.label("actual_minor"),
+                burned.label("burned_minor"),
+                (actual - Budget.planned_minor).label("variance_minor"),
+                ((actual - Budget.planned_minor) * 100.0 / planned).label("variance_pct"),
+                (burned * 100.0 / planned).label("burn_pct"),
+            ).select_from(Budget).outerjoin(
+                actuals,
+                and_(
+                    actuals.c.period == Budget.period,
+                    actuals.c.record_type == Budget.record_type,
+                    actuals.c.category == Budget.category
+                )
+            ).where(and_(*conditions)).order_by(Budget.period, Budget.record_type, Budget.category)
+        )
+        frame = pd.DataFrame(result.all(), columns=VARIANCE_COLUMNS)
+        frame["period"] = pd.to_datetime(frame["period"])
+        for column in ("planned_minor", "actual_minor", "burned_minor", "variance_minor"):
+            frame[column] = frame[column].astype(np.int64)
+        for column in ("variance_pct", "burn_pct"):
+            frame[column] = frame[column].astype(np.float64)
+
+        frame["elapsed"] = elapsed_fraction(frame["period"], as_of)
+        frame["level"] = alert_levels(
+            frame["record_type"].to_numpy(dtype=object), frame["planned_minor"].to_numpy(), frame["burned_minor"].to_numpy(),
+            frame["elapsed"].to_numpy(), settings.BUDGET_WARNING_PCT, settings.BUDGET_ALERT_PCT
+        )
+        return frame
+
+    async def get_variance(
+        self,
+        dataset_id: int,
+        as_of: Optional[date] = None,
+        period_from: Optional[date] = None,
+        period_to: Optional[date] = None,
+        category: Optional[str] = None,
+        record_type: Optional[str] = None,
+        alerts_only: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Budget vs actual per category and month, with totals per month and type.
+
+        ``variance`` is actual minus planned, so it is positive for an
+        expense overrun and for revenue above plan. ``burned`` counts what
+        was booked up to ``as_of`` (default today) and ``projected`` extends
+        the current month's burn at its pace so far. Percentages are null
+        for lines planned at zero. Raises ValueError for an unknown dataset.
+        """
+        currency = await self._dataset_currency(dataset_id)
+        as_of = as_of or date.today()
+        frame = await self.variance_frame(dataset_id, as_of, period_from, period_to, category, record_type)
+
+        totals = frame.groupby(["period", "record_type"], as_index=False)[
+            ["planned_minor", "actual_minor", "burned_minor", "variance_minor"]
+        ].sum()
+        totals["variance_pct"] = totals["variance_minor"] * 100.0 / totals["planned_minor"].where(totals["planned_minor"] > 0)
+        totals["burn_pct"] = totals["burned_minor"] * 100.0 / totals["planned_minor"].where(totals["planned_minor"] > 0)
+
+        lines = self._lines(frame, currency)
+        alerts = lines[lines["status"] != "ok"]
+        return {
+            "dataset_id": dataset_id,
+            "currency": currency,
+            "as_of": as_of.isoformat(),
+            "thresholds": {"warning_pct": settings.BUDGET_WARNING_PCT, "alert_pct": settings.BUDGET_ALERT_PCT},
+            "periods": frame["period"].drop_duplicates().sort_values().dt.strftime("%Y-%m").tolist(),
+            "totals": records(self._amounts(totals, currency)),
+            "lines": records(alerts if alerts_only else lines),
+            "alerts": int(len(alerts)),
+        }
+
+    @staticmethod
+    def _amounts(frame: pd.DataFrame, currency: str) -> pd.DataFrame:
+        """Period, type, amounts in currency units and rounded percentages"""
+        scale = 10 ** exponent(currency)
+        amounts = pd.DataFrame({
+            "period": month_labels(frame["period"]),
+            "record_type": frame["record_type"],
+            "planned": frame["planned_minor"] / scale,
+            "actual": frame["actual_minor"] / scale,
+            "variance": frame["variance_minor"] / scale,
+            "variance_pct": frame["variance_pct"].round(2),
+            "burned": frame["burned_minor"] / scale,
+            "burn_pct": frame["burn_pct"].round(2),
+        })
+        # NaN is not valid JSON
+        return amounts.astype(object).where(amounts.notna(), None)
+
+    def _lines(self, frame: pd.DataFrame, currency: str) -> pd.DataFrame:
+        scale = 10 ** exponent(currency)
+        elapsed = frame["elapsed"]
+        projected = (frame["burned_minor"] / elapsed.where(elapsed > 0)).round()
+        lines = self._amounts(frame, currency)
+        lines.insert(1, "category", frame["category"])
+        extra = pd.DataFrame({
+            "elapsed_pct": (elapsed * 100).round(2),
+            "projected": projected / scale,
+            "projected_pct": (projected * 100.0 / frame["planned_minor"].where(frame["planned_minor"] > 0)).round(2),
+        })
+        lines = pd.concat([lines, extra.astype(object).where(extra.notna(), None)], axis=1)
+        lines["status"] = ALERT_STATUS[frame["level"].to_numpy()]
+        return lines
+
+    async def check_alerts(self, dataset_id: int, as_of: Optional[date] = None) -> List[Dict[str, Any]]:
+        """
+        Recompute every budget line's alert level and publish a
+        ``budget_alert`` event for the lines whose level rose.
+
+        Levels are stored per line, so a crossing is announced once; a line
+        that falls back (a raised plan, a corrected upload) can alert again.
+        """
+        currency = await self._dataset_currency(dataset_id)
+        frame = await self.variance_frame(dataset_id, as_of or date.today())
+        changed = frame[frame["level"] != frame["alert_level"]]
+        if changed.empty:
+            return []
+
+        await self.db.execute(
+            update(Budget),
+            [{"id": int(line_id), "alert_level": int(level)} for line_id, level in zip(changed["id"], changed["level"])]
+        )
+        await self.db.commit()
+
+        raised = changed[changed["level"] > changed["alert_level"]]
+        alerts = records(self._lines(raised, currency)) if not raised.empty else []
+        if alerts:
+            await event_bus.publish("budget_alert", dataset_id, currency=currency, alerts=alerts)
+        return alerts
+
+    async def expense_insights(self, dataset_id: int, limit: int = 3) -> List[str]:
+        """Plain-language budget findings for the latest budgeted month with actuals"""
+        currency = await self._dataset_currency(dataset_id)
+        frame = await self.variance_frame(dataset_id, date.today(), record_type=RecordType.EXPENSE.value)
+        booked = frame.loc[frame["actual_minor"] > 0, "period"]
+        if booked.empty:
+            return []
+        latest = frame[frame["period"] == booked.max()]
+        period = latest["period"].iloc[0].strftime("%Y-%m")
+        scale = 10 ** exponent(currency)
+
+        over = latest[latest["variance_minor"] > 0].sort_values("variance_minor", ascending=False)
+        if over.empty:
+            return [f"All {len(latest)} budgeted expense categories are within plan for {period}"]
+        insights = []
+        for line in over.head(limit).itertuples():
+            share = f" ({line.variance_pct:.1f}% over plan)" if pd.notna(line.variance_pct) else ""
+            insights.append(
+                f"{line.category} spending is {line.variance_minor / scale:,.2f} {currency} above budget for {period}{share}"
+            )
+        under = latest["variance_minor"].clip(upper=0).sum()
+        if under < 0:
+            insights.append(f"Categories under budget for {period} leave {-under / scale:,.2f} {currency} of planned spend unused")
+        return insights
+
+
+@job("check_budget_alerts", every_seconds=settings.BUDGET_ALERT_INTERVAL_SECONDS)
+async def check_budget_alerts() -> Dict[str, Any]:
+    """Periodic re-check of every dataset with budgets"""
+    async with AsyncSessionLocal() as db:
+        service = BudgetService(db)
+        dataset_ids = (await db.execute(select(Budget.dataset_id).distinct())).scalars().all()
+        raised = 0
+        for dataset_id in dataset_ids:
+            try:
+                raised += len(await service.check_alerts(dataset_id))
+            except Exception:
+                logger.exception("Budget alert check failed for dataset %s", dataset_id)
+        return {"datasets_checked": len(dataset_ids), "alerts_raised": raised}
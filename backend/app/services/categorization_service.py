@@ -0,0 +1,345 @@
+"""
+Categorization Service - Rule-based and learned categories for uncategorized records at ingest
+"""
+
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, delete, desc, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import CATEGORY_RULES_SCOPE, analytics_cache
+from app.core.config import settings
+from app.core.metrics import timed
+from app.core.money import CURRENCY_EXPONENTS
+from app.models.financial_models import CategoryRule, FinancialDataset, FinancialRecord
+from app.schemas.financial_schemas import CategoryRuleCreate
+
+logger = logging.getLogger(__name__)
+
+UNCATEGORIZED = "Uncategorized"
+# Category values that mean "none given" (compared case-insensitively)
+PLACEHOLDER_CATEGORIES = ("", "uncategorized", "unknown", "none", "n/a", "nan")
+
+# Words the classifier sees: letters only, so invoice numbers and dates do not become features
+WORD_PATTERN = r"[^\W\d_]{2,}"
+MAX_FEATURES = 20000
+# Categories need this many examples before the classifier predicts them
+MIN_CLASS_EXAMPLES = 3
+SMOOTHING = 0.1
+
+MATCH_FLAGS = re.IGNORECASE | re.DOTALL
+# \1..\9 not preceded by an escaped backslash; numbers would point at other rules' groups once combined
+BACKREFERENCE = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]")
+
+
+def is_uncategorized(categories: pd.Series) -> np.ndarray:
+    return categories.fillna("").astype(str).str.strip().str.lower().isin(PLACEHOLDER_CATEGORIES).to_numpy()
+
+
+def major_amounts(frame: pd.DataFrame) -> np.ndarray:
+    """Absolute amounts in major units of each row's currency"""
+    scale = 10.0 ** frame["currency"].map(CURRENCY_EXPONENTS).fillna(2).to_numpy()
+    return np.abs(frame["amount_minor"].to_numpy(dtype=np.float64)) / scale
+
+
+def rule_condition(rule: Any) -> str:
+    """
+    The rule's text conditions as zero-width lookaheads from the start of
+    the description, so they combine into one alternation per rule set
+    """
+    lookaheads = []
+    if rule.keywords:
+        words = [re.escape(word.strip()).replace(r"\ ", r"\s+") for word in rule.keywords.split(",") if word.strip()]
+        if words:
+            lookaheads.append(rf"(?=.*?\b(?:{'|'.join(words)})\b)")
+    if rule.pattern:
+        lookaheads.append(f"(?=.*?(?:{rule.pattern}))")
+    return "".join(lookaheads)
+
+
+def check_condition(condition: str, pattern: Optional[str] = None) -> re.Pattern:
+    """
+    Compile one rule's condition the way RuleMatcher embeds it. Raises
+    ValueError if it does not compile there (inline global flags such as
+    ``(?i)``) or would change meaning (named groups, backreferences).
+    """
+    if pattern and BACKREFERENCE.search(pattern):
+        raise ValueError("Invalid pattern: backreferences are not supported")
+    try:
+        compiled = re.compile(f"^(?:(?P<r0>{condition}))", MATCH_FLAGS)
+    except re.error as e:
+        raise ValueError(f"Invalid pattern: {e.msg}")
+    if set(compiled.groupindex) != {"r0"}:
+        raise ValueError("Invalid pattern: named groups are not supported")
+    return compiled
+
+
+class RuleMatcher:
+    """
+    A rule set compiled into one regular expression.
+
+    Each active rule becomes one alternative of an anchored alternation,
+    ordered by priority: ``^(?:(?P<r0>lookaheads0)|(?P<r1>lookaheads1)|...)``.
+    The regex engine tries the alternatives in order at position 0, so a
+    single vectorized ``str.extract`` pass yields the highest-priority rule
+    whose text conditions hold for each row. Record type and amount bounds
+    are then checked as array comparisons; rows whose candidate fails them
+    are re-matched against the lower-priority rules only, which is rare.
+    """
+
+    def __init__(self, rules: Sequence[Any]):
+        # each rule is compiled alone first, so one bad stored pattern cannot break the combined matcher
+        self.rules = []
+        for rule in rules:
+            try:
+                check_condition(rule_condition(rule), rule.pattern)
+            except ValueError as e:
+                logger.warning("Skipping category rule %s: %s", rule.id, e)
+                continue
+            self.rules.append(rule)
+        self.categories = np.array([rule.category for rule in self.rules], dtype=object)
+        self.record_types = np.array([rule.record_type for rule in self.rules], dtype=object)
+        self.min_amounts = np.array([np.nan if rule.min_amount is None else rule.min_amount for rule in self.rules])
+        self.max_amounts = np.array([np.nan if rule.max_amount is None else rule.max_amount for rule in self.rules])
+        self._conditions = [rule_condition(rule) for rule in self.rules]
+        self._compiled: Dict[int, re.Pattern] = {}
+
+    def _pattern(self, start: int) -> re.Pattern:
+        """The combined matcher over rules[start:]"""
+        if start not in self._compiled:
+            alternatives = "|".join(
+                f"(?P<r{index}>{condition})" for index, condition in enumerate(self._conditions[start:], start)
+            )
+            self._compiled[start] = re.compile(f"^(?:{alternatives})", MATCH_FLAGS)
+        return self._compiled[start]
+
+    @timed("category_rules_match")
+    def match(self, descriptions: pd.Series, record_types: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        """Index of the winning rule per row, -1 where none applies"""
+        result = np.full(len(descriptions), -1)
+        if not self.rules or not len(descriptions):
+            return result
+        texts = descriptions.fillna("").astype(str).reset_index(drop=True)
+        start = np.zeros(len(texts), dtype=np.int64)
+        pending = np.ones(len(texts), dtype=bool)
+
+        while pending.any():
+            for first in np.unique(start[pending]):
+                rows = np.flatnonzero(pending & (start == first))
+                names = [f"r{index}" for index in range(first, len(self.rules))]
+                # groups inside user patterns add columns of their own; keep the rules' groups
+                matched = texts.iloc[rows].str.extract(self._pattern(int(first)))[names].notna().to_numpy()
+                hit = matched.any(axis=1)
+                candidate = first + matched.argmax(axis=1)
+                rule_type = self.record_types[candidate]
+                low, high = self.min_amounts[candidate], self.max_amounts[candidate]
+                row_amounts = amounts[rows]
+                allowed = (
+                    hit
+                    & (pd.isna(rule_type) | (rule_type == record_types[rows]))
+                    & (np.isnan(low) | (row_amounts >= low))
+                    & (np.isnan(high) | (row_amounts <= high))
+                )
+                result[rows[allowed]] = candidate[allowed]
+                retry = hit & ~allowed & (candidate + 1 < len(self.rules))
+                pending[rows] = retry
+                start[rows[retry]] = candidate[retry] + 1
+        return result
+
+
+def _tokens(frame: pd.DataFrame, amounts: np.ndarray) -> Tuple[pd.Series, np.ndarray]:
+    """
+    Classifier tokens per row position: description words plus the record
+    type and the order of magnitude of the amount. Also returns whether
+    each row had any description word.
+    """
+    words = frame["description"].fillna("").astype(str).str.lower().str.findall(WORD_PATTERN).reset_index(drop=True).explode().dropna()
+    positions = pd.RangeIndex(len(frame))
+    extras = [
+        "__type_" + pd.Series(frame["record_type"].astype(str).to_numpy(), index=positions),
+        "__amount_" + pd.Series(np.floor(np.log10(amounts + 1)).astype(int), index=positions).astype(str),
+    ]
+    has_words = np.bincount(words.index.to_numpy(dtype=np.int64), minlength=len(frame)) > 0
+    return pd.concat([words, *extras]), has_words
+
+
+class CategoryModel:
+    """
+    Multinomial naive Bayes over sublinear TF-IDF features: a linear model
+    trained in one pass of counting, with no dependency beyond NumPy.
+    """
+
+    def __init__(self, vocabulary: pd.Series, idf: np.ndarray, classes: np.ndarray, log_prior: np.ndarray, log_likelihood: np.ndarray):
+        self.vocabulary = vocabulary  # token -> feature index
+        self.idf = idf
+        self.classes = classes
+        self.log_prior = log_prior
+        self.log_likelihood = log_likelihood  # (features x classes)
+
+    @staticmethod
+    def _weights(tokens: pd.Series, vocabulary: pd.Series, idf: np.ndarray, rows: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(row, feature, weight) triplets of the L2-normalised TF-IDF matrix"""
+        features = tokens.map(vocabulary).dropna()
+        pairs = features.index.to_numpy(dtype=np.int64) * len(vocabulary) + features.to_numpy(dtype=np.int64)
+        pairs, counts = np.unique(pairs, return_counts=True)
+        row, feature = np.divmod(pairs, len(vocabulary))
+        weight = (1 + np.log(counts)) * idf[feature]
+        norms = np.sqrt(np.bincount(row, weights=weight ** 2, minlength=rows))
+        return row, feature, weight / norms[row]
+
+    @classmethod
+    @timed("category_model_train")
+    def train(cls, frame: pd.DataFrame) -> Optional["CategoryModel"]:
+        """Fit on categorised rows; None without at least two well-represented categories"""
+        counts = frame["category"].value_counts()
+        frame = frame[frame["category"].isin(counts[counts >= MIN_CLASS_EXAMPLES].index)].reset_index(drop=True)
+        if frame["category"].nunique() < 2:
+            return None
+
+        tokens, _ = _tokens(frame, major_amounts(frame))
+        document_frequency = pd.DataFrame({"row": tokens.index, "token": tokens.to_numpy()}).drop_duplicates()["token"].value_counts()
+        document_frequency = document_frequency[document_frequency >= 2].head(MAX_FEATURES)
+        if document_frequency.empty:
+            return None
+        vocabulary = pd.Series(np.arange(len(document_frequency)), index=document_frequency.index)
+        idf = np.log((1 + len(frame)) / (1 + document_frequency.to_numpy(dtype=np.float64))) + 1
+
+        classes, labels = np.unique(frame["category"].to_numpy(dtype=object), return_inverse=True)
+        row, feature, weight = cls._weights(tokens, vocabulary, idf, len(frame))
+        totals = np.zeros((len(vocabulary), len(classes)))
+        np.add.at(totals, (feature, labels[row]), weight)
+        log_likelihood = np.log((totals + SMOOTHING) / (totals.sum(axis=0) + SMOOTHING * len(vocabulary)))
+        log_prior = np.log(np.bincount(labels) / len(labels))
+        return cls(vocabulary, idf, classes, log_prior, log_likelihood)
+
+    def predict(self, frame: pd.DataFrame, amounts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Most likely category and its posterior probability per row; rows without words get probability 0"""
+        frame = frame.reset_index(drop=True)
+        tokens, has_words = _tokens(frame, amounts)
+        row, feature, weight = self._weights(tokens, self.vocabulary, self.idf, len(frame))
+        scores = np.tile(self.log_prior, (len(frame), 1))
+        np.add.at(scores, row, weight[:, None] * self.log_likelihood[feature])
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        best = probabilities.argmax(axis=1)
+        confidence = np.where(has_words, probabilities[np.arange(len(frame)), best], 0.0)
+        return self.classes[best], confidence
+
+
+# Per-process caches: compiled rules per dataset (keyed by the rules generation)
+# and the classifier per owner (retrained after CATEGORIZER_MODEL_TTL_SECONDS)
+_matchers: Dict[int, Tuple[str, RuleMatcher]] = {}
+_models: Dict[int, Tuple[float, Optional[CategoryModel]]] = {}
+
+
+class CategorizationService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def list_rules(self, owner_id: int, dataset_id: Optional[int] = None) -> List[CategoryRule]:
+        query = select(CategoryRule).where(CategoryRule.owner_id == owner_id)
+        if dataset_id is not None:
+            query = query.where(or_(CategoryRule.dataset_id.is_(None), CategoryRule.dataset_id == dataset_id))
+        result = await self.db.execute(query.order_by(desc(CategoryRule.priority), CategoryRule.id))
+        return result.scalars().all()
+
+    async def create_rule(self, rule_data: CategoryRuleCreate) -> CategoryRule:
+        """Store a rule; raises ValueError for an invalid regex or a rule with no condition"""
+        if not (rule_data.pattern or rule_data.keywords or rule_data.record_type
+                or rule_data.min_amount is not None or rule_data.max_amount is not None):
+            raise ValueError("A rule needs a pattern, keywords, record type or amount bound")
+        check_condition(rule_condition(rule_data), rule_data.pattern)
+        rule = CategoryRule(**rule_data.model_dump())
+        self.db.add(rule)
+        await self.db.commit()
+        await self.db.refresh(rule)
+        await analytics_cache.invalidate(CATEGORY_RULES_SCOPE)
+        return rule
+
+    async def delete_rule(self, rule_id: int, owner_id: int) -> bool:
+        result = await self.db.execute(
+            delete(CategoryRule).where(CategoryRule.id == rule_id, CategoryRule.owner_id == owner_id)
+        )
+        await self.db.commit()
+        if not result.rowcount:
+            return False
+        await analytics_cache.invalidate(CATEGORY_RULES_SCOPE)
+        return True
+
+    async def _matcher(self, dataset_id: int, owner_id: int) -> RuleMatcher:
+        generation = await analytics_cache.generation(CATEGORY_RULES_SCOPE)
+        cached = _matchers.get(dataset_id)
+        if cached is None or cached[0] != generation:
+            rules = [rule for rule in await self.list_rules(owner_id, dataset_id) if rule.is_active]
+            cached = _matchers[dataset_id] = (generation, RuleMatcher(rules))
+        return cached[1]
+
+    async def _model(self, owner_id: int) -> Optional[CategoryModel]:
+        """The owner's classifier, trained on their most recent categorised records"""
+        cached = _models.get(owner_id)
+        if cached is not None and time.monotonic() - cached[0] < settings.CATEGORIZER_MODEL_TTL_SECONDS:
+            return cached[1]
+        result = await self.db.execute(
+            select(
+                FinancialRecord.description, FinancialRecord.record_type, FinancialRecord.amount_minor,
+                FinancialRecord.currency, FinancialRecord.category
+            )
+            .join(FinancialDataset, FinancialDataset.id == FinancialRecord.dataset_id)
+            .where(and_(
+                FinancialDataset.owner_id == owner_id,
+                FinancialRecord.description.isnot(None),
+                func.lower(func.trim(func.coalesce(FinancialRecord.category, ""))).notin_(PLACEHOLDER_CATEGORIES),
+            ))
+            .order_by(desc(FinancialRecord.id))
+            .limit(settings.CATEGORIZER_TRAINING_LIMIT)
+        )
+        frame = pd.DataFrame(result.all(), columns=["description", "record_type", "amount_minor", "currency", "category"])
+        model = CategoryModel.train(frame) if not frame.empty else None
+        _models[owner_id] = (time.monotonic(), model)
+        return model
+
+    @timed("categorize_frame")
+    async def categorize(self, dataset_id: int, frame: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, int]]:
+        """
+        Fill in the category of uncategorized rows of an ingest chunk.
+
+        The owner's rules decide first; the classifier then labels what is
+        left when its confidence reaches CATEGORIZER_MIN_CONFIDENCE. Rows
+        neither can place become "Uncategorized". Rows that arrive with a
+        category keep it.
+        """
+        counts = {"rules": 0, "model": 0}
+        missing = is_uncategorized(frame["category"])
+        if not missing.any():
+            return frame, counts
+        owner_id = await self.db.scalar(select(FinancialDataset.owner_id).where(FinancialDataset.id == dataset_id))
+
+        frame = frame.copy()
+        positions = np.flatnonzero(missing)
+        subset = frame.iloc[positions]
+        amounts = major_amounts(subset)
+        categories = np.full(len(positions), UNCATEGORIZED, dtype=object)
+
+        if owner_id is not None:
+            matcher = await self._matcher(dataset_id, owner_id)
+            winners = matcher.match(subset["description"], subset["record_type"].astype(str).to_numpy(dtype=object), amounts)
+            by_rule = winners >= 0
+            categories[by_rule] = matcher.categories[winners[by_rule]]
+            counts["rules"] = int(by_rule.sum())
+
+            remaining = np.flatnonzero(~by_rule)
+            model = await self._model(owner_id) if len(remaining) else None
+            if model is not None:
+                predicted, confidence = model.predict(subset.iloc[remaining], amounts[remaining])
+                confident = confidence >= settings.CATEGORIZER_MIN_CONFIDENCE
+                categories[remaining[confident]] = predicted[confident]
+                counts["model"] = int(confident.sum())
+
+        frame.iloc[positions, frame.columns.get_loc("category")] = categories
+        return frame, counts
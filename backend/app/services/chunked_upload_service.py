@@ -0,0 +1,333 @@
+"""
+Chunked Upload Service - Resumable uploads with ingestion overlapping the transfer
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+
+import aiofiles
+import aiofiles.os
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import timer
+
+if TYPE_CHECKING:
+    from app.services.ingestion_service import OccurrenceCounts
+
+MANIFEST_NAME = "manifest.json"
+CARRY_NAME = "carry.part"
+
+# Per-process queue in front of the cross-worker lock, so waiters do not each hold a connection
+_upload_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _lock_for(upload_id: str) -> asyncio.Lock:
+    if upload_id not in _upload_locks:
+        _upload_locks[upload_id] = asyncio.Lock()
+    return _upload_locks[upload_id]
+
+
+def _advisory_key(upload_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(upload_id.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def _to_ranges(indices: List[int]) -> List[List[int]]:
+    """Collapse sorted chunk indices into inclusive [start, end] ranges"""
+    ranges: List[List[int]] = []
+    for index in indices:
+        if ranges and index == ranges[-1][1] + 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ranges
+
+
+class UploadNotFoundError(LookupError):
+    pass
+
+
+class ChunkedUploadService:
+    """
+    Spools numbered chunks to ``UPLOAD_DIR/<upload_id>/`` next to a JSON manifest.
+
+    State lives on disk rather than in process memory, so a dropped connection
+    or a restarted worker only costs the chunks that were in flight. For CSV
+    files, every time the contiguous prefix of received chunks grows, the new
+    complete lines are parsed and bulk-loaded; content-hash deduplication makes
+    a retried batch harmless. Excel workbooks cannot be parsed incrementally
+    and are loaded when the upload is finalised.
+
+    Lines are split on raw newlines, so CSV fields containing quoted line
+    breaks are not supported by the streaming path.
+    """
+
+    def __init__(self, db: AsyncSession, upload_dir: Optional[str] = None):
+        self.db = db
+        self.upload_dir = upload_dir or settings.UPLOAD_DIR
+
+    def _path(self, upload_id: str, name: str = "") -> str:
+        # upload ids are generated server side; reject anything else early
+        if not upload_id.isalnum():
+            raise UploadNotFoundError(upload_id)
+        return os.path.join(self.upload_dir, upload_id, name)
+
+    def _chunk_path(self, upload_id: str, index: int) -> str:
+        return self._path(upload_id, f"chunk_{index:06d}.part")
+
+    def _occurrences_path(self, upload_id: str, parsed_chunks: int) -> str:
+        # versioned by the chunks it covers, so a crash between writes never pairs it with the wrong manifest
+        return self._path(upload_id, f"occurrences_{parsed_chunks:06d}.npz")
+
+    @asynccontextmanager
+    async def _upload_lock(self, upload_id: str) -> AsyncIterator[None]:
+        """
+        Serialise manifest updates and the CSV parser of one upload across
+        API workers: a session-level advisory lock on PostgreSQL, held on a
+        connection of its own because ingestion commits in between. Other
+        databases run a single worker, where the process lock suffices.
+        """
+        async with _lock_for(upload_id):
+            engine = self.db.bind
+            if engine.dialect.name != "postgresql":
+                yield
+                return
+            key = _advisory_key(upload_id)
+            async with engine.connect() as conn:
+                await conn.execute(select(func.pg_advisory_lock(key)))
+                try:
+                    yield
+                finally:
+                    await conn.execute(select(func.pg_advisory_unlock(key)))
+
+    async def _read_manifest(self, upload_id: str) -> Dict[str, Any]:
+        path = self._path(upload_id, MANIFEST_NAME)
+        if not await aiofiles.os.path.exists(path):
+            raise UploadNotFoundError(upload_id)
+        async with aiofiles.open(path, "r") as f:
+            return json.loads(await f.read())
+
+    async def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        path = self._path(manifest["upload_id"], MANIFEST_NAME)
+        async with aiofiles.open(path + ".tmp", "w") as f:
+            await f.write(json.dumps(manifest))
+        await aiofiles.os.replace(path + ".tmp", path)
+
+    async def initiate(
+        self,
+        filename: str,
+        total_size: int,
+        dataset_id: int,
+        chunk_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Start a new upload session and return its manifest"""
+        if not filename.endswith(('.csv', '.xlsx', '.xls')):
+            raise ValueError("Only CSV and Excel files are supported")
+        if total_size <= 0 or total_size > settings.MAX_CHUNKED_UPLOAD_SIZE:
+            raise ValueError(f"File size must be between 1 byte and {settings.MAX_CHUNKED_UPLOAD_SIZE} bytes")
+
+        chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+        upload_id = uuid.uuid4().hex
+        manifest = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "dataset_id": dataset_id,
+            "total_size": total_size,
+            "chunk_size": chunk_size,
+            "total_chunks": -(-total_size // chunk_size),
+            "received": [],
+            "parsed_chunks": 0,
+            "header": None,
+            "stats": {
+                "records_processed": 0, "new_records": 0, "duplicate_records": 0, "failed_records": 0,
+                "categorized_by_rules": 0, "categorized_by_model": 0,
+            },
+            "status": "uploading",
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        await aiofiles.os.makedirs(self._path(upload_id), exist_ok=True)
+        await self._write_manifest(manifest)
+        return manifest
+
+    def _expected_chunk_size(self, manifest: Dict[str, Any], index: int) -> int:
+        if index == manifest["total_chunks"] - 1:
+            return manifest["total_size"] - index * manifest["chunk_size"]
+        return manifest["chunk_size"]
+
+    async def write_chunk(self, upload_id: str, index: int, stream) -> Dict[str, Any]:
+        """Spool one chunk from an async byte stream; re-sending a chunk overwrites it"""
+        manifest = await self._read_manifest(upload_id)
+        if manifest["status"] != "uploading":
+            raise ValueError(f"Upload is {manifest['status']}")
+        if not 0 <= index < manifest["total_chunks"]:
+            raise ValueError(f"Chunk index must be between 0 and {manifest['total_chunks'] - 1}")
+
+        expected = self._expected_chunk_size(manifest, index)
+        path = self._chunk_path(upload_id, index)
+        written = 0
+        async with aiofiles.open(path + ".tmp", "wb") as f:
+            async for data in stream:
+                written += len(data)
+                if written > expected:
+                    break
+                await f.write(data)
+        if written != expected:
+            await aiofiles.os.remove(path + ".tmp")
+            raise ValueError(f"Chunk {index} must be exactly {expected} bytes, received {written}")
+        await aiofiles.os.replace(path + ".tmp", path)
+
+        async with self._upload_lock(upload_id):
+            manifest = await self._read_manifest(upload_id)
+            if index not in manifest["received"]:
+                manifest["received"] = sorted(manifest["received"] + [index])
+                await self._write_manifest(manifest)
+        return self.describe(manifest)
+
+    def describe(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """Client-facing view of an upload: received ranges and what is still missing"""
+        received = manifest["received"]
+        received_set = set(received)
+        missing = [i for i in range(manifest["total_chunks"]) if i not in received_set]
+        chunk_size = manifest["chunk_size"]
+        return {
+            "upload_id": manifest["upload_id"],
+            "filename": manifest["filename"],
+            "dataset_id": manifest["dataset_id"],
+            "status": manifest["status"],
+            "total_size": manifest["total_size"],
+            "chunk_size": chunk_size,
+            "total_chunks": manifest["total_chunks"],
+            "received_chunks": _to_ranges(received),
+            "received_bytes": [
+                [start * chunk_size, min((end + 1) * chunk_size, manifest["total_size"]) - 1]
+                for start, end in _to_ranges(received)
+            ],
+            "missing_chunks": _to_ranges(missing),
+            "parsed_chunks": manifest["parsed_chunks"],
+            **manifest["stats"],
+        }
+
+    async def get_status(self, upload_id: str) -> Dict[str, Any]:
+        return self.describe(await self._read_manifest(upload_id))
+
+    async def _ingest_csv_bytes(self, manifest: Dict[str, Any], body: bytes, occurrences: "OccurrenceCounts") -> None:
+        # pandas is loaded by the first upload rather than at worker start
+        import pandas as pd
+        from app.services.ingestion_service import IngestionService
+
+        if not body.strip():
+            return
+        data = manifest["header"].encode("utf-8") + b"\n" + body
+        with timer("upload_parse_chunk"):
+            df = await asyncio.to_thread(pd.read_csv, io.BytesIO(data))
+        stats = await IngestionService(self.db).ingest_dataframe(manifest["dataset_id"], df, occurrences)
+        manifest["stats"]["records_processed"] += stats.successful_records
+        manifest["stats"]["new_records"] += stats.new_records
+        manifest["stats"]["duplicate_records"] += stats.duplicate_records
+        manifest["stats"]["failed_records"] += stats.failed_records
+        manifest["stats"]["categorized_by_rules"] = manifest["stats"].get("categorized_by_rules", 0) + stats.categorized_by_rules
+        manifest["stats"]["categorized_by_model"] = manifest["stats"].get("categorized_by_model", 0) + stats.categorized_by_model
+
+    async def advance_ingestion(self, upload_id: str) -> Dict[str, Any]:
+        """Parse and load every complete line in the contiguous prefix of received chunks"""
+        async with self._upload_lock(upload_id):
+            manifest = await self._read_manifest(upload_id)
+            if not manifest["filename"].endswith(".csv"):
+                return self.describe(manifest)
+
+            from app.services.ingestion_service import OccurrenceCounts
+
+            carry_path = self._path(upload_id, CARRY_NAME)
+            received = set(manifest["received"])
+            occurrences = None
+            while manifest["parsed_chunks"] in received:
+                index = manifest["parsed_chunks"]
+                if occurrences is None:
+                    occurrences = OccurrenceCounts()
+                    if await aiofiles.os.path.exists(self._occurrences_path(upload_id, index)):
+                        async with aiofiles.open(self._occurrences_path(upload_id, index), "rb") as f:
+                            occurrences = OccurrenceCounts.loads(await f.read())
+                carry = b""
+                if await aiofiles.os.path.exists(carry_path):
+                    async with aiofiles.open(carry_path, "rb") as f:
+                        carry = await f.read()
+                async with aiofiles.open(self._chunk_path(upload_id, index), "rb") as f:
+                    buffer = carry + await f.read()
+
+                if manifest["header"] is None:
+                    header, _, buffer = buffer.partition(b"\n")
+                    manifest["header"] = header.decode("utf-8-sig").rstrip("\r")
+
+                is_last = index == manifest["total_chunks"] - 1
+                if is_last:
+                    body, remainder = buffer, b""
+                else:
+                    cut = buffer.rfind(b"\n") + 1
+                    body, remainder = buffer[:cut], buffer[cut:]
+
+                await self._ingest_csv_bytes(manifest, body, occurrences)
+
+                async with aiofiles.open(carry_path, "wb") as f:
+                    await f.write(remainder)
+                async with aiofiles.open(self._occurrences_path(upload_id, index + 1), "wb") as f:
+                    await f.write(occurrences.dumps())
+                manifest["parsed_chunks"] = index + 1
+                await self._write_manifest(manifest)
+                if await aiofiles.os.path.exists(self._occurrences_path(upload_id, index)):
+                    await aiofiles.os.remove(self._occurrences_path(upload_id, index))
+            return self.describe(manifest)
+
+    async def finalize(self, upload_id: str) -> Dict[str, Any]:
+        """Finish ingestion once every chunk is present and clean up the spooled parts"""
+        manifest = await self._read_manifest(upload_id)
+        if manifest["status"] == "completed":
+            return self.describe(manifest)
+        missing = manifest["total_chunks"] - len(manifest["received"])
+        if missing:
+            raise ValueError(f"{missing} chunks have not been received yet")
+
+        if manifest["filename"].endswith(".csv"):
+            await self.advance_ingestion(upload_id)
+        else:
+            import pandas as pd
+            from app.services.ingestion_service import IngestionService
+
+            async with self._upload_lock(upload_id):
+                content = bytearray()
+                for index in range(manifest["total_chunks"]):
+                    async with aiofiles.open(self._chunk_path(upload_id, index), "rb") as f:
+                        content.extend(await f.read())
+                with timer("upload_parse"):
+                    df = await asyncio.to_thread(pd.read_excel, io.BytesIO(bytes(content)))
+                stats = await IngestionService(self.db).ingest_dataframe(manifest["dataset_id"], df)
+                manifest["stats"].update(
+                    records_processed=stats.successful_records,
+                    new_records=stats.new_records,
+                    duplicate_records=stats.duplicate_records,
+                    failed_records=stats.failed_records,
+                    categorized_by_rules=stats.categorized_by_rules,
+                    categorized_by_model=stats.categorized_by_model,
+                )
+                manifest["parsed_chunks"] = manifest["total_chunks"]
+                await self._write_manifest(manifest)
+
+        async with self._upload_lock(upload_id):
+            manifest = await self._read_manifest(upload_id)
+            for index in range(manifest["total_chunks"]):
+                if await aiofiles.os.path.exists(self._chunk_path(upload_id, index)):
+                    await aiofiles.os.remove(self._chunk_path(upload_id, index))
+            for name in (CARRY_NAME, os.path.basename(self._occurrences_path(upload_id, manifest["parsed_chunks"]))):
+                if await aiofiles.os.path.exists(self._path(upload_id, name)):
+                    await aiofiles.os.remove(self._path(upload_id, name))
+            manifest["status"] = "completed"
+            await self._write_manifest(manifest)
+        _upload_locks.pop(upload_id, None)
+        return self.describe(manifest)
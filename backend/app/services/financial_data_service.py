@@ -3,42 +3,56 @@ Financial Data Service - Business logic for financial data operations
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, desc
+from sqlalchemy import select, func, and_, or_, desc, delete, update
 from sqlalchemy.orm import selectinload
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-import pandas as pd
-from decimal import Decimal
 
-from app.models.financial_data import (
+from app.core.money import DEFAULT_CURRENCY, normalize_currency, to_decimal, to_minor, to_number
+from app.core.search_index import search_index
+from app.models.financial_models import (
+    Analysis,
+    Budget,
+    CategoryRule,
     FinancialDataset, 
     FinancialRecord, 
+    DailyRollup,
     KPIMetric,
-    RecordType,
-    Category
+    RecordType
 )
-from app.schemas.financial_data import (
+from app.schemas.financial_schemas import (
     FinancialDatasetCreate,
     FinancialDatasetUpdate,
     FinancialRecordCreate,
     BulkFinancialRecordCreate,
     BulkOperationResponse,
-    DataSummary,
-    RevenueAnalysis,
-    ExpenseAnalysis,
-    ProfitAnalysis
+    DataSummary
 )
 
+# Candidate occurrence numbers whose content hashes are looked up per query
+# when a manually created record repeats stored content
+OCCURRENCE_PROBE = 16
+
+
+def _pandas():
+    """pandas, loaded on first use: this module is imported at worker start"""
+    import pandas as pd
+
+    return pd
+
 
 class FinancialDataService:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None):
         self.db = db
+        # Analytical reads may be routed to a replica; writes always use the primary
+        self.read_db = read_db or db
 
     async def create_dataset(self, dataset_data: FinancialDatasetCreate, user_id: int) -> FinancialDataset:
         """Create a new financial dataset"""
         db_dataset = FinancialDataset(
-            **dataset_data.dict(),
-            user_id=user_id
+            **dataset_data.dict(exclude={"owner_id", "currency"}),
+            currency=normalize_currency(dataset_data.currency),
+            owner_id=user_id
         )
         self.db.add(db_dataset)
         await self.db.commit()
@@ -48,7 +62,7 @@ class FinancialDataService:
     async def get_user_datasets(self, user_id: int, skip: int = 0, limit: int = 100) -> List[FinancialDataset]:
         """Get all datasets for a user"""
         query = select(FinancialDataset).where(
-            FinancialDataset.user_id == user_id
+            FinancialDataset.owner_id == user_id
         ).offset(skip).limit(limit).order_by(desc(FinancialDataset.created_at))
         
         result = await self.db.execute(query)
@@ -59,7 +73,7 @@ class FinancialDataService:
         query = select(FinancialDataset).where(
             and_(
                 FinancialDataset.id == dataset_id,
-                FinancialDataset.user_id == user_id
+                FinancialDataset.owner_id == user_id
             )
         )
         result = await self.db.execute(query)
@@ -76,6 +90,7 @@ class FinancialDataService:
             setattr(dataset, field, value)
         
         dataset.updated_at = datetime.utcnow()
+        dataset.version = FinancialDataset.version + 1
         await self.db.commit()
         await self.db.refresh(dataset)
         return dataset
@@ -86,8 +101,31 @@ class FinancialDataService:
         if not dataset:
             return False
         
+        # Bound the DELETE by the dataset's date span so a partitioned table
+        # only scans the months (and hash bucket) that hold its records
+        span = (await self.db.execute(
+            select(func.min(FinancialRecord.date), func.max(FinancialRecord.date))
+            .where(FinancialRecord.dataset_id == dataset_id)
+        )).first()
+        if span[0] is not None:
+            await self.db.execute(
+                delete(FinancialRecord).where(
+                    and_(
+                        FinancialRecord.dataset_id == dataset_id,
+                        FinancialRecord.date >= span[0],
+                        FinancialRecord.date <= span[1]
+                    )
+                )
+            )
+        
+        await self.db.execute(delete(DailyRollup).where(DailyRollup.dataset_id == dataset_id))
+        await self.db.execute(delete(KPIMetric).where(KPIMetric.dataset_id == dataset_id))
+        await self.db.execute(delete(CategoryRule).where(CategoryRule.dataset_id == dataset_id))
+        await self.db.execute(delete(Budget).where(Budget.dataset_id == dataset_id))
+        await self.db.execute(delete(Analysis).where(Analysis.dataset_id == dataset_id))
         await self.db.delete(dataset)
         await self.db.commit()
+        search_index.drop(dataset_id)
         return True
 
     async def get_financial_records(
@@ -100,9 +138,27 @@ class FinancialDataService:
         date_to: Optional[datetime] = None
     ) -> List[FinancialRecord]:
         """Get financial records with optional filtering"""
-        query = select(FinancialRecord).where(
-            FinancialRecord.dataset_id == dataset_id
-        )
+        query = self._records_query(select(FinancialRecord), dataset_id, skip, limit, category, date_from, date_to)
+        result = await self.read_db.execute(query)
+        return result.scalars().all()
+
+    async def get_financial_record_rows(
+        self,
+        dataset_id: int,
+        columns: List[Any],
+        skip: int = 0,
+        limit: int = 100,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> List[Any]:
+        """Same listing as get_financial_records, as plain column mappings (no ORM objects)"""
+        query = self._records_query(select(*columns), dataset_id, skip, limit, category, date_from, date_to)
+        result = await self.read_db.execute(query)
+        return result.mappings().all()
+
+    def _records_query(self, query, dataset_id, skip, limit, category, date_from, date_to):
+        query = query.where(FinancialRecord.dataset_id == dataset_id)
         
         if category:
             query = query.where(FinancialRecord.category == category)
@@ -113,45 +169,84 @@ class FinancialDataService:
         if date_to:
             query = query.where(FinancialRecord.date <= date_to)
         
-        query = query.offset(skip).limit(limit).order_by(desc(FinancialRecord.date))
-        
-        result = await self.db.execute(query)
-        return result.scalars().all()
+        return query.offset(skip).limit(limit).order_by(desc(FinancialRecord.date))
 
     async def create_financial_record(self, record_data: FinancialRecordCreate) -> FinancialRecord:
-        """Create a new financial record"""
-        db_record = FinancialRecord(**record_data.dict())
-        self.db.add(db_record)
-        await self.db.commit()
-        await self.db.refresh(db_record)
-        return db_record
+        """
+        Create a new financial record through the ingest path, so it is hashed,
+        converted and categorised like uploaded rows and the dataset's rollups
+        are refreshed. An identical stored record makes it the next occurrence
+        of that content rather than a duplicate.
+        """
+        from app.core import partitioning
+        from app.services.ingestion_service import IngestionService, OccurrenceCounts, compute_content_hashes, content_key_ids
 
-    async def create_bulk_financial_records(self, bulk_data: BulkFinancialRecordCreate) -> BulkOperationResponse:
-        """Create multiple financial records in bulk"""
-        created_records = []
-        failed_records = []
-        
-        for record_data in bulk_data.records:
-            try:
-                record_data.dataset_id = bulk_data.dataset_id
-                db_record = FinancialRecord(**record_data.dict())
-                self.db.add(db_record)
-                created_records.append(db_record)
-            except Exception as e:
-                failed_records.append({
-                    "record": record_data.dict(),
-                    "error": str(e)
-                })
-        
-        await self.db.commit()
-        
-        return BulkOperationResponse(
-            total_records=len(bulk_data.records),
-            successful_records=len(created_records),
-            failed_records=len(failed_records),
-            errors=failed_records
+        pd = _pandas()
+        dataset_id = record_data.dataset_id
+        frame = pd.DataFrame([record_data.dict(exclude={"dataset_id"})])
+        frame["date"] = pd.to_datetime(frame["date"])
+        frame["description"] = frame["description"].fillna("")
+        frame["currency"] = frame["currency"].map(normalize_currency)
+        frame["amount_minor"] = [to_minor(frame.pop("amount").iloc[0], frame["currency"].iloc[0])]
+        day = frame["date"].iloc[0].to_pydatetime()
+
+        if partitioning.is_enabled(self.db.bind):
+            # before the probe below reads financial_records, as in IngestionService.bulk_insert_records
+            await partitioning.ensure_partitions(self.db.bind, day, day)
+
+        # Hashes are taken before categorisation, so stored columns cannot identify earlier
+        # copies; look up the hashes of occurrences 0, 1, ... until one is free
+        key_ids = content_key_ids(frame, dataset_id).to_numpy()
+        occurrence = 0
+        while True:
+            candidates = compute_content_hashes(
+                frame.loc[frame.index.repeat(OCCURRENCE_PROBE)].reset_index(drop=True),
+                dataset_id,
+                OccurrenceCounts(key_ids, [occurrence])
+            )
+            stored = set((await self.db.execute(
+                select(FinancialRecord.content_hash).where(
+                    FinancialRecord.dataset_id == dataset_id,
+                    FinancialRecord.date == day,
+                    FinancialRecord.content_hash.in_(candidates.tolist())
+                )
+            )).scalars())
+            free = [index for index, content_hash in enumerate(candidates) if content_hash not in stored]
+            if free:
+                occurrence += free[0]
+                content_hash = candidates.iloc[free[0]]
+                break
+            occurrence += OCCURRENCE_PROBE
+
+        stats = await IngestionService(self.db).bulk_insert_records(dataset_id, frame, OccurrenceCounts(key_ids, [occurrence]))
+        if not stats.new_records:
+            raise ValueError(stats.errors[0]["error"] if stats.errors else "Record could not be stored")
+        return await self.db.scalar(
+            select(FinancialRecord).where(
+                FinancialRecord.dataset_id == dataset_id,
+                FinancialRecord.date == day,
+                FinancialRecord.content_hash == content_hash
+            )
         )
 
+    async def create_bulk_financial_records(self, bulk_data: BulkFinancialRecordCreate) -> BulkOperationResponse:
+        """Create multiple financial records in bulk, skipping records already stored"""
+        from app.services.ingestion_service import IngestionService
+
+        pd = _pandas()
+
+        frame = pd.DataFrame([record.dict(exclude={"dataset_id"}) for record in bulk_data.records])
+        if frame.empty:
+            return BulkOperationResponse(total_records=0, successful_records=0, failed_records=0)
+        frame["date"] = pd.to_datetime(frame["date"])
+        frame["description"] = frame["description"].fillna("")
+        frame["currency"] = frame["currency"].map(normalize_currency)
+        frame["amount_minor"] = [
+            to_minor(amount, currency) for amount, currency in zip(frame.pop("amount"), frame["currency"])
+        ]
+
+        return await IngestionService(self.db).bulk_insert_records(bulk_data.dataset_id, frame)
+
     async def get_data_summary(
         self,
         dataset_id: int,
@@ -177,12 +272,12 @@ class FinancialDataService:
         if date_to:
             total_records_query = total_records_query.where(FinancialRecord.date <= date_to)
         
-        total_records_result = await self.db.execute(total_records_query)
+        total_records_result = await self.read_db.execute(total_records_query)
         total_records = total_records_result.scalar()
         
         # Revenue summary
         revenue_query = select(
-            func.sum(FinancialRecord.amount).label('total'),
+            func.sum(FinancialRecord.base_amount_minor).label('total'),
             func.count(FinancialRecord.id).label('count')
         ).where(
             and_(
@@ -195,12 +290,12 @@ class FinancialDataService:
         if date_to:
             revenue_query = revenue_query.where(FinancialRecord.date <= date_to)
         
-        revenue_result = await self.db.execute(revenue_query)
+        revenue_result = await self.read_db.execute(revenue_query)
         revenue_data = revenue_result.first()
         
         # Expense summary
         expense_query = select(
-            func.sum(FinancialRecord.amount).label('total'),
+            func.sum(FinancialRecord.base_amount_minor).label('total'),
             func.count(FinancialRecord.id).label('count')
         ).where(
             and_(
@@ -213,12 +308,13 @@ class FinancialDataService:
         if date_to:
             expense_query = expense_query.where(FinancialRecord.date <= date_to)
         
-        expense_result = await self.db.execute(expense_query)
+        expense_result = await self.read_db.execute(expense_query)
         expense_data = expense_result.first()
         
-        # Calculate metrics
-        total_revenue = float(revenue_data.total or 0)
-        total_expenses = float(expense_data.total or 0)
+        # Calculate metrics in exact minor units
+        currency = await self.get_dataset_currency(dataset_id)
+        total_revenue = int(revenue_data.total or 0)
+        total_expenses = int(expense_data.total or 0)
         net_profit = total_revenue - total_expenses
         profit_margin = (net_profit / total_revenue * 100) if total_revenue > 0 else 0
         
@@ -228,19 +324,20 @@ class FinancialDataService:
             func.max(FinancialRecord.date).label('end_date')
         ).where(FinancialRecord.dataset_id == dataset_id)
         
-        date_range_result = await self.db.execute(date_range_query)
+        date_range_result = await self.read_db.execute(date_range_query)
         date_range = date_range_result.first()
         
         return DataSummary(
             total_records=total_records,
-            total_revenue=total_revenue,
-            total_expenses=total_expenses,
-            net_profit=net_profit,
+            total_revenue=to_decimal(total_revenue, currency),
+            total_expenses=to_decimal(total_expenses, currency),
+            net_profit=to_decimal(net_profit, currency),
             profit_margin=profit_margin,
             revenue_transactions=revenue_data.count or 0,
             expense_transactions=expense_data.count or 0,
             date_range_start=date_range.start_date,
-            date_range_end=date_range.end_date
+            date_range_end=date_range.end_date,
+            currency=currency
         )
 
     async def get_kpi_metrics(
@@ -249,7 +346,7 @@ class FinancialDataService:
         metric_type: Optional[str] = None,
         period_type: Optional[str] = None
     ) -> List[KPIMetric]:
-        """Get KPI metrics for a dataset"""
+        """Get precomputed KPI metrics for a dataset (see KPIService)"""
         query = select(KPIMetric).where(KPIMetric.dataset_id == dataset_id)
         
         if metric_type:
@@ -259,7 +356,7 @@ class FinancialDataService:
         
         query = query.order_by(desc(KPIMetric.period_start))
         
-        result = await self.db.execute(query)
+        result = await self.read_db.execute(query)
         return result.scalars().all()
 
     async def get_revenue_analysis(
@@ -270,62 +367,29 @@ class FinancialDataService:
         date_to: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """Get detailed revenue analysis"""
-        
-        # Revenue by category
-        category_query = select(
-            FinancialRecord.category,
-            func.sum(FinancialRecord.amount).label('total'),
-            func.count(FinancialRecord.id).label('count')
-        ).where(
-            and_(
-                FinancialRecord.dataset_id == dataset_id,
-                FinancialRecord.record_type == RecordType.REVENUE
-            )
-        ).group_by(FinancialRecord.category)
-        
-        if date_from:
-            category_query = category_query.where(FinancialRecord.date >= date_from)
-        if date_to:
-            category_query = category_query.where(FinancialRecord.date <= date_to)
-        
-        category_result = await self.db.execute(category_query)
+        currency = await self.get_dataset_currency(dataset_id)
         revenue_by_category = [
             {
                 "category": row.category,
-                "total": float(row.total),
+                "total": to_number(row.total, currency),
                 "count": row.count
             }
-            for row in category_result
+            for row in await self._category_totals(dataset_id, RecordType.REVENUE, date_from, date_to)
         ]
         
         # Revenue trends (simplified - would need more complex date grouping in production)
-        trends_query = select(
-            FinancialRecord.date,
-            func.sum(FinancialRecord.amount).label('daily_total')
-        ).where(
-            and_(
-                FinancialRecord.dataset_id == dataset_id,
-                FinancialRecord.record_type == RecordType.REVENUE
-            )
-        ).group_by(FinancialRecord.date).order_by(FinancialRecord.date)
-        
-        if date_from:
-            trends_query = trends_query.where(FinancialRecord.date >= date_from)
-        if date_to:
-            trends_query = trends_query.where(FinancialRecord.date <= date_to)
-        
-        trends_result = await self.db.execute(trends_query)
         revenue_trends = [
             {
-                "date": row.date.isoformat(),
-                "amount": float(row.daily_total)
+                "date": day.isoformat(),
+                "amount": to_number(total, currency)
             }
-            for row in trends_result
+            for day, total in await self._trend_totals(dataset_id, RecordType.REVENUE, date_from, date_to)
         ]
         
         return {
             "revenue_by_category": revenue_by_category,
             "revenue_trends": revenue_trends,
+            "currency": currency,
             "period": period,
             "date_from": date_from.isoformat() if date_from else None,
             "date_to": date_to.isoformat() if date_to else None
@@ -339,62 +403,29 @@ class FinancialDataService:
         date_to: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """Get detailed expense analysis"""
-        
-        # Expense by category
-        category_query = select(
-            FinancialRecord.category,
-            func.sum(FinancialRecord.amount).label('total'),
-            func.count(FinancialRecord.id).label('count')
-        ).where(
-            and_(
-                FinancialRecord.dataset_id == dataset_id,
-                FinancialRecord.record_type == RecordType.EXPENSE
-            )
-        ).group_by(FinancialRecord.category)
-        
-        if date_from:
-            category_query = category_query.where(FinancialRecord.date >= date_from)
-        if date_to:
-            category_query = category_query.where(FinancialRecord.date <= date_to)
-        
-        category_result = await self.db.execute(category_query)
+        currency = await self.get_dataset_currency(dataset_id)
         expenses_by_category = [
             {
                 "category": row.category,
-                "total": float(row.total),
+                "total": to_number(row.total, currency),
                 "count": row.count
             }
-            for row in category_result
+            for row in await self._category_totals(dataset_id, RecordType.EXPENSE, date_from, date_to)
         ]
         
         # Expense trends
-        trends_query = select(
-            FinancialRecord.date,
-            func.sum(FinancialRecord.amount).label('daily_total')
-        ).where(
-            and_(
-                FinancialRecord.dataset_id == dataset_id,
-                FinancialRecord.record_type == RecordType.EXPENSE
-            )
-        ).group_by(FinancialRecord.date).order_by(FinancialRecord.date)
-        
-        if date_from:
-            trends_query = trends_query.where(FinancialRecord.date >= date_from)
-        if date_to:
-            trends_query = trends_query.where(FinancialRecord.date <= date_to)
-        
-        trends_result = await self.db.execute(trends_query)
         expense_trends = [
             {
-                "date": row.date.isoformat(),
-                "amount": float(row.daily_total)
+                "date": day.isoformat(),
+                "amount": to_number(total, currency)
             }
-            for row in trends_result
+            for day, total in await self._trend_totals(dataset_id, RecordType.EXPENSE, date_from, date_to)
         ]
         
         return {
             "expenses_by_category": expenses_by_category,
             "expense_trends": expense_trends,
+            "currency": currency,
             "period": period,
             "date_from": date_from.isoformat() if date_from else None,
             "date_to": date_to.isoformat() if date_to else None
@@ -408,14 +439,11 @@ class FinancialDataService:
         date_to: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """Get detailed profit analysis"""
+        currency = await self.get_dataset_currency(dataset_id)
         
-        # Get revenue and expense data for profit calculation
-        revenue_data = await self.get_revenue_analysis(dataset_id, period, date_from, date_to)
-        expense_data = await self.get_expense_analysis(dataset_id, period, date_from, date_to)
-        
-        # Calculate profit trends by combining revenue and expense trends
-        revenue_trends = {item["date"]: item["amount"] for item in revenue_data["revenue_trends"]}
-        expense_trends = {item["date"]: item["amount"] for item in expense_data["expense_trends"]}
+        # Profit is computed in exact minor units and converted once per value
+        revenue_trends = dict(await self._trend_totals(dataset_id, RecordType.REVENUE, date_from, date_to))
+        expense_trends = dict(await self._trend_totals(dataset_id, RecordType.EXPENSE, date_from, date_to))
         
         all_dates = set(revenue_trends.keys()) | set(expense_trends.keys())
         profit_trends = []
@@ -426,28 +454,88 @@ class FinancialDataService:
             profit = revenue - expense
             
             profit_trends.append({
-                "date": date,
-                "revenue": revenue,
-                "expense": expense,
-                "profit": profit,
+                "date": date.isoformat(),
+                "revenue": to_number(revenue, currency),
+                "expense": to_number(expense, currency),
+                "profit": to_number(profit, currency),
                 "margin": (profit / revenue * 100) if revenue > 0 else 0
             })
         
         # Calculate summary metrics
-        total_revenue = sum(item["amount"] for item in revenue_data["revenue_trends"])
-        total_expenses = sum(item["amount"] for item in expense_data["expense_trends"])
+        total_revenue = sum(revenue_trends.values())
+        total_expenses = sum(expense_trends.values())
         net_profit = total_revenue - total_expenses
         profit_margin = (net_profit / total_revenue * 100) if total_revenue > 0 else 0
         
         return {
             "profit_trends": profit_trends,
             "summary": {
-                "total_revenue": total_revenue,
-                "total_expenses": total_expenses,
-                "net_profit": net_profit,
+                "total_revenue": to_number(total_revenue, currency),
+                "total_expenses": to_number(total_expenses, currency),
+                "net_profit": to_number(net_profit, currency),
                 "profit_margin": profit_margin
             },
+            "currency": currency,
             "period": period,
             "date_from": date_from.isoformat() if date_from else None,
             "date_to": date_to.isoformat() if date_to else None
         }
+
+    async def get_dataset_currency(self, dataset_id: int) -> str:
+        currency = await self.read_db.scalar(
+            select(FinancialDataset.currency).where(FinancialDataset.id == dataset_id)
+        )
+        return currency or DEFAULT_CURRENCY
+
+    async def _category_totals(
+        self,
+        dataset_id: int,
+        record_type: RecordType,
+        date_from: Optional[datetime],
+        date_to: Optional[datetime]
+    ) -> List[Any]:
+        """Exact (minor unit) total and record count per category"""
+        query = select(
+            FinancialRecord.category,
+            func.sum(FinancialRecord.base_amount_minor).label('total'),
+            func.count(FinancialRecord.id).label('count')
+        ).where(
+            and_(
+                FinancialRecord.dataset_id == dataset_id,
+                FinancialRecord.record_type == record_type
+            )
+        ).group_by(FinancialRecord.category)
+        
+        if date_from:
+            query = query.where(FinancialRecord.date >= date_from)
+        if date_to:
+            query = query.where(FinancialRecord.date <= date_to)
+        
+        result = await self.read_db.execute(query)
+        return result.all()
+
+    async def _trend_totals(
+        self,
+        dataset_id: int,
+        record_type: RecordType,
+        date_from: Optional[datetime],
+        date_to: Optional[datetime]
+    ) -> List[Any]:
+        """Exact (minor unit) totals per timestamp, in date order"""
+        query = select(
+            FinancialRecord.date,
+            func.sum(FinancialRecord.base_amount_minor).label('total')
+        ).where(
+            and_(
+                FinancialRecord.dataset_id == dataset_id,
+                FinancialRecord.record_type == record_type
+            )
+        ).group_by(FinancialRecord.date).order_by(FinancialRecord.date)
+        
+        if date_from:
+            query = query.where(FinancialRecord.date >= date_from)
+        if date_to:
+            query = query.where(FinancialRecord.date <= date_to)
+        
+        result = await self.read_db.execute(query)
+        return [(row.date, int(row.total)) for row in result]
@@ -0,0 +1,402 @@
+"""
+FX Service - Exchange rate table, vectorized currency conversion and reporting-currency analytics
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import FX_SCOPE, analytics_cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, dialect_insert
+from app.core.metrics import timed
+from app.core.money import DEFAULT_CURRENCY, FxRateNotFoundError, exponent, round_minor_array, to_decimal, to_number
+from app.core.scheduler import job
+from app.models.financial_models import DailyRollup, FinancialDataset, FxRate, RecordType
+from app.schemas.financial_schemas import DataSummary
+from app.services.rollup_service import RollupService
+
+# Rows per upsert statement (4 columns each)
+UPSERT_BATCH_SIZE = 5000
+
+# Accepted spellings for each column of a rates file; a single "pair"
+# column ("EUR/USD", "EURUSD") may replace base and quote
+RATE_COLUMN_ALIASES = {
+    "day": ("date", "day", "rate_date", "as_of"),
+    "base": ("base", "base_currency", "from", "from_currency"),
+    "quote": ("quote", "quote_currency", "to", "to_currency"),
+    "pair": ("pair", "currency_pair", "symbol"),
+    "rate": ("rate", "fx_rate", "close", "mid"),
+}
+
+ROLLUP_COLUMNS = ["day", "record_type", "category", "total_minor", "record_count"]
+
+# Resolved rate series per (FX generation, from, to), shared by every session in the process
+_series_cache: Dict[Tuple[str, str, str], Optional[pd.Series]] = {}
+
+
+def parse_rates_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Map a rates file onto (day, base, quote, rate).
+
+    Rows with an unparseable date, a non-positive rate or a malformed
+    currency code are dropped; a pair quoted twice for one day keeps the
+    last row.
+    """
+    lookup = {str(column).strip().lower().replace(" ", "_"): column for column in df.columns}
+    resolved = {}
+    for canonical, aliases in RATE_COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lookup:
+                resolved[canonical] = df[lookup[alias]]
+                break
+
+    if "pair" in resolved and not ("base" in resolved and "quote" in resolved):
+        pair = resolved["pair"].astype("string").str.upper().str.replace(r"[^A-Z]", "", regex=True)
+        resolved["base"], resolved["quote"] = pair.str[:3], pair.str[3:]
+    if not {"day", "base", "quote", "rate"} <= resolved.keys():
+        raise ValueError("Rates file must contain date, base, quote (or pair) and rate columns")
+
+    frame = pd.DataFrame({
+        "day": pd.to_datetime(resolved["day"], errors="coerce").dt.normalize(),
+        "base": resolved["base"].astype("string").str.strip().str.upper(),
+        "quote": resolved["quote"].astype("string").str.strip().str.upper(),
+        "rate": pd.to_numeric(resolved["rate"], errors="coerce"),
+    })
+    valid = (
+        frame["day"].notna()
+        & (frame["rate"] > 0)
+        & frame["base"].str.fullmatch("[A-Z]{3}").fillna(False)
+        & frame["quote"].str.fullmatch("[A-Z]{3}").fillna(False)
+        & (frame["base"] != frame["quote"])
+    )
+    frame = frame[valid].drop_duplicates(subset=["day", "base", "quote"], keep="last")
+    return frame.astype({"base": str, "quote": str}).reset_index(drop=True)
+
+
+def convert_minor_array(minor: Any, rates: np.ndarray, from_currency: str, to_currency: str) -> np.ndarray:
+    """Convert int64 minor units at per-row rates, rounding half away from zero"""
+    scale = 10.0 ** (exponent(to_currency) - exponent(from_currency))
+    return round_minor_array(np.asarray(minor, dtype=np.float64) * rates * scale)
+
+
+def _naive_day(value: datetime) -> pd.Timestamp:
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is not None:
+        stamp = stamp.tz_convert(None)
+    return stamp.normalize()
+
+
+class FxService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def load_rates_file(self, path: str) -> int:
+        """Import a rates CSV; returns the number of (day, pair) rates written"""
+        return await self.import_rates(parse_rates_frame(pd.read_csv(path)))
+
+    async def import_rates(self, frame: pd.DataFrame) -> int:
+        """
+        Upsert parsed rates and invalidate every result converted with the old ones.
+
+        Records keep the base amounts booked at ingest; only reporting-currency
+        views pick up corrected rates.
+        """
+        if frame.empty:
+            return 0
+        rows = [
+            {"day": day.date(), "base": base, "quote": quote, "rate": float(rate)}
+            for day, base, quote, rate in zip(frame["day"], frame["base"], frame["quote"], frame["rate"])
+        ]
+        insert = dialect_insert(self.db)
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            statement = insert(FxRate).values(rows[start:start + UPSERT_BATCH_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=["base", "quote", "day"],
+                set_={"rate": statement.excluded.rate}
+            )
+            await self.db.execute(statement)
+        await self.db.commit()
+        await analytics_cache.invalidate(FX_SCOPE)
+        return len(rows)
+
+    async def _pair_series(self, base: str, quote: str) -> Optional[pd.Series]:
+        """Daily base->quote rates from direct quotes, filled in from inverse quotes"""
+        if base == quote:
+            return None
+        result = await self.db.execute(
+            select(FxRate.day, FxRate.base, FxRate.rate).where(
+                or_(
+                    and_(FxRate.base == base, FxRate.quote == quote),
+                    and_(FxRate.base == quote, FxRate.quote == base)
+                )
+            )
+        )
+        frame = pd.DataFrame(result.all(), columns=["day", "base", "rate"])
+        if frame.empty:
+            return None
+        frame["day"] = pd.to_datetime(frame["day"])
+        direct = frame[frame["base"] == base].set_index("day")["rate"]
+        inverse = 1.0 / frame[frame["base"] == quote].set_index("day")["rate"]
+        return direct.combine_first(inverse).sort_index()
+
+    async def _resolve_series(self, from_currency: str, to_currency: str) -> Optional[pd.Series]:
+        series = await self._pair_series(from_currency, to_currency)
+        pivot = settings.FX_PIVOT_CURRENCY
+        if series is not None or pivot in (from_currency, to_currency):
+            return series
+
+        # cross rate through the pivot, each leg carried forward to the other's dates
+        first = await self._pair_series(from_currency, pivot)
+        second = await self._pair_series(pivot, to_currency)
+        if first is None or second is None:
+            return None
+        days = first.index.union(second.index)
+        return (first.reindex(days).ffill() * second.reindex(days).ffill()).dropna()
+
+    async def rate_series(self, from_currency: str, to_currency: str) -> Optional[pd.Series]:
+        """Sorted daily rates from one currency to another, or None when no path exists"""
+        generation = await analytics_cache.generation(FX_SCOPE)
+        key = (generation, from_currency, to_currency)
+        if key not in _series_cache:
+            for stale in [cached for cached in _series_cache if cached[0] != generation]:
+                del _series_cache[stale]
+            _series_cache[key] = await self._resolve_series(from_currency, to_currency)
+        return _series_cache[key]
+
+    async def rates_on(self, from_currency: str, to_currency: str, days: pd.Series) -> Optional[np.ndarray]:
+        """
+        Rate in effect on each timestamp: the latest quote on or before it.
+
+        History older than the first quote uses the earliest rate rather
+        than failing the whole conversion. None when the pair has no rates.
+        """
+        if from_currency == to_currency:
+            return np.ones(len(days))
+        series = await self.rate_series(from_currency, to_currency)
+        if series is None or series.empty:
+            return None
+        positions = np.searchsorted(
+            series.index.to_numpy(), pd.to_datetime(days).to_numpy(dtype="datetime64[ns]"), side="right"
+        ) - 1
+        return series.to_numpy()[np.clip(positions, 0, None)]
+
+    @timed("fx_convert_frame")
+    async def with_base_amounts(self, frame: pd.DataFrame, currency: str) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Add base_amount_minor, each row's amount in ``currency`` at its date's rate.
+
+        Conversion is one vectorized as-of lookup per source currency. Rows in
+        currencies with no rate path are dropped; their codes are returned.
+        """
+        base_amounts = frame["amount_minor"].to_numpy(dtype=np.int64).copy()
+        keep = np.ones(len(frame), dtype=bool)
+        missing = []
+        for code, positions in frame.groupby("currency").indices.items():
+            if code == currency:
+                continue
+            rates = await self.rates_on(code, currency, frame["date"].iloc[positions])
+            if rates is None:
+                keep[positions] = False
+                missing.append(code)
+                continue
+            base_amounts[positions] = convert_minor_array(base_amounts[positions], rates, code, currency)
+        frame = frame.assign(base_amount_minor=base_amounts)
+        return frame[keep].reset_index(drop=True), sorted(missing)
+
+    async def convert_amount(self, minor: int, from_currency: str, to_currency: str, when: datetime) -> int:
+        """Scalar conversion for single-record writes"""
+        rates = await self.rates_on(from_currency, to_currency, pd.Series([when]))
+        if rates is None:
+            raise FxRateNotFoundError(f"No FX rate from {from_currency} to {to_currency}")
+        return int(convert_minor_array([minor], rates, from_currency, to_currency)[0])
+
+    async def _dataset_currency(self, dataset_id: int) -> str:
+        currency = await self.db.scalar(select(FinancialDataset.currency).where(FinancialDataset.id == dataset_id))
+        return currency or DEFAULT_CURRENCY
+
+    async def converted_rollups(self, dataset_id: int, currency: str) -> pd.DataFrame:
+        """
+        The dataset's daily rollups converted to ``currency`` at each day's rate.
+
+        The converted table is cached per dataset, reporting currency and FX
+        generation, so switching the reporting currency reads rollups once.
+        Days an ingest has touched but the precompute job has not rebuilt
+        yet (the dataset's pending span) are aggregated from raw records
+        instead, so the view matches the base-currency one straight away.
+        Both ingest and the rebuild invalidate the cached table.
+        """
+        dataset_currency = await self._dataset_currency(dataset_id)
+
+        async def compute():
+            pending_from, pending_to = (await self.db.execute(
+                select(FinancialDataset.pending_refresh_from, FinancialDataset.pending_refresh_to)
+                .where(FinancialDataset.id == dataset_id)
+            )).one_or_none() or (None, None)
+
+            query = select(
+                DailyRollup.day,
+                DailyRollup.record_type,
+                DailyRollup.category,
+                DailyRollup.total_minor,
+                DailyRollup.record_count
+            ).where(DailyRollup.dataset_id == dataset_id)
+            if pending_from is not None:
+                pending_to = pending_to or pending_from
+                query = query.where(or_(DailyRollup.day < pending_from.date(), DailyRollup.day > pending_to.date()))
+            frames = [pd.DataFrame((await self.db.execute(query)).all(), columns=ROLLUP_COLUMNS)]
+            if pending_from is not None:
+                recent = await self.db.execute(RollupService(self.db).record_totals(dataset_id, pending_from, pending_to))
+                frames.append(pd.DataFrame(recent.all(), columns=["dataset_id", *ROLLUP_COLUMNS]).drop(columns="dataset_id"))
+            for part in frames:
+                part["day"] = pd.to_datetime(part["day"])
+            frames = [part for part in frames if not part.empty]
+            frame = pd.concat(frames, ignore_index=True).sort_values("day", kind="stable") if frames else pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+            if not frame.empty:
+                days = frame["day"]
+                rates = await self.rates_on(dataset_currency, currency, days)
+                if rates is None:
+                    raise FxRateNotFoundError(f"No FX rate from {dataset_currency} to {currency}")
+                frame["total_minor"] = convert_minor_array(frame["total_minor"], rates, dataset_currency, currency)
+                frame["day"] = days.dt.strftime("%Y-%m-%d")
+            return {column: frame[column].tolist() for column in ROLLUP_COLUMNS}
+
+        cached = await analytics_cache.get_or_compute(
+            dataset_id, "fx_rollups", compute, currency=currency, fx=await analytics_cache.generation(FX_SCOPE)
+        )
+        frame = pd.DataFrame(cached, columns=ROLLUP_COLUMNS)
+        frame["day"] = pd.to_datetime(frame["day"])
+        frame["total_minor"] = frame["total_minor"].astype("int64")
+        frame["record_count"] = frame["record_count"].astype("int64")
+        return frame
+
+    async def _window(self, dataset_id: int, currency: str, date_from, date_to) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Converted rollups for the whole dataset and for the requested days"""
+        frame = await self.converted_rollups(dataset_id, currency)
+        window = frame
+        if date_from:
+            window = window[window["day"] >= _naive_day(date_from)]
+        if date_to:
+            window = window[window["day"] <= _naive_day(date_to)]
+        return frame, window
+
+    async def get_data_summary(
+        self,
+        dataset_id: int,
+        currency: str,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> DataSummary:
+        """FinancialDataService.get_data_summary in a reporting currency"""
+        frame, window = await self._window(dataset_id, currency, date_from, date_to)
+        totals = window.groupby("record_type")[["total_minor", "record_count"]].sum()
+        revenue = totals.reindex([RecordType.REVENUE.value]).fillna(0).iloc[0]
+        expenses = totals.reindex([RecordType.EXPENSE.value]).fillna(0).iloc[0]
+
+        total_revenue = int(revenue["total_minor"])
+        total_expenses = int(expenses["total_minor"])
+        net_profit = total_revenue - total_expenses
+        return DataSummary(
+            total_records=int(window["record_count"].sum()),
+            total_revenue=to_decimal(total_revenue, currency),
+            total_expenses=to_decimal(total_expenses, currency),
+            net_profit=to_decimal(net_profit, currency),
+            profit_margin=(net_profit / total_revenue * 100) if total_revenue > 0 else 0,
+            revenue_transactions=int(revenue["record_count"]),
+            expense_transactions=int(expenses["record_count"]),
+            date_range_start=frame["day"].min().to_pydatetime() if not frame.empty else None,
+            date_range_end=frame["day"].max().to_pydatetime() if not frame.empty else None,
+            currency=currency
+        )
+
+    @staticmethod
+    def _by_category(window: pd.DataFrame, record_type: RecordType, currency: str) -> List[Dict[str, Any]]:
+        rows = window[window["record_type"] == record_type.value]
+        grouped = rows.groupby("category").agg(total=("total_minor", "sum"), count=("record_count", "sum"))
+        return [
+            {"category": category, "total": to_number(total, currency), "count": int(count)}
+            for category, total, count in zip(grouped.index, grouped["total"], grouped["count"])
+        ]
+
+    @staticmethod
+    def _daily(window: pd.DataFrame, record_type: RecordType) -> pd.Series:
+        return window[window["record_type"] == record_type.value].groupby("day")["total_minor"].sum()
+
+    @staticmethod
+    def _period(period: str, currency: str, date_from, date_to) -> Dict[str, Any]:
+        return {
+            "currency": currency,
+            "period": period,
+            "date_from": date_from.isoformat() if date_from else None,
+            "date_to": date_to.isoformat() if date_to else None
+        }
+
+    async def get_revenue_analysis(self, dataset_id: int, currency: str, period: str = "monthly", date_from=None, date_to=None) -> Dict[str, Any]:
+        _, window = await self._window(dataset_id, currency, date_from, date_to)
+        trends = self._daily(window, RecordType.REVENUE)
+        return {
+            "revenue_by_category": self._by_category(window, RecordType.REVENUE, currency),
+            "revenue_trends": [
+                {"date": day.isoformat(), "amount": to_number(total, currency)} for day, total in trends.items()
+            ],
+            **self._period(period, currency, date_from, date_to)
+        }
+
+    async def get_expense_analysis(self, dataset_id: int, currency: str, period: str = "monthly", date_from=None, date_to=None) -> Dict[str, Any]:
+        _, window = await self._window(dataset_id, currency, date_from, date_to)
+        trends = self._daily(window, RecordType.EXPENSE)
+        return {
+            "expenses_by_category": self._by_category(window, RecordType.EXPENSE, currency),
+            "expense_trends": [
+                {"date": day.isoformat(), "amount": to_number(total, currency)} for day, total in trends.items()
+            ],
+            **self._period(period, currency, date_from, date_to)
+        }
+
+    async def get_profit_analysis(self, dataset_id: int, currency: str, period: str = "monthly", date_from=None, date_to=None) -> Dict[str, Any]:
+        _, window = await self._window(dataset_id, currency, date_from, date_to)
+        daily = pd.DataFrame({
+            "revenue": self._daily(window, RecordType.REVENUE),
+            "expense": self._daily(window, RecordType.EXPENSE),
+        }).fillna(0).astype("int64").sort_index()
+        daily["profit"] = daily["revenue"] - daily["expense"]
+
+        total_revenue = int(daily["revenue"].sum())
+        total_expenses = int(daily["expense"].sum())
+        net_profit = total_revenue - total_expenses
+        return {
+            "profit_trends": [
+                {
+                    "date": day.isoformat(),
+                    "revenue": to_number(revenue, currency),
+                    "expense": to_number(expense, currency),
+                    "profit": to_number(profit, currency),
+                    "margin": (profit / revenue * 100) if revenue > 0 else 0
+                }
+                for day, revenue, expense, profit in zip(daily.index, daily["revenue"], daily["expense"], daily["profit"])
+            ],
+            "summary": {
+                "total_revenue": to_number(total_revenue, currency),
+                "total_expenses": to_number(total_expenses, currency),
+                "net_profit": to_number(net_profit, currency),
+                "profit_margin": (net_profit / total_revenue * 100) if total_revenue > 0 else 0
+            },
+            **self._period(period, currency, date_from, date_to)
+        }
+
+    async def available_currencies(self) -> List[str]:
+        """Currencies that appear in the rate table, for the reporting currency picker"""
+        result = await self.db.execute(select(FxRate.base).union(select(FxRate.quote)))
+        return sorted(result.scalars().all())
+
+
+@job("load_fx_rates")
+async def load_fx_rates(path: Optional[str] = None) -> Dict[str, Any]:
+    path = path or settings.FX_RATES_FILE
+    async with AsyncSessionLocal() as db:
+        return {"path": path, "rates": await FxService(db).load_rates_file(path)}
@@ -0,0 +1,357 @@
+"""
+Ingestion Service - Normalisation and deduplicating bulk load of financial records
+"""
+
+import hashlib
+import io
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import partitioning
+from app.core.cache import analytics_cache
+from app.core.database import dialect_insert
+from app.core.events import event_bus
+from app.core.metrics import timed
+from app.core.money import DEFAULT_CURRENCY, to_minor_array, to_number
+from app.core.scheduler import get_job_backend
+from app.core.search_index import search_index
+from app.models.financial_models import FinancialDataset, FinancialRecord, RecordType
+from app.schemas.financial_schemas import BulkOperationResponse
+from app.services.categorization_service import CategorizationService
+from app.services.fx_service import FxService
+
+# Rows per multi-row VALUES page of the INSERT. Postgres allows at most 32767 bind parameters
+# per statement; 2000 rows x 9 columns stays well below that.
+INSERT_BATCH_SIZE = 2000
+
+# Accepted spellings for each canonical column in uploaded files
+COLUMN_ALIASES = {
+    "date": ("date", "transaction_date", "posted_date", "posting_date", "booking_date", "value_date"),
+    "amount": ("amount", "value", "transaction_amount", "total"),
+    "category": ("category", "account", "account_name"),
+    "description": ("description", "memo", "details", "narrative", "payee"),
+    "record_type": ("record_type", "type", "transaction_type"),
+    "currency": ("currency", "currency_code", "ccy"),
+}
+
+# Fixed-width part of a row as digested for its content hash: little-endian integers plus the
+# length in characters of each text field; the fields follow the record as UTF-8 in this order
+TEXT_COLUMNS = ["currency", "record_type", "category", "description"]
+CONTENT_RECORD = np.dtype(
+    [("dataset_id", "<i8"), ("date", "<i8"), ("amount_minor", "<i8"), ("occurrence", "<i8")]
+    + [(f"{column}_length", "<u4") for column in TEXT_COLUMNS]
+)
+
+# Must match uq_financial_records_dataset_content
+CONFLICT_COLUMNS = ["dataset_id", "content_hash", "date"]
+
+RECORD_COLUMNS = [
+    "dataset_id", "date", "category", "amount_minor", "currency", "base_amount_minor",
+    "description", "record_type", "content_hash",
+]
+
+@timed("ingest_normalize_frame")
+def normalize_upload_frame(df: pd.DataFrame, currency: str = DEFAULT_CURRENCY) -> pd.DataFrame:
+    """
+    Map an uploaded frame onto the canonical record columns.
+
+    Rows without a parseable date or amount, or with a malformed currency
+    code, are dropped. When the file has no record type column, the sign of
+    the amount decides it (bank exports list debits as negative numbers).
+    Amounts are stored as absolute int64 minor units of the row's currency,
+    which defaults to ``currency`` when the file has no currency column.
+    """
+    lookup = {str(column).strip().lower().replace(" ", "_"): column for column in df.columns}
+    resolved = {}
+    for canonical, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lookup:
+                resolved[canonical] = df[lookup[alias]]
+                break
+
+    if "date" not in resolved or "amount" not in resolved:
+        raise ValueError("File must contain a date and an amount column")
+
+    frame = pd.DataFrame({
+        "date": pd.to_datetime(resolved["date"], errors="coerce"),
+        "amount": pd.to_numeric(resolved["amount"], errors="coerce"),
+    })
+    frame["category"] = resolved.get("category", pd.Series("Uncategorized", index=df.index)).fillna("Uncategorized").astype(str)
+    frame["description"] = resolved.get("description", pd.Series("", index=df.index)).fillna("").astype(str)
+
+    if "record_type" in resolved:
+        frame["record_type"] = resolved["record_type"].astype(str).str.strip().str.lower()
+    else:
+        frame["record_type"] = RecordType.REVENUE.value
+        frame.loc[frame["amount"] < 0, "record_type"] = RecordType.EXPENSE.value
+    frame["amount"] = frame["amount"].abs()
+
+    if "currency" in resolved:
+        codes = resolved["currency"].astype("string").str.strip().str.upper().fillna("").replace("", currency)
+        frame["currency"] = codes.where(codes.str.fullmatch("[A-Z]{3}"))
+    else:
+        frame["currency"] = currency
+
+    frame = frame.dropna(subset=["date", "amount", "currency"]).reset_index(drop=True)
+    frame["currency"] = frame["currency"].astype(str)
+    frame["amount_minor"] = to_minor_array(frame.pop("amount"), frame["currency"])
+    return frame
+
+
+class OccurrenceCounts:
+    """
+    How often each row content was hashed by earlier batches of one upload.
+
+    Passed through every batch of a chunked upload so occurrence numbers
+    continue where the previous chunk stopped, giving the same hashes as a
+    single upload of the whole file. Keyed by a 64-bit hash of the content.
+    """
+
+    def __init__(self, keys: Optional[np.ndarray] = None, counts: Optional[np.ndarray] = None):
+        self.counts = pd.Series(
+            np.zeros(0, dtype=np.int64) if counts is None else counts,
+            index=pd.Index(np.zeros(0, dtype=np.uint64) if keys is None else keys, dtype=np.uint64),
+        )
+
+    def take(self, key_ids: pd.Series) -> np.ndarray:
+        """Occurrences of each row's content in earlier batches; counts this batch in"""
+        prior = key_ids.map(self.counts).fillna(0).to_numpy(dtype=np.int64)
+        self.counts = self.counts.add(key_ids.value_counts(), fill_value=0).astype(np.int64)
+        return prior
+
+    def dumps(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(buffer, keys=self.counts.index.to_numpy(dtype=np.uint64), counts=self.counts.to_numpy())
+        return buffer.getvalue()
+
+    @classmethod
+    def loads(cls, data: bytes) -> "OccurrenceCounts":
+        arrays = np.load(io.BytesIO(data))
+        return cls(arrays["keys"], arrays["counts"])
+
+
+def content_columns(frame: pd.DataFrame, dataset_id: int) -> pd.DataFrame:
+    """Row content as hashed, before the occurrence number: dataset, timestamp to the second, amount, currency, type, category and description"""
+    dates = frame["date"].dt.tz_localize(None) if frame["date"].dt.tz is not None else frame["date"]
+    return pd.DataFrame({
+        "dataset_id": np.full(len(frame), dataset_id, dtype=np.int64),
+        "date": dates.to_numpy(dtype="datetime64[s]").view(np.int64),
+        "amount_minor": frame["amount_minor"].to_numpy(dtype=np.int64),
+        "currency": frame["currency"].to_numpy(dtype=object),
+        "record_type": frame["record_type"].astype(str).to_numpy(dtype=object),
+        "category": frame["category"].fillna("").astype(str).to_numpy(dtype=object),
+        "description": frame["description"].fillna("").astype(str).to_numpy(dtype=object),
+    })
+
+
+def content_key_ids(frame: pd.DataFrame, dataset_id: int) -> pd.Series:
+    """
+    64-bit id of each row's content, used to number repeats of the same content.
+
+    pandas' hash is fast but not promised to stay the same across versions,
+    so these ids only live as long as an upload; stored hashes never use them.
+    """
+    key_ids = pd.util.hash_pandas_object(content_columns(frame, dataset_id), index=False)
+    return key_ids.set_axis(frame.index)
+
+
+@timed("ingest_content_hashes")
+def compute_content_hashes(
+    frame: pd.DataFrame,
+    dataset_id: int,
+    occurrences: Optional[OccurrenceCounts] = None
+) -> pd.Series:
+    """
+    Compute a stable content hash per record.
+
+    Identical rows inside one batch (two equal card payments on the same day)
+    are told apart by their occurrence number, so re-uploading a statement
+    skips its rows while genuine repeats within it are kept. ``occurrences``
+    continues the numbering from earlier batches of the same file. The hash
+    is a 128-bit BLAKE2b of the row packed as a CONTENT_RECORD followed by
+    its text fields, so it depends on no library's hashing internals.
+    """
+    content = content_columns(frame, dataset_id)
+    key_ids = pd.util.hash_pandas_object(content, index=False)
+    occurrence = key_ids.groupby(key_ids).cumcount()
+    if occurrences is not None:
+        occurrence += occurrences.take(key_ids)
+
+    packed = np.zeros(len(content), dtype=CONTENT_RECORD)
+    for column in ("dataset_id", "date", "amount_minor"):
+        packed[column] = content[column].to_numpy()
+    packed["occurrence"] = occurrence.to_numpy(dtype=np.int64)
+    for column in TEXT_COLUMNS:
+        packed[f"{column}_length"] = np.fromiter(map(len, content[column]), dtype=np.uint32, count=len(content))
+    text = content[TEXT_COLUMNS[0]]
+    for column in TEXT_COLUMNS[1:]:
+        text = text + content[column]
+
+    records = memoryview(packed.tobytes())
+    width = CONTENT_RECORD.itemsize
+    digests = []
+    for position, tail in enumerate(text):
+        digest = hashlib.blake2b(records[position * width:(position + 1) * width], digest_size=16)
+        digest.update(tail.encode("utf-8"))
+        digests.append(digest.hexdigest())
+    return pd.Series(digests, index=frame.index, dtype=object)
+
+
+class IngestionService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def ingest_dataframe(
+        self,
+        dataset_id: int,
+        df: pd.DataFrame,
+        occurrences: Optional[OccurrenceCounts] = None
+    ) -> BulkOperationResponse:
+        """Normalise an uploaded frame and load it, skipping rows already stored"""
+        total_rows = len(df)
+        frame = normalize_upload_frame(df, await self._dataset_currency(dataset_id))
+        response = await self.bulk_insert_records(dataset_id, frame, occurrences)
+        response.total_records = total_rows
+        if total_rows > len(frame):
+            response.failed_records += total_rows - len(frame)
+            response.errors.append({
+                "error": f"{total_rows - len(frame)} rows skipped: missing or invalid date/amount/currency"
+            })
+        return response
+
+    async def bulk_insert_records(
+        self,
+        dataset_id: int,
+        frame: pd.DataFrame,
+        occurrences: Optional[OccurrenceCounts] = None
+    ) -> BulkOperationResponse:
+        """
+        Insert normalised records with ON CONFLICT DO NOTHING on the content hash.
+
+        Duplicates are resolved by the unique index in the same statement that
+        inserts the batch, so there is no SELECT-then-INSERT round trip per row.
+        ``occurrences`` carries repeat counts between batches of one file.
+        """
+        if frame.empty:
+            return BulkOperationResponse(total_records=0, successful_records=0, failed_records=0)
+
+        if partitioning.is_enabled(self.db.bind):
+            # Before any read of financial_records in this transaction: the partition DDL runs on
+            # its own connection and needs ACCESS EXCLUSIVE on the parent, which a lock held by
+            # this session (e.g. from training the categorizer) would block until statement_timeout
+            await partitioning.ensure_partitions(self.db.bind, frame["date"].min(), frame["date"].max())
+
+        # amounts in other currencies are booked in the dataset's currency at their date's rate
+        currency = await self._dataset_currency(dataset_id)
+        received = len(frame)
+        frame, missing_rates = await FxService(self.db).with_base_amounts(frame, currency)
+        errors = []
+        if missing_rates:
+            errors.append({
+                "error": f"{received - len(frame)} rows skipped: no FX rate to {currency} for {', '.join(missing_rates)}"
+            })
+        if frame.empty:
+            return BulkOperationResponse(total_records=received, successful_records=0, failed_records=received, errors=errors)
+
+        frame = frame.assign(
+            dataset_id=dataset_id,
+            content_hash=compute_content_hashes(frame, dataset_id, occurrences),
+        )
+        # after hashing: re-uploads must still match their first copy when rules or the model change
+        frame, categorized = await CategorizationService(self.db).categorize(dataset_id, frame)
+        frame["description"] = frame["description"].astype(object).where(frame["description"] != "", None)
+        rows: List[Dict[str, Any]] = frame[RECORD_COLUMNS].to_dict("records")
+
+        records = FinancialRecord.__table__
+        # One statement executed with every batch as parameter sets: compiled and prepared once,
+        # then sent as multi-row VALUES pages instead of compiling a 2000-row VALUES clause per batch
+        statement = (
+            dialect_insert(self.db)(records)
+            .on_conflict_do_nothing(index_elements=CONFLICT_COLUMNS)
+            .returning(
+                records.c.id, records.c.date, records.c.base_amount_minor, records.c.record_type,
+                records.c.description, records.c.category
+            )
+            .execution_options(insertmanyvalues_page_size=INSERT_BATCH_SIZE)
+        )
+        new_records = 0
+        date_from = date_to = None
+        # Minor units added per record type and the months touched, for the live update event
+        added: Dict[str, int] = {}
+        periods = set()
+        # (id, date, description, category) of new rows for this worker's search index
+        searchable = []
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            inserted = (await self.db.execute(statement, rows[start:start + INSERT_BATCH_SIZE])).all()
+            if inserted:
+                new_records += len(inserted)
+                inserted_dates = [row.date for row in inserted]
+                batch_from, batch_to = min(inserted_dates), max(inserted_dates)
+                date_from = batch_from if date_from is None else min(date_from, batch_from)
+                date_to = batch_to if date_to is None else max(date_to, batch_to)
+                for row in inserted:
+                    added[row.record_type] = added.get(row.record_type, 0) + row.base_amount_minor
+                periods.update(day.strftime("%Y-%m") for day in inserted_dates)
+                searchable.extend((row.id, row.date, row.description, row.category) for row in inserted)
+
+        version = None
+        if new_records:
+            version = await self._mark_pending_refresh(dataset_id, date_from, date_to)
+        await self.db.commit()
+
+        if new_records:
+            # rollups, KPIs and warm caches are rebuilt off the request path
+            await analytics_cache.invalidate(dataset_id)
+            search_index.add_records(dataset_id, searchable, version)
+            await get_job_backend().enqueue("precompute_dataset", dataset_id=dataset_id)
+            await event_bus.publish(
+                "records_ingested",
+                dataset_id,
+                version=version,
+                new_records=new_records,
+                date_from=date_from,
+                date_to=date_to,
+                currency=currency,
+                added_revenue=to_number(added.get(RecordType.REVENUE.value, 0), currency),
+                added_expenses=to_number(added.get(RecordType.EXPENSE.value, 0), currency),
+                periods=sorted(periods),
+            )
+
+        return BulkOperationResponse(
+            total_records=received,
+            successful_records=len(rows),
+            failed_records=received - len(rows),
+            errors=errors,
+            new_records=new_records,
+            duplicate_records=len(rows) - new_records,
+            date_from=date_from,
+            date_to=date_to,
+            categorized_by_rules=categorized["rules"],
+            categorized_by_model=categorized["model"],
+        )
+
+    async def _dataset_currency(self, dataset_id: int) -> str:
+        currency = await self.db.scalar(select(FinancialDataset.currency).where(FinancialDataset.id == dataset_id))
+        return currency or DEFAULT_CURRENCY
+
+    async def _mark_pending_refresh(self, dataset_id: int, date_from, date_to) -> int:
+        """Widen the dataset's pending refresh span to cover newly inserted dates; returns the bumped version"""
+        pending_from = FinancialDataset.pending_refresh_from
+        pending_to = FinancialDataset.pending_refresh_to
+        return await self.db.scalar(
+            update(FinancialDataset)
+            .where(FinancialDataset.id == dataset_id)
+            .values(
+                pending_refresh_from=case((or_(pending_from.is_(None), pending_from > date_from), date_from), else_=pending_from),
+                pending_refresh_to=case((or_(pending_to.is_(None), pending_to < date_to), date_to), else_=pending_to),
+                # set client-side so the precompute job's marker compares exactly on every dialect
+                updated_at=datetime.now(timezone.utc),
+                version=FinancialDataset.version + 1,
+            )
+            .returning(FinancialDataset.version)
+        )
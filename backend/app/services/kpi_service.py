@@ -0,0 +1,240 @@
+"""
+KPI Service - Vectorized computation and storage of per-period KPI metrics
+"""
+
+from datetime import datetime, date
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import dialect_insert
+from app.core.metrics import timed
+from app.core.money import DEFAULT_CURRENCY, exponent
+from app.models.financial_models import DailyRollup, FinancialDataset, KPIMetric, RecordType
+from app.services.rollup_service import month_bucket
+
+PERIOD_TYPE = "monthly"
+
+# Expense categories treated as cost of goods sold for gross margin
+COGS_CATEGORIES = {"cogs", "cost of goods sold", "cost of sales", "cost of revenue", "inventory", "materials"}
+
+KPI_CATALOGUE = {
+    "gross_margin": "Revenue minus cost of goods sold, as % of revenue",
+    "net_profit_margin": "Net profit as % of revenue",
+    "operating_expense_ratio": "Non-COGS expenses as % of revenue",
+    "burn_rate": "Net cash outflow for the month (0 when profitable)",
+    "revenue_growth_mom": "Revenue change vs the previous month, %",
+    "revenue_growth_yoy": "Revenue change vs the same month last year, %",
+    "revenue_concentration_hhi": "Herfindahl-Hirschman index of revenue by category (0-10000)",
+    "expense_concentration_hhi": "Herfindahl-Hirschman index of expenses by category (0-10000)",
+    "average_revenue_transaction": "Revenue per revenue transaction",
+    # Not days cash on hand: records carry no balances, so cumulative net profit stands in for cash
+    "expense_coverage_days": "Days of the month's average daily expenses covered by cumulative net profit",
+}
+
+# Rows per upsert statement (6 columns each)
+UPSERT_BATCH_SIZE = 2000
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _hhi(frame: pd.DataFrame, record_type: str, totals: pd.Series, months: pd.DatetimeIndex) -> pd.Series:
+    subset = frame[frame["record_type"] == record_type]
+    by_category = subset.pivot_table(
+        index="month", columns="category", values="total", aggfunc="sum", fill_value=0
+    ).reindex(months, fill_value=0)
+    shares = by_category.div(totals.where(totals > 0), axis=0)
+    return (shares ** 2).sum(axis=1, min_count=1) * 10000
+
+
+@timed("kpi_compute_frame")
+def compute_monthly_kpis(
+    frame: pd.DataFrame,
+    months: pd.DatetimeIndex,
+    opening_net: int = 0,
+    minor_per_unit: int = 100
+) -> pd.DataFrame:
+    """
+    Compute the KPI catalogue for every month in ``months`` in one vectorized pass.
+
+    ``frame`` holds monthly totals per (month, record_type, category) with
+    ``total`` (int64 minor units) and ``record_count`` columns. Sums, net
+    and the cumulative net stay in exact integers; only the ratios and the
+    final money metrics (divided by ``minor_per_unit``) are floats.
+    ``opening_net`` is the cumulative net profit, in minor units, before
+    the first month, so cumulative metrics stay correct when only a window
+    of months is loaded. Undefined values (no revenue, no prior period)
+    come back as NaN.
+    """
+    totals = frame.pivot_table(
+        index="month", columns="record_type", values="total", aggfunc="sum", fill_value=0
+    ).reindex(months, fill_value=0)
+    counts = frame.pivot_table(
+        index="month", columns="record_type", values="record_count", aggfunc="sum", fill_value=0
+    ).reindex(months, fill_value=0)
+    zeros = pd.Series(0, index=months, dtype="int64")
+    revenue = totals.get(RecordType.REVENUE.value, zeros).astype("int64")
+    expenses = totals.get(RecordType.EXPENSE.value, zeros).astype("int64")
+    revenue_count = counts.get(RecordType.REVENUE.value, zeros).astype(float)
+
+    is_cogs = (frame["record_type"] == RecordType.EXPENSE.value) & frame["category"].str.strip().str.lower().isin(COGS_CATEGORIES)
+    cogs = frame[is_cogs].groupby("month")["total"].sum().reindex(months, fill_value=0).astype("int64")
+
+    positive_revenue = revenue.where(revenue > 0)
+    net = revenue - expenses
+    previous = revenue.shift(1)
+    previous_year = revenue.shift(12)
+    daily_expenses = expenses / months.days_in_month
+
+    metrics = pd.DataFrame(index=months)
+    metrics["gross_margin"] = (revenue - cogs) / positive_revenue * 100
+    metrics["net_profit_margin"] = net / positive_revenue * 100
+    metrics["operating_expense_ratio"] = (expenses - cogs) / positive_revenue * 100
+    metrics["burn_rate"] = (-net).clip(lower=0) / minor_per_unit
+    metrics["revenue_growth_mom"] = (revenue / previous.where(previous > 0) - 1) * 100
+    metrics["revenue_growth_yoy"] = (revenue / previous_year.where(previous_year > 0) - 1) * 100
+    metrics["revenue_concentration_hhi"] = _hhi(frame, RecordType.REVENUE.value, revenue, months)
+    metrics["expense_concentration_hhi"] = _hhi(frame, RecordType.EXPENSE.value, expenses, months)
+    metrics["average_revenue_transaction"] = revenue / revenue_count.where(revenue_count > 0) / minor_per_unit
+    metrics["expense_coverage_days"] = (opening_net + net.cumsum()) / daily_expenses.where(daily_expenses > 0)
+    return metrics.replace([np.inf, -np.inf], np.nan)
+
+
+class KPIService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.bind.dialect.name
+
+    async def _monthly_totals(self, dataset_id: int, start: date, end: date) -> pd.DataFrame:
+        month = month_bucket(DailyRollup.day, self.dialect).label("month")
+        query = select(
+            month,
+            DailyRollup.record_type,
+            DailyRollup.category,
+            func.sum(DailyRollup.total_minor).label("total"),
+            func.sum(DailyRollup.record_count).label("record_count")
+        ).where(
+            and_(
+                DailyRollup.dataset_id == dataset_id,
+                DailyRollup.day >= start,
+                DailyRollup.day < end
+            )
+        ).group_by(month, DailyRollup.record_type, DailyRollup.category)
+
+        result = await self.db.execute(query)
+        frame = pd.DataFrame(result.all(), columns=["month", "record_type", "category", "total", "record_count"])
+        frame["month"] = pd.to_datetime(frame["month"])
+        frame["total"] = frame["total"].astype("int64")
+        return frame
+
+    async def _net_before(self, dataset_id: int, before: date) -> int:
+        revenue = func.coalesce(func.sum(DailyRollup.total_minor).filter(DailyRollup.record_type == RecordType.REVENUE.value), 0)
+        expenses = func.coalesce(func.sum(DailyRollup.total_minor).filter(DailyRollup.record_type == RecordType.EXPENSE.value), 0)
+        result = await self.db.execute(
+            select(revenue - expenses).where(
+                and_(DailyRollup.dataset_id == dataset_id, DailyRollup.day < before)
+            )
+        )
+        return int(result.scalar() or 0)
+
+    async def _minor_per_unit(self, dataset_id: int) -> int:
+        currency = await self.db.scalar(select(FinancialDataset.currency).where(FinancialDataset.id == dataset_id))
+        return 10 ** exponent(currency or DEFAULT_CURRENCY)
+
+    async def refresh(
+        self,
+        dataset_id: int,
+        date_from: Union[date, datetime],
+        date_to: Optional[Union[date, datetime]] = None
+    ) -> int:
+        """
+        Recompute KPIs for the months affected by records in [date_from, date_to].
+
+        A change in month M affects M itself, later growth comparisons and the
+        cumulative expense coverage, so months from M to the dataset's latest month
+        are recomputed; inputs reach 12 months further back for YoY. Results
+        are upserted into kpi_metrics. ``date_to`` is accepted for symmetry with
+        RollupService.refresh; everything after ``date_from`` is recomputed
+        anyway. Returns the number of rows written.
+        """
+        start = date_from.date() if isinstance(date_from, datetime) else date_from
+        first_month = date(start.year, start.month, 1)
+
+        last_day = (await self.db.execute(
+            select(func.max(DailyRollup.day)).where(DailyRollup.dataset_id == dataset_id)
+        )).scalar()
+        if last_day is None:
+            return 0
+        if isinstance(last_day, str):
+            last_day = date.fromisoformat(last_day)
+        last_month = date(last_day.year, last_day.month, 1)
+        if last_month < first_month:
+            return 0
+
+        window_start = _add_months(first_month, -12)
+        frame = await self._monthly_totals(dataset_id, window_start, _add_months(last_month, 1))
+        opening_net = await self._net_before(dataset_id, window_start)
+        months = pd.date_range(window_start, last_month, freq="MS")
+        metrics = compute_monthly_kpis(frame, months, opening_net, await self._minor_per_unit(dataset_id))
+
+        output = metrics.loc[pd.Timestamp(first_month):]
+        return await self._upsert(dataset_id, output)
+
+    async def recompute_all(self, dataset_id: int) -> int:
+        """Recompute every month of a dataset from its rollups"""
+        first_day = (await self.db.execute(
+            select(func.min(DailyRollup.day)).where(DailyRollup.dataset_id == dataset_id)
+        )).scalar()
+        if first_day is None:
+            return 0
+        if isinstance(first_day, str):
+            first_day = date.fromisoformat(first_day)
+        return await self.refresh(dataset_id, first_day)
+
+    async def _upsert(self, dataset_id: int, metrics: pd.DataFrame) -> int:
+        long = metrics.rename_axis("period_start").reset_index().melt(
+            id_vars="period_start", var_name="metric_type", value_name="value"
+        )
+        period_start = long["period_start"].astype(object)
+        period_end = (long["period_start"] + pd.offsets.MonthBegin(1) - pd.Timedelta(seconds=1)).astype(object)
+        values = long["value"].astype(object).where(long["value"].notna(), None)
+
+        rows: List[Dict[str, Any]] = [
+            {
+                "dataset_id": dataset_id,
+                "metric_type": metric_type,
+                "period_type": PERIOD_TYPE,
+                "period_start": start,
+                "period_end": end,
+                "value": value,
+            }
+            for metric_type, start, end, value in zip(long["metric_type"], period_start, period_end, values)
+        ]
+
+        # rows of metrics since renamed or dropped from the catalogue
+        await self.db.execute(
+            delete(KPIMetric).where(KPIMetric.dataset_id == dataset_id, KPIMetric.metric_type.not_in(list(KPI_CATALOGUE)))
+        )
+        insert = dialect_insert(self.db)
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            statement = insert(KPIMetric).values(rows[start:start + UPSERT_BATCH_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=["dataset_id", "metric_type", "period_type", "period_start"],
+                set_={
+                    "value": statement.excluded.value,
+                    "period_end": statement.excluded.period_end,
+                    "calculated_at": func.now(),
+                }
+            )
+            await self.db.execute(statement)
+        await self.db.commit()
+        return len(rows)
@@ -0,0 +1,308 @@
+"""
+Period Analytics Service - Rolling windows and period-over-period changes per category
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, func, literal_column, select, true, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import timed
+from app.core.money import DEFAULT_CURRENCY, exponent
+from app.models.financial_models import DailyRollup, FinancialDataset
+from app.services.rollup_service import month_bucket
+
+DEFAULT_WINDOW = 3
+
+# Columns produced by both computation paths, one row per (series, month)
+METRIC_COLUMNS = [
+    "period", "record_type", "category", "total", "rolling_sum", "moving_average",
+    "previous_month", "trailing_quarter", "previous_quarter", "previous_year", "ytd",
+]
+
+
+@timed("period_metrics_frame")
+def compute_window_metrics(totals: np.ndarray, periods: pd.DatetimeIndex, window: int) -> Dict[str, np.ndarray]:
+    """
+    Window metrics for a dense (series x month) matrix of int64 minor units.
+
+    Every metric is a difference of one cumulative sum, so the whole
+    matrix is handled in a single pass. Rolling sums and moving averages
+    over the first months use the partial window, as SQL frames do; the
+    comparisons are NaN until a full comparison period exists.
+    """
+    series_count, period_count = totals.shape
+    cumulative = np.zeros((series_count, period_count + 1), dtype=np.int64)
+    np.cumsum(totals, axis=1, out=cumulative[:, 1:])
+    index = np.arange(period_count)
+
+    def span(end: np.ndarray, width: int) -> np.ndarray:
+        # sum of the ``width`` months ending before position ``end`` (exclusive)
+        return (cumulative[:, np.maximum(end, 0)] - cumulative[:, np.maximum(end - width, 0)]).astype(np.float64)
+
+    def valid_from(values: np.ndarray, first: int) -> np.ndarray:
+        values[:, index < first] = np.nan
+        return values
+
+    rolling_sum = span(index + 1, window)
+    shifted = np.full((series_count, period_count), np.nan)
+
+    previous_month = shifted.copy()
+    previous_month[:, 1:] = totals[:, :-1]
+    previous_year = shifted.copy()
+    previous_year[:, 12:] = totals[:, :-12]
+
+    years = periods.year.to_numpy()
+    year_start = np.maximum.accumulate(np.where(np.r_[True, years[1:] != years[:-1]], index, 0))
+
+    return {
+        "total": totals.astype(np.float64),
+        "rolling_sum": rolling_sum,
+        "moving_average": rolling_sum / np.minimum(index + 1, window),
+        "previous_month": previous_month,
+        "trailing_quarter": valid_from(span(index + 1, 3), 2),
+        "previous_quarter": valid_from(span(index - 2, 3), 5),
+        "previous_year": previous_year,
+        "ytd": (cumulative[:, index + 1] - cumulative[:, year_start]).astype(np.float64),
+    }
+
+
+def _change(current: pd.Series, base: pd.Series):
+    change = current - base
+    return change, (change / base.where(base > 0) * 100).round(2)
+
+
+class PeriodAnalyticsService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.bind.dialect.name
+
+    async def _dataset_currency(self, dataset_id: int) -> str:
+        currency = await self.db.scalar(select(FinancialDataset.currency).where(FinancialDataset.id == dataset_id))
+        return currency or DEFAULT_CURRENCY
+
+    async def metrics_frame(self, dataset_id: int, window: int = DEFAULT_WINDOW) -> pd.DataFrame:
+        """
+        One row per (record type, category, month) with window metrics in minor units.
+
+        Rows with a null category are the record type's total over all
+        categories. Months are dense from the first to the last month with
+        data, so lags always compare calendar months.
+        """
+        if self.dialect == "postgresql":
+            frame = await self._metrics_sql(dataset_id, window)
+        else:
+            frame = await self._metrics_numpy(dataset_id, window)
+        frame["period"] = pd.to_datetime(frame["period"])
+        return frame
+
+    async def _metrics_sql(self, dataset_id: int, window: int) -> pd.DataFrame:
+        """Postgres: month buckets, densified with generate_series, and window functions in one query"""
+        # literal field names keep the SELECT and GROUP BY expressions identical
+        month = func.date_trunc(literal_column("'month'"), DailyRollup.day)
+        monthly = select(
+            month.label("period"),
+            DailyRollup.record_type,
+            DailyRollup.category,
+            func.sum(DailyRollup.total_minor).label("total")
+        ).where(DailyRollup.dataset_id == dataset_id).group_by(
+            func.grouping_sets(
+                tuple_(month, DailyRollup.record_type, DailyRollup.category),
+                tuple_(month, DailyRollup.record_type)
+            )
+        ).cte("monthly")
+
+        keys = select(monthly.c.record_type, monthly.c.category).distinct().cte("series_keys")
+        months = select(
+            func.generate_series(
+                func.min(monthly.c.period), func.max(monthly.c.period), literal_column("interval '1 month'")
+            ).label("period")
+        ).cte("months")
+        grid = select(
+            months.c.period,
+            keys.c.record_type,
+            keys.c.category,
+            func.coalesce(monthly.c.total, 0).label("total")
+        ).select_from(
+            months.join(keys, true()).outerjoin(
+                monthly,
+                and_(
+                    monthly.c.period == months.c.period,
+                    monthly.c.record_type == keys.c.record_type,
+                    monthly.c.category.is_not_distinct_from(keys.c.category)
+                )
+            )
+        ).cte("grid")
+
+        partition = [grid.c.record_type, grid.c.category]
+        order = grid.c.period
+
+        def over(expression, **frame):
+            return expression.over(partition_by=partition, order_by=order, **frame)
+
+        position = over(func.row_number())
+        query = select(
+            grid.c.period,
+            grid.c.record_type,
+            grid.c.category,
+            grid.c.total,
+            over(func.sum(grid.c.total), rows=(-(window - 1), 0)).label("rolling_sum"),
+            over(func.avg(grid.c.total), rows=(-(window - 1), 0)).label("moving_average"),
+            over(func.lag(grid.c.total, 1)).label("previous_month"),
+            case((position >= 3, over(func.sum(grid.c.total), rows=(-2, 0)))).label("trailing_quarter"),
+            case((position >= 6, over(func.sum(grid.c.total), rows=(-5, -3)))).label("previous_quarter"),
+            over(func.lag(grid.c.total, 12)).label("previous_year"),
+            func.sum(grid.c.total).over(
+                partition_by=partition + [func.date_trunc(literal_column("'year'"), grid.c.period)],
+                order_by=order,
+                rows=(None, 0)
+            ).label("ytd"),
+        ).order_by(grid.c.record_type, grid.c.category, grid.c.period)
+
+        result = await self.db.execute(query)
+        frame = pd.DataFrame(result.all(), columns=METRIC_COLUMNS)
+        numeric = METRIC_COLUMNS[3:]
+        frame[numeric] = frame[numeric].astype(np.float64)
+        return frame
+
+    async def _metrics_numpy(self, dataset_id: int, window: int) -> pd.DataFrame:
+        """Other databases: monthly totals from SQL, window metrics with NumPy"""
+        month = month_bucket(DailyRollup.day, self.dialect).label("period")
+        result = await self.db.execute(
+            select(
+                month,
+                DailyRollup.record_type,
+                DailyRollup.category,
+                func.sum(DailyRollup.total_minor).label("total")
+            ).where(DailyRollup.dataset_id == dataset_id)
+            .group_by(month, DailyRollup.record_type, DailyRollup.category)
+        )
+        monthly = pd.DataFrame(result.all(), columns=["period", "record_type", "category", "total"])
+        if monthly.empty:
+            return pd.DataFrame(columns=METRIC_COLUMNS)
+        monthly["period"] = pd.to_datetime(monthly["period"])
+        monthly["total"] = monthly["total"].astype(np.int64)
+
+        # record type totals are extra series with no category
+        by_type = monthly.groupby(["period", "record_type"], as_index=False)["total"].sum()
+        monthly = pd.concat([monthly, by_type.assign(category=None)], ignore_index=True)
+
+        periods = pd.date_range(monthly["period"].min(), monthly["period"].max(), freq="MS")
+        keys = monthly[["record_type", "category"]].drop_duplicates().reset_index(drop=True)
+        series = pd.MultiIndex.from_frame(keys.fillna({"category": ""}))
+        rows = series.get_indexer(pd.MultiIndex.from_frame(monthly[["record_type", "category"]].fillna({"category": ""})))
+        columns = periods.get_indexer(monthly["period"])
+
+        totals = np.zeros((len(keys), len(periods)), dtype=np.int64)
+        totals[rows, columns] = monthly["total"].to_numpy()
+        metrics = compute_window_metrics(totals, periods, window)
+
+        frame = pd.DataFrame({
+            "period": np.tile(periods.to_numpy(), len(keys)),
+            "record_type": np.repeat(keys["record_type"].to_numpy(), len(periods)),
+            "category": np.repeat(keys["category"].to_numpy(), len(periods)),
+            **{name: values.ravel() for name, values in metrics.items()},
+        })
+        return frame[METRIC_COLUMNS]
+
+    async def get_period_analytics(
+        self,
+        dataset_id: int,
+        window: int = DEFAULT_WINDOW,
+        record_type: Optional[str] = None,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Monthly totals with rolling sums, moving averages, MoM/QoQ/YoY changes and YTD.
+
+        MoM compares a month with the one before, QoQ the trailing three
+        months with the three before them, and YoY a month with the same
+        month a year earlier. Percentages are null when the base is zero or
+        missing. Comparisons use history before ``date_from`` even though
+        only months in the range are returned.
+        """
+        currency = await self._dataset_currency(dataset_id)
+        frame = await self.metrics_frame(dataset_id, window)
+        if record_type:
+            frame = frame[frame["record_type"] == record_type]
+        if category:
+            frame = frame[frame["category"] == category]
+        if date_from:
+            frame = frame[frame["period"] >= pd.Timestamp(date_from.replace(tzinfo=None)).to_period("M").to_timestamp()]
+        if date_to:
+            frame = frame[frame["period"] <= pd.Timestamp(date_to.replace(tzinfo=None))]
+
+        points = self._points(frame, currency)
+        series = [
+            {
+                "record_type": key_type,
+                "category": key_category or None,
+                "points": group.drop(columns=["record_type", "category"]).to_dict("records")
+            }
+            for (key_type, key_category), group in points.groupby(["record_type", points["category"].fillna("")])
+        ]
+        return {
+            "currency": currency,
+            "window": window,
+            "periods": sorted(points["period"].unique().tolist()),
+            "series": series,
+        }
+
+    @staticmethod
+    def _points(frame: pd.DataFrame, currency: str) -> pd.DataFrame:
+        """Changes and percentages from the raw metrics, with amounts in currency units"""
+        scale = 10 ** exponent(currency)
+        mom_change, mom_pct = _change(frame["total"], frame["previous_month"])
+        qoq_change, qoq_pct = _change(frame["trailing_quarter"], frame["previous_quarter"])
+        yoy_change, yoy_pct = _change(frame["total"], frame["previous_year"])
+
+        points = pd.DataFrame({
+            "record_type": frame["record_type"],
+            "category": frame["category"].astype(object).where(frame["category"].notna(), None),
+            "period": frame["period"].dt.strftime("%Y-%m"),
+            "total": frame["total"] / scale,
+            "rolling_sum": frame["rolling_sum"] / scale,
+            "moving_average": (frame["moving_average"] / scale).round(exponent(currency) + 2),
+            "mom_change": mom_change / scale,
+            "mom_pct": mom_pct,
+            "qoq_change": qoq_change / scale,
+            "qoq_pct": qoq_pct,
+            "yoy_change": yoy_change / scale,
+            "yoy_pct": yoy_pct,
+            "ytd": frame["ytd"] / scale,
+        })
+        # NaN is not valid JSON
+        return points.astype(object).where(points.notna(), None)
+
+    async def latest_comparison(self, dataset_id: int, movers: int = 3) -> Dict[str, Any]:
+        """
+        Period-over-period figures for the most recent month, for the comparative prompt:
+        record type totals plus the categories with the largest month-over-month moves.
+        """
+        currency = await self._dataset_currency(dataset_id)
+        frame = await self.metrics_frame(dataset_id)
+        if frame.empty:
+            return {"currency": currency, "period": None, "totals": [], "movers": []}
+
+        latest = self._points(frame[frame["period"] == frame["period"].max()], currency)
+        totals = latest[latest["category"].isna()]
+        categories = latest[latest["category"].notna()]
+        ranked = categories.assign(
+            magnitude=categories["mom_change"].fillna(0).astype(float).abs()
+        ).sort_values("magnitude", ascending=False).drop(columns="magnitude")
+
+        fields = ["record_type", "total", "mom_change", "mom_pct", "qoq_pct", "yoy_change", "yoy_pct", "ytd"]
+        return {
+            "currency": currency,
+            "period": latest["period"].iloc[0],
+            "totals": totals[fields].to_dict("records"),
+            "movers": ranked[["category"] + fields].head(movers).to_dict("records"),
+        }
@@ -0,0 +1,295 @@
+"""
+Portfolio Service - Summary, category and trend analytics across many datasets in one grouped query
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import Integer, and_, any_, bindparam, func, not_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import timed
+from app.core.money import FxRateNotFoundError, to_number
+from app.models.financial_models import DailyRollup, FinancialDataset, RecordType
+from app.services.fx_service import FxService, convert_minor_array
+from app.services.rollup_service import RollupService, month_bucket
+
+SECTIONS = ("summary", "categories", "trends")
+
+MONTHLY_COLUMNS = ["dataset_id", "month", "record_type", "category", "total", "record_count", "first_day", "last_day"]
+
+# Monthly totals of datasets in another currency convert at the rate in effect mid-month
+CONVERSION_DAY_OFFSET = timedelta(days=14)
+
+
+def dataset_filter(column, dataset_ids: List[int], dialect: str):
+    """``column = ANY(:dataset_ids)`` on Postgres: one array parameter however many ids"""
+    if dialect == "postgresql":
+        return column == any_(bindparam("dataset_ids", dataset_ids, type_=ARRAY(Integer)))
+    return column.in_(dataset_ids)
+
+
+def _margin(revenue: int, expenses: int) -> float:
+    return ((revenue - expenses) / revenue * 100) if revenue > 0 else 0
+
+
+class PortfolioService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.bind.dialect.name
+
+    async def resolve_datasets(self, dataset_ids: Optional[List[int]] = None, owner_id: Optional[int] = None) -> pd.DataFrame:
+        """id, name and currency of the requested datasets (or of an owner's datasets), by id"""
+        query = select(FinancialDataset.id, FinancialDataset.name, FinancialDataset.currency)
+        if dataset_ids:
+            query = query.where(dataset_filter(FinancialDataset.id, sorted(set(dataset_ids)), self.dialect))
+        if owner_id is not None:
+            query = query.where(FinancialDataset.owner_id == owner_id)
+        result = await self.db.execute(query.order_by(FinancialDataset.id))
+        return pd.DataFrame(result.all(), columns=["dataset_id", "name", "currency"])
+
+    async def monthly_totals(
+        self,
+        dataset_ids: List[int],
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """
+        Monthly rollup totals per dataset, record type and category.
+
+        This single grouped query is the only scan of the rollups: every
+        section and every per-dataset breakdown is derived from its result.
+        Days in a dataset's pending span (ingested, rollups not yet rebuilt)
+        come from raw records instead, as in FxService.converted_rollups.
+        """
+        pending = await self._pending_spans(dataset_ids, date_from, date_to)
+
+        month = month_bucket(DailyRollup.day, self.dialect).label("month")
+        conditions = [dataset_filter(DailyRollup.dataset_id, dataset_ids, self.dialect)]
+        if date_from:
+            conditions.append(DailyRollup.day >= date_from.date())
+        if date_to:
+            conditions.append(DailyRollup.day <= date_to.date())
+        conditions.extend(
+            not_(and_(DailyRollup.dataset_id == dataset_id, DailyRollup.day >= day_from, DailyRollup.day <= day_to))
+            for dataset_id, day_from, day_to in pending
+        )
+        result = await self.db.execute(
+            select(
+                DailyRollup.dataset_id,
+                month,
+                DailyRollup.record_type,
+                DailyRollup.category,
+                func.sum(DailyRollup.total_minor),
+                func.sum(DailyRollup.record_count),
+                func.min(DailyRollup.day),
+                func.max(DailyRollup.day)
+            ).where(and_(*conditions))
+            .group_by(DailyRollup.dataset_id, month, DailyRollup.record_type, DailyRollup.category)
+        )
+        frame = pd.DataFrame(result.all(), columns=MONTHLY_COLUMNS)
+        frame["month"] = pd.to_datetime(frame["month"])
+        if pending:
+            frame = await self._merge_pending(frame, pending)
+        frame["total"] = frame["total"].astype("int64")
+        frame["record_count"] = frame["record_count"].astype("int64")
+        return frame
+
+    async def _pending_spans(
+        self,
+        dataset_ids: List[int],
+        date_from: Optional[datetime],
+        date_to: Optional[datetime]
+    ) -> List[Tuple[int, date, date]]:
+        """(dataset_id, first day, last day) of each dataset's pending span, clipped to the requested days"""
+        result = await self.db.execute(
+            select(FinancialDataset.id, FinancialDataset.pending_refresh_from, FinancialDataset.pending_refresh_to).where(
+                dataset_filter(FinancialDataset.id, dataset_ids, self.dialect),
+                FinancialDataset.pending_refresh_from.isnot(None)
+            )
+        )
+        spans = []
+        for dataset_id, pending_from, pending_to in result.all():
+            day_from = max(pending_from.date(), date_from.date()) if date_from else pending_from.date()
+            day_to = (pending_to or pending_from).date()
+            day_to = min(day_to, date_to.date()) if date_to else day_to
+            if day_from <= day_to:
+                spans.append((dataset_id, day_from, day_to))
+        return spans
+
+    async def _merge_pending(self, frame: pd.DataFrame, pending: List[Tuple[int, date, date]]) -> pd.DataFrame:
+        """Add monthly totals of the pending spans, aggregated from raw records, to the rollup totals"""
+        rollups = RollupService(self.db)
+        days = []
+        for dataset_id, day_from, day_to in pending:
+            result = await self.db.execute(rollups.record_totals(dataset_id, day_from, day_to))
+            days.extend(result.all())
+        if not days:
+            return frame
+        recent = pd.DataFrame(days, columns=["dataset_id", "day", "record_type", "category", "total", "record_count"])
+        recent["day"] = pd.to_datetime(recent["day"])
+        recent = recent.assign(
+            month=recent["day"].dt.to_period("M").dt.to_timestamp(),
+            first_day=recent["day"].dt.date,
+            last_day=recent["day"].dt.date,
+        )[MONTHLY_COLUMNS]
+        parts = [part for part in (frame, recent) if not part.empty]
+        return pd.concat(parts, ignore_index=True).groupby(
+            ["dataset_id", "month", "record_type", "category"], as_index=False, sort=False
+        ).agg(total=("total", "sum"), record_count=("record_count", "sum"), first_day=("first_day", "min"), last_day=("last_day", "max"))[MONTHLY_COLUMNS]
+
+    @timed("portfolio_convert")
+    async def convert_totals(self, frame: pd.DataFrame, datasets: pd.DataFrame, currency: str) -> pd.DataFrame:
+        """Express every dataset's totals in the reporting currency, one vectorized lookup per source currency"""
+        currencies = frame["dataset_id"].map(datasets.set_index("dataset_id")["currency"])
+        totals = frame["total"].to_numpy().copy()
+        fx = FxService(self.db)
+        for code, positions in frame.groupby(currencies).indices.items():
+            if code == currency:
+                continue
+            rates = await fx.rates_on(code, currency, frame["month"].iloc[positions] + CONVERSION_DAY_OFFSET)
+            if rates is None:
+                raise FxRateNotFoundError(f"No FX rate from {code} to {currency}")
+            totals[positions] = convert_minor_array(totals[positions], rates, code, currency)
+        return frame.assign(total=totals)
+
+    async def section(
+        self,
+        name: str,
+        currency: str,
+        dataset_ids: Optional[List[int]] = None,
+        owner_id: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        """
+        Portfolio-wide figures plus a lazily built entry per dataset, all in ``currency``.
+
+        Returns the response head and the per-dataset entries separately so
+        large portfolios can be streamed entry by entry.
+        """
+        datasets = await self.resolve_datasets(dataset_ids, owner_id)
+        frame = pd.DataFrame(columns=MONTHLY_COLUMNS)
+        if not datasets.empty:
+            frame = await self.convert_totals(
+                await self.monthly_totals(datasets["dataset_id"].tolist(), date_from, date_to), datasets, currency
+            )
+
+        head = {
+            "currency": currency,
+            "dataset_count": len(datasets),
+            "date_from": date_from.isoformat() if date_from else None,
+            "date_to": date_to.isoformat() if date_to else None,
+        }
+        if dataset_ids:
+            head["missing_dataset_ids"] = sorted(set(dataset_ids) - set(datasets["dataset_id"].tolist()))
+
+        builder = {"summary": self._summary, "categories": self._categories, "trends": self._trends}[name]
+        portfolio, per_dataset = builder(frame, currency)
+        head["portfolio"] = portfolio
+
+        def entries():
+            for dataset_id, dataset_name, dataset_currency in datasets.itertuples(index=False):
+                yield {
+                    "dataset_id": dataset_id,
+                    "name": dataset_name,
+                    "dataset_currency": dataset_currency,
+                    **per_dataset(dataset_id),
+                }
+
+        return head, entries()
+
+    @staticmethod
+    def _summary(frame: pd.DataFrame, currency: str):
+        by_type = frame.groupby(["dataset_id", "record_type"])[["total", "record_count"]].sum().unstack("record_type", fill_value=0)
+        spans = frame.groupby("dataset_id").agg(first_day=("first_day", "min"), last_day=("last_day", "max"))
+
+        def summary(totals: pd.Series, first_day, last_day) -> Dict[str, Any]:
+            revenue = int(totals.get(("total", RecordType.REVENUE.value), 0))
+            expenses = int(totals.get(("total", RecordType.EXPENSE.value), 0))
+            revenue_count = int(totals.get(("record_count", RecordType.REVENUE.value), 0))
+            expense_count = int(totals.get(("record_count", RecordType.EXPENSE.value), 0))
+            return {
+                "total_records": int(totals.xs("record_count", level=0).sum()) if len(totals) else 0,
+                "total_revenue": to_number(revenue, currency),
+                "total_expenses": to_number(expenses, currency),
+                "net_profit": to_number(revenue - expenses, currency),
+                "profit_margin": _margin(revenue, expenses),
+                "revenue_transactions": revenue_count,
+                "expense_transactions": expense_count,
+                "date_range_start": first_day,
+                "date_range_end": last_day,
+            }
+
+        empty = pd.Series(dtype="int64")
+        portfolio = summary(
+            by_type.sum() if not by_type.empty else empty,
+            frame["first_day"].min() if not frame.empty else None,
+            frame["last_day"].max() if not frame.empty else None,
+        )
+
+        def per_dataset(dataset_id: int) -> Dict[str, Any]:
+            if dataset_id not in by_type.index:
+                return {"summary": summary(empty, None, None)}
+            span = spans.loc[dataset_id]
+            return {"summary": summary(by_type.loc[dataset_id], span["first_day"], span["last_day"])}
+
+        return portfolio, per_dataset
+
+    @staticmethod
+    def _categories(frame: pd.DataFrame, currency: str):
+        def rows(grouped: pd.DataFrame, record_type: RecordType) -> List[Dict[str, Any]]:
+            if record_type.value not in grouped.index.get_level_values("record_type"):
+                return []
+            subset = grouped.xs(record_type.value, level="record_type")
+            return [
+                {"category": category, "total": to_number(total, currency), "count": int(count)}
+                for category, total, count in zip(subset.index, subset["total"], subset["record_count"])
+            ]
+
+        def breakdown(grouped: pd.DataFrame) -> Dict[str, Any]:
+            return {
+                "revenue_by_category": rows(grouped, RecordType.REVENUE),
+                "expenses_by_category": rows(grouped, RecordType.EXPENSE),
+            }
+
+        by_dataset = frame.groupby(["dataset_id", "record_type", "category"])[["total", "record_count"]].sum()
+        portfolio = breakdown(frame.groupby(["record_type", "category"])[["total", "record_count"]].sum())
+
+        def per_dataset(dataset_id: int) -> Dict[str, Any]:
+            if dataset_id not in by_dataset.index.get_level_values("dataset_id"):
+                return {"revenue_by_category": [], "expenses_by_category": []}
+            return breakdown(by_dataset.xs(dataset_id, level="dataset_id"))
+
+        return portfolio, per_dataset
+
+    @staticmethod
+    def _trends(frame: pd.DataFrame, currency: str):
+        def trend(totals: pd.DataFrame) -> List[Dict[str, Any]]:
+            revenue = totals.get(RecordType.REVENUE.value, pd.Series(0, index=totals.index))
+            expenses = totals.get(RecordType.EXPENSE.value, pd.Series(0, index=totals.index))
+            return [
+                {
+                    "period": month.strftime("%Y-%m"),
+                    "revenue": to_number(month_revenue, currency),
+                    "expense": to_number(month_expenses, currency),
+                    "profit": to_number(month_revenue - month_expenses, currency),
+                    "margin": _margin(int(month_revenue), int(month_expenses)),
+                }
+                for month, month_revenue, month_expenses in zip(totals.index, revenue, expenses)
+            ]
+
+        by_dataset = frame.groupby(["dataset_id", "month", "record_type"])["total"].sum().unstack("record_type", fill_value=0)
+        portfolio = {"trends": trend(frame.groupby(["month", "record_type"])["total"].sum().unstack("record_type", fill_value=0))}
+
+        def per_dataset(dataset_id: int) -> Dict[str, Any]:
+            if dataset_id not in by_dataset.index.get_level_values("dataset_id"):
+                return {"trends": []}
+            return {"trends": trend(by_dataset.xs(dataset_id, level="dataset_id"))}
+
+        return portfolio, per_dataset
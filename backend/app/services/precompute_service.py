@@ -0,0 +1,268 @@
+"""
+Precompute Service - Background refresh of rollups, KPIs, cached analytics and AI insights
+"""
+
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, update, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from app.core.cache import FX_SCOPE, analytics_cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.events import event_bus
+from app.core.money import normalize_currency
+from app.core.scheduler import job
+from app.models.financial_models import FinancialDataset
+from app.services.financial_data_service import FinancialDataService
+from app.services.rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+# Default period of the analytics endpoints, warmed after each refresh
+WARM_PERIOD = "monthly"
+
+
+async def _reporting_service(service: FinancialDataService, dataset_id: int, currency: Optional[str]):
+    """
+    FxService when ``currency`` differs from the dataset's own currency, else None.
+    Converted results depend on the rate table too, so their cache key
+    carries the FX generation.
+    """
+    if currency is None:
+        return None, None
+    currency = normalize_currency(currency)
+    if currency == await service.get_dataset_currency(dataset_id):
+        return None, None
+    from app.services.fx_service import FxService
+
+    return FxService(service.read_db), {"currency": currency, "fx": await analytics_cache.generation(FX_SCOPE)}
+
+
+async def cached_summary(
+    service: FinancialDataService,
+    dataset_id: int,
+    date_from=None,
+    date_to=None,
+    currency: Optional[str] = None
+) -> Dict[str, Any]:
+    """Serve the dataset summary through the analytics cache, optionally in a reporting currency"""
+    fx, fx_params = await _reporting_service(service, dataset_id, currency)
+
+    async def compute():
+        if fx is not None:
+            summary = await fx.get_data_summary(dataset_id, fx_params["currency"], date_from, date_to)
+        else:
+            summary = await service.get_data_summary(dataset_id, date_from, date_to)
+        return summary.model_dump(mode="json")
+    return await analytics_cache.get_or_compute(
+        dataset_id, "summary", compute, date_from=date_from, date_to=date_to, **(fx_params or {})
+    )
+
+
+async def cached_analysis(
+    service: FinancialDataService,
+    name: str,
+    dataset_id: int,
+    period: str = WARM_PERIOD,
+    date_from=None,
+    date_to=None,
+    currency: Optional[str] = None
+) -> Dict[str, Any]:
+    """Serve revenue/expense/profit analysis through the analytics cache, optionally in a reporting currency"""
+    fx, fx_params = await _reporting_service(service, dataset_id, currency)
+    source = fx or service
+    methods = {
+        "revenue": source.get_revenue_analysis,
+        "expenses": source.get_expense_analysis,
+        "profit": source.get_profit_analysis,
+    }
+
+    async def compute():
+        if fx is not None:
+            return await methods[name](dataset_id, fx_params["currency"], period, date_from, date_to)
+        return await methods[name](dataset_id, period, date_from, date_to)
+    return await analytics_cache.get_or_compute(
+        dataset_id, name, compute, period=period, date_from=date_from, date_to=date_to, **(fx_params or {})
+    )
+
+
+async def cached_period_analytics(
+    db: AsyncSession,
+    dataset_id: int,
+    window: int = 3,
+    record_type: Optional[str] = None,
+    category: Optional[str] = None,
+    date_from=None,
+    date_to=None
+) -> Dict[str, Any]:
+    """Serve rolling-window and period-over-period analytics through the analytics cache"""
+    # the engine pulls in pandas and NumPy; load it on first use
+    from app.services.period_analytics_service import PeriodAnalyticsService
+
+    async def compute():
+        return await PeriodAnalyticsService(db).get_period_analytics(
+            dataset_id, window, record_type, category, date_from, date_to
+        )
+    return await analytics_cache.get_or_compute(
+        dataset_id, "periods", compute,
+        window=window, record_type=record_type, category=category, date_from=date_from, date_to=date_to
+    )
+
+
+async def cached_forecast(
+    db: AsyncSession,
+    dataset_id: int,
+    horizon: int = 6,
+    simulations: Optional[int] = None,
+    method: str = "bootstrap",
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """Serve Monte Carlo cash-flow forecasts through the analytics cache"""
+    from app.services.simulation_service import SimulationService
+
+    simulations = simulations or settings.SIMULATION_PATHS
+
+    async def compute():
+        return await SimulationService(db).forecast(dataset_id, horizon, simulations, method, seed)
+    return await analytics_cache.get_or_compute(
+        dataset_id, "forecast", compute, horizon=horizon, simulations=simulations, method=method, seed=seed
+    )
+
+
+async def cached_budget_variance(
+    db: AsyncSession,
+    dataset_id: int,
+    as_of: Optional[date] = None,
+    period_from: Optional[date] = None,
+    period_to: Optional[date] = None,
+    category: Optional[str] = None,
+    record_type: Optional[str] = None,
+    alerts_only: bool = False
+) -> Dict[str, Any]:
+    """Serve budget-vs-actual variance through the analytics cache"""
+    from app.services.budget_service import BudgetService
+
+    # burn-to-date moves with the calendar, so the resolved day is part of the key
+    as_of = as_of or date.today()
+
+    async def compute():
+        return await BudgetService(db).get_variance(
+            dataset_id, as_of, period_from, period_to, category, record_type, alerts_only
+        )
+    return await analytics_cache.get_or_compute(
+        dataset_id, "budget_variance", compute,
+        as_of=as_of, period_from=period_from, period_to=period_to, category=category,
+        record_type=record_type, alerts_only=alerts_only
+    )
+
+
+class PrecomputeService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def datasets_pending_refresh(self) -> List[int]:
+        result = await self.db.execute(
+            select(FinancialDataset.id).where(FinancialDataset.pending_refresh_from.isnot(None))
+        )
+        return list(result.scalars().all())
+
+    async def refresh_dataset(self, dataset_id: int, include_insights: bool = True) -> Dict[str, Any]:
+        """
+        Bring a dataset's derived data up to date and warm its caches.
+
+        Rollups and KPIs are rebuilt for the pending date span recorded at
+        ingest. The pending markers are cleared only if no new write landed
+        meanwhile (updated_at unchanged); otherwise the next run picks the
+        widened span up again.
+        """
+        dataset = (await self.db.execute(
+            select(FinancialDataset).where(FinancialDataset.id == dataset_id)
+        )).scalar_one_or_none()
+        if dataset is None:
+            return {"dataset_id": dataset_id, "status": "missing"}
+
+        # the KPI engine pulls in pandas and NumPy; load it in the job, not at API start
+        from app.services.kpi_service import KPIService
+
+        pending_from, pending_to, marker = dataset.pending_refresh_from, dataset.pending_refresh_to, dataset.updated_at
+        version = None
+        if pending_from is not None:
+            await RollupService(self.db).refresh(dataset_id, pending_from, pending_to)
+            await KPIService(self.db).refresh(dataset_id, pending_from, pending_to)
+            version = await self.db.scalar(
+                update(FinancialDataset)
+                .where(and_(FinancialDataset.id == dataset_id, FinancialDataset.updated_at == marker))
+                .values(
+                    pending_refresh_from=None,
+                    pending_refresh_to=None,
+                    precomputed_at=func.now(),
+                    # KPIs changed, so responses tagged with the ingest version are stale
+                    version=FinancialDataset.version + 1
+                )
+                .returning(FinancialDataset.version)
+            )
+            await self.db.commit()
+            await analytics_cache.invalidate(dataset_id)
+
+        summary = await self.warm_analytics(dataset_id)
+        if version is not None:
+            await event_bus.publish(
+                "dataset_refreshed",
+                dataset_id,
+                version=version,
+                refreshed_from=pending_from,
+                refreshed_to=pending_to,
+                totals={key: summary[key] for key in ("total_records", "total_revenue", "total_expenses", "net_profit", "profit_margin")},
+            )
+
+        if pending_from is not None:
+            from app.services.budget_service import BudgetService
+
+            try:
+                await BudgetService(self.db).check_alerts(dataset_id)
+            except Exception:
+                logger.exception("Budget alert check failed for dataset %s", dataset_id)
+
+        insights = 0
+        if include_insights:
+            from app.services.ai_analysis_service import AIAnalysisService
+
+            try:
+                insights = len(await AIAnalysisService(self.db).precompute_insights(dataset_id))
+            except Exception:
+                logger.exception("Insight precompute failed for dataset %s", dataset_id)
+
+        return {
+            "dataset_id": dataset_id,
+            "status": "refreshed",
+            "refreshed_from": pending_from.isoformat() if pending_from else None,
+            "refreshed_to": pending_to.isoformat() if pending_to else None,
+            "insights": insights,
+        }
+
+    async def warm_analytics(self, dataset_id: int) -> Dict[str, Any]:
+        """Populate the cache entries the dashboard requests first; returns the summary"""
+        service = FinancialDataService(self.db)
+        summary = await cached_summary(service, dataset_id)
+        for name in ("revenue", "expenses", "profit"):
+            await cached_analysis(service, name, dataset_id)
+        await cached_period_analytics(self.db, dataset_id)
+        return summary
+
+
+@job("precompute_dataset")
+async def precompute_dataset(dataset_id: int, include_insights: bool = True) -> Dict[str, Any]:
+    async with AsyncSessionLocal() as db:
+        return await PrecomputeService(db).refresh_dataset(dataset_id, include_insights)
+
+
+@job("precompute_pending_datasets", every_seconds=settings.PRECOMPUTE_INTERVAL_SECONDS)
+async def precompute_pending_datasets() -> List[Dict[str, Any]]:
+    """Periodic sweep for datasets whose enqueued refresh was missed or superseded"""
+    async with AsyncSessionLocal() as db:
+        service = PrecomputeService(db)
+        return [await service.refresh_dataset(dataset_id) for dataset_id in await service.datasets_pending_refresh()]
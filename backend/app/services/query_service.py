@@ -0,0 +1,563 @@
+"""
+Query Service - Natural-language questions planned into structured queries and answered exactly from rollups
+"""
+
+import logging
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import analytics_cache, plan_cache
+from app.core.config import settings
+from app.core.metrics import timed
+from app.core.money import DEFAULT_CURRENCY, to_number
+from app.core.search_index import query_terms
+from app.models.financial_models import DailyRollup, FinancialDataset, RecordType
+from app.schemas.financial_schemas import QueryPlan
+from app.services.rollup_service import month_bucket
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the rule parser or the plan format changes, orphaning cached plans
+PLANNER_VERSION = 1
+PLAN_SCOPE = "plans"
+
+METRIC_PATTERNS = {
+    "margin": r"\b(margins?|profitability)\b",
+    "profit": r"\b(profits?|net income|net|bottom line|cash ?flow|earnings)\b",
+    "revenue": r"\b(revenues?|sales|turnover|income|inflows?|earned)\b",
+    "expenses": r"\b(expenses?|expenditures?|spend|spending|spent|costs?|outflows?|bills?)\b",
+    "transactions": r"\b(transactions?|how many|number of|count)\b",
+}
+METRIC_LABELS = {
+    "revenue": "Revenue", "expenses": "Expenses", "profit": "Profit", "margin": "Profit margin", "transactions": "Transactions",
+}
+
+# First match wins
+GROUP_PATTERNS = [
+    ("quarter", r"\b(by|per|each|every) quarter\b|\bquarterly\b|\bquarter by quarter\b"),
+    ("month", r"\b(by|per|each|every) month\b|\bmonthly\b|\bmonth by month\b|\bover time\b|\btrends?\b|\btrending\b"),
+    ("record_type", r"\b(by|per) (record |transaction )?type\b"),
+    (
+        "category",
+        r"\b(by|per|each|every|for each|across|which) (categor(y|ies)|accounts?|product lines?|lines?|segments?)\b"
+        r"|\bbreak ?down\b|\bbroken down\b|\bsplit\b|\b(biggest|largest|highest|lowest|smallest)\b",
+    ),
+]
+
+# Removed from the question before the period is read, so "vs last year" does not set the period
+COMPARE_PATTERNS = [
+    (
+        "previous_year",
+        r"\b(vs|versus|compared (to|with)|against|relative to|from)\s+(the )?(same (period|quarter|month) )?"
+        r"(last|prior|previous|a) year( earlier| before)?\b|\byoy\b|\byear over year\b|\bsame (period|quarter|month) last year\b",
+    ),
+    (
+        "previous_period",
+        r"\b(vs|versus|compared (to|with)|against|relative to)\s+(the )?(prior|previous|preceding|last|one before)"
+        r"( (period|quarter|month|year))?\b|\b(qoq|mom|quarter over quarter|month over month|period over period)\b",
+    ),
+]
+# Asking about change without saying against what compares with the preceding period
+CHANGE_PATTERN = r"\b(growth|grow|grew|growing|change|changed|increase|increased|decrease|decreased|drop|dropped|rise|rose)\b"
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+PERIOD_PATTERNS = [
+    ("last_n_months", r"\b(last|past|trailing|previous) (\d{1,3}) months\b"),
+    ("last_12_months", r"\b(past|trailing) year\b|\bttm\b|\blast twelve months\b"),
+    ("last_quarter", r"\b(last|previous|prior) quarter\b"),
+    ("this_quarter", r"\b(this|current) quarter\b|\bqtd\b|\bquarter to date\b"),
+    ("last_month", r"\b(last|previous|prior) month\b"),
+    ("this_month", r"\b(this|current) month\b|\bmtd\b|\bmonth to date\b"),
+    ("last_year", r"\b(last|previous|prior) year\b"),
+    ("this_year", r"\b(this|current) year\b|\bytd\b|\byear to date\b"),
+    ("quarter_of_year", r"\bq([1-4]) (\d{4})\b|\b(\d{4}) q([1-4])\b"),
+    ("month_of_year", rf"\b({'|'.join(MONTHS)})[a-z]* (\d{{4}})\b"),
+    ("year", r"\b(19\d{2}|20\d{2})\b"),
+]
+LIMIT_PATTERN = r"\b(top|bottom|biggest|largest|highest|lowest|smallest|first) (\d{1,3})\b"
+
+# Words of questions that are neither vocabulary nor category names
+FILLER_WORDS = frozenset(
+    "what whats which how much many show me give tell list did do does we i my us our total totals amount amounts "
+    "per each every vs versus compared compare against period periods month months quarter quarters year years "
+    "last this current prior previous category categories account accounts value values over time during between "
+    "so far since until about where when who why most least top bottom biggest largest highest lowest smallest "
+    "been being had make made get got see overall all figure figures numbers breakdown number".split()
+)
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case words and numbers only, so spacing and punctuation variants share one cached plan"""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+def _take(pattern: str, text: str) -> Tuple[Optional[re.Match], str]:
+    """First match of ``pattern`` and the text with it blanked out"""
+    match = re.search(pattern, text)
+    if match is None:
+        return None, text
+    return match, f"{text[:match.start()]} {text[match.end():]}"
+
+
+@timed("query_plan_rules")
+def parse_question(question: str) -> QueryPlan:
+    """
+    Local rule-based planner: keyword patterns for metrics, grouping,
+    period and comparison. Words left over are kept as category terms;
+    the executor applies those that match a category of the dataset.
+    """
+    text = normalize_question(question)
+    plan: Dict[str, Any] = {}
+
+    compare = None
+    for name, pattern in COMPARE_PATTERNS:
+        match, text = _take(pattern, text)
+        if match:
+            compare = name
+            break
+
+    limit, text = _take(LIMIT_PATTERN, text)
+    if limit:
+        plan["limit"] = int(limit.group(2))
+        plan["order"] = "asc" if limit.group(1) in ("bottom", "lowest", "smallest") else "desc"
+    elif re.search(r"\b(lowest|smallest|least)\b", text):
+        plan["order"] = "asc"
+
+    for name, pattern in PERIOD_PATTERNS:
+        match, text = _take(pattern, text)
+        if match is None:
+            continue
+        if name == "last_n_months":
+            plan.update(period=name, months=int(match.group(2)))
+        elif name == "last_12_months":
+            plan.update(period="last_n_months", months=12)
+        elif name == "quarter_of_year":
+            quarter, year = (match.group(1), match.group(2)) if match.group(1) else (match.group(4), match.group(3))
+            start = date(int(year), 3 * int(quarter) - 2, 1)
+            plan.update(period="custom", date_from=start, date_to=(pd.Timestamp(start) + pd.offsets.QuarterEnd()).date())
+        elif name == "month_of_year":
+            start = date(int(match.group(2)), MONTHS.index(match.group(1)) + 1, 1)
+            plan.update(period="custom", date_from=start, date_to=(pd.Timestamp(start) + pd.offsets.MonthEnd()).date())
+        elif name == "year":
+            year = int(match.group(1))
+            plan.update(period="custom", date_from=date(year, 1, 1), date_to=date(year, 12, 31))
+        else:
+            plan["period"] = name
+        break
+
+    for name, pattern in GROUP_PATTERNS:
+        match, text = _take(pattern, text)
+        if match:
+            plan["group_by"] = name
+            break
+    if "limit" in plan and "group_by" not in plan:
+        plan["group_by"] = "category"
+
+    metrics = []
+    for name, pattern in METRIC_PATTERNS.items():
+        match, text = _take(pattern, text)
+        while match:
+            if name not in metrics:
+                metrics.append(name)
+            match, text = _take(pattern, text)
+    if metrics:
+        plan["metrics"] = metrics
+
+    if compare is None and re.search(CHANGE_PATTERN, text):
+        compare = "previous_period" if plan.get("period", "all") != "all" else "previous_year"
+    text = re.sub(CHANGE_PATTERN, " ", text)
+    if compare:
+        plan["compare"] = compare
+
+    terms = [term for term in query_terms(text) if term not in FILLER_WORDS and not term.isdigit()]
+    if terms:
+        plan["categories"] = terms
+    return QueryPlan(**plan)
+
+
+def resolve_period(plan: QueryPlan, first: date, last: date) -> Tuple[date, date, Optional[pd.DateOffset]]:
+    """
+    The plan's date range as (start, end) plus the offset to the range
+    of its "previous period": the preceding period of equal length.
+    Relative periods end at ``last``, the dataset's latest data.
+    """
+    month_start = last.replace(day=1)
+    quarter_start = date(last.year, 3 * ((last.month - 1) // 3) + 1, 1)
+
+    def months_before(day: date, months: int) -> date:
+        return (pd.Timestamp(day) - pd.DateOffset(months=months)).date()
+
+    if plan.period == "this_month":
+        return month_start, last, pd.DateOffset(months=1)
+    if plan.period == "last_month":
+        return months_before(month_start, 1), month_start - timedelta(days=1), pd.DateOffset(months=1)
+    if plan.period == "this_quarter":
+        return quarter_start, last, pd.DateOffset(months=3)
+    if plan.period == "last_quarter":
+        return months_before(quarter_start, 3), quarter_start - timedelta(days=1), pd.DateOffset(months=3)
+    if plan.period == "this_year":
+        return date(last.year, 1, 1), last, pd.DateOffset(months=12)
+    if plan.period == "last_year":
+        return date(last.year - 1, 1, 1), date(last.year - 1, 12, 31), pd.DateOffset(months=12)
+    if plan.period == "last_n_months":
+        months = plan.months or 12
+        return months_before(month_start, months - 1), last, pd.DateOffset(months=months)
+    if plan.period == "custom":
+        start, end = plan.date_from or first, plan.date_to or last
+        if start.day == 1 and (end + timedelta(days=1)).day == 1:
+            months = (end.year - start.year) * 12 + end.month - start.month + 1
+            return start, end, pd.DateOffset(months=months)
+        return start, end, pd.DateOffset(days=(end - start).days + 1)
+    # all of the data: nothing precedes it
+    return first, last, None
+
+
+def _change(current: pd.Series, previous: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    change = current - previous
+    return change, (change / previous.abs().where(previous != 0) * 100).round(2)
+
+
+class QueryService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.bind.dialect.name
+
+    @staticmethod
+    def planner() -> str:
+        if settings.QUERY_PLANNER == "auto":
+            return "llm" if settings.OPENAI_API_KEY else "rules"
+        return settings.QUERY_PLANNER
+
+    async def plan(self, question: str) -> Tuple[QueryPlan, str]:
+        """
+        The plan of a question and where it came from ("cache", "llm" or
+        "rules"). Plans are cached by normalised question; a rule plan
+        used because the LLM failed is not cached, so the next ask retries.
+        """
+        normalized = normalize_question(question)
+        planner = self.planner()
+        key = {"question": normalized, "planner": planner, "version": PLANNER_VERSION}
+        cached = await plan_cache.get(PLAN_SCOPE, "plan", **key)
+        if cached is not None:
+            return QueryPlan(**cached), "cache"
+
+        source = "rules"
+        if planner == "llm":
+            try:
+                plan, source = await self._plan_with_llm(question), "llm"
+            except Exception:
+                logger.exception("LLM query planning failed; using the rule parser")
+                return parse_question(question), source
+        else:
+            plan = parse_question(question)
+        await plan_cache.set(PLAN_SCOPE, "plan", plan.model_dump(mode="json"), **key)
+        return plan, source
+
+    @timed("query_plan_llm")
+    async def _plan_with_llm(self, question: str) -> QueryPlan:
+        """The LLM only translates the question into a plan; it never sees the data"""
+        import json
+
+        from app.services.ai_analysis_service import get_openai_client
+
+        response = await get_openai_client().chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "Translate questions about a business's financial records into a JSON query plan "
+                        "matching this JSON schema. Reply with the JSON object only. Use period 'custom' "
+                        "with ISO dates only for explicit dates; relative periods are resolved later. "
+                        f"Schema: {json.dumps(QueryPlan.model_json_schema())}"
+                    )
+                },
+                {"role": "user", "content": question}
+            ],
+            max_tokens=300,
+            temperature=0,
+            response_format={"type": "json_object"}
+        )
+        return QueryPlan.model_validate_json(response.choices[0].message.content)
+
+    async def answer(self, dataset_id: int, question: str) -> Dict[str, Any]:
+        """Plan a question (or reuse its cached plan) and answer it from the dataset's rollups"""
+        plan, source = await self.plan(question)
+
+        async def compute():
+            return await self.execute(dataset_id, plan)
+        result = await analytics_cache.get_or_compute(dataset_id, "query", compute, plan=plan.model_dump(mode="json"))
+        return {"question": question, "plan": plan.model_dump(mode="json"), "plan_source": source, **result}
+
+    async def _matching_categories(self, dataset_id: int, terms: List[str]) -> Tuple[List[str], List[str]]:
+        """Dataset categories containing any term (case-insensitive) and the terms that matched none"""
+        result = await self.db.execute(select(DailyRollup.category).where(DailyRollup.dataset_id == dataset_id).distinct())
+        categories = [category for category in result.scalars().all() if category]
+        matched, unmatched = set(), []
+        for term in terms:
+            lowered = term.lower()
+            hits = [category for category in categories if lowered in category.lower()]
+            matched.update(hits)
+            if not hits:
+                unmatched.append(term)
+        return sorted(matched), unmatched
+
+    @timed("query_execute")
+    async def execute(self, dataset_id: int, plan: QueryPlan) -> Dict[str, Any]:
+        """
+        Run a plan with one aggregate query over the daily rollups.
+
+        Sums are exact integer minor units until the final conversion, so
+        answers agree with the summary and period endpoints. Raises
+        ValueError for an unknown dataset.
+        """
+        currency = await self.db.scalar(select(FinancialDataset.currency).where(FinancialDataset.id == dataset_id))
+        if currency is None:
+            raise ValueError("Dataset not found")
+        currency = currency or DEFAULT_CURRENCY
+        empty = {"currency": currency, "period": None, "comparison_period": None, "totals": [], "rows": [], "ignored_terms": []}
+
+        first, last = (await self.db.execute(
+            select(func.min(DailyRollup.day), func.max(DailyRollup.day)).where(DailyRollup.dataset_id == dataset_id)
+        )).one()
+        if first is None:
+            return {**empty, "answer": "The dataset has no records yet."}
+        first, last = pd.Timestamp(first).date(), pd.Timestamp(last).date()
+
+        if plan.compare == "previous_year" and plan.period == "all":
+            # "revenue vs last year": all of the data has no year before it, so compare the latest 12 months
+            plan = plan.model_copy(update={"period": "last_n_months", "months": 12})
+        start, end, offset = resolve_period(plan, first, last)
+        previous = None
+        if plan.compare == "previous_year":
+            offset = pd.DateOffset(months=12)
+        if plan.compare != "none" and offset is not None:
+            # shifting the day after the end keeps month ends on month ends (Jun 30 -> Mar 31)
+            previous = ((pd.Timestamp(start) - offset).date(), (pd.Timestamp(end + timedelta(days=1)) - offset).date() - timedelta(days=1))
+            # a range longer than a year would overlap its year-earlier copy; the previous window ends where this one starts
+            previous = (previous[0], min(previous[1], start - timedelta(days=1)))
+
+        categories, ignored = await self._matching_categories(dataset_id, plan.categories) if plan.categories else ([], [])
+        frame = await self._totals(dataset_id, plan, (start, end), previous, categories)
+        result = self._shape(frame, plan, currency, start, previous[0] if previous else None)
+        result.update(
+            currency=currency,
+            period={"from": start.isoformat(), "to": end.isoformat()},
+            comparison_period={"from": previous[0].isoformat(), "to": previous[1].isoformat()} if previous else None,
+            categories=categories,
+            ignored_terms=ignored,
+        )
+        result["answer"] = self._describe(plan, result)
+        return result
+
+    async def _totals(
+        self,
+        dataset_id: int,
+        plan: QueryPlan,
+        current: Tuple[date, date],
+        previous: Optional[Tuple[date, date]],
+        categories: List[str]
+    ) -> pd.DataFrame:
+        """Rollup totals per (group key, record type, window), window being "current" or "previous" """
+        windows = [and_(DailyRollup.day >= current[0], DailyRollup.day <= current[1])]
+        if previous:
+            windows.append(and_(DailyRollup.day >= previous[0], DailyRollup.day <= previous[1]))
+        conditions = [DailyRollup.dataset_id == dataset_id, or_(*windows)]
+        if categories:
+            conditions.append(DailyRollup.category.in_(categories))
+
+        columns = [
+            DailyRollup.record_type,
+            # the previous window always lies before the current one
+            case((DailyRollup.day >= current[0], literal("current")), else_=literal("previous")).label("window"),
+            DailyRollup.total_minor,
+            DailyRollup.record_count,
+        ]
+        if plan.group_by in ("category", "record_type"):
+            columns.insert(0, DailyRollup.category.label("key"))
+        elif plan.group_by in ("month", "quarter"):
+            columns.insert(0, month_bucket(DailyRollup.day, self.dialect).label("key"))
+        else:
+            columns.insert(0, literal("total").label("key"))
+
+        # grouped outside a subquery so every dialect groups by plain columns, not repeated expressions
+        rows = select(*columns).where(and_(*conditions)).subquery("rows")
+        result = await self.db.execute(
+            select(
+                rows.c.key, rows.c.record_type, rows.c.window,
+                func.sum(rows.c.total_minor).label("total"),
+                func.sum(rows.c.record_count).label("record_count")
+            ).group_by(rows.c.key, rows.c.record_type, rows.c.window)
+        )
+        frame = pd.DataFrame(result.all(), columns=["key", "record_type", "window", "total", "record_count"])
+        frame[["total", "record_count"]] = frame[["total", "record_count"]].astype(np.int64)
+        if plan.group_by == "record_type":
+            frame["key"] = frame["record_type"]
+        return frame
+
+    def _shape(self, frame: pd.DataFrame, plan: QueryPlan, currency: str, start: date, previous_start: Optional[date]) -> Dict[str, Any]:
+        """Metric values per group and window, compared and ordered as the plan asks"""
+        revenue = frame["total"].where(frame["record_type"] == RecordType.REVENUE.value, 0)
+        expenses = frame["total"].where(frame["record_type"] == RecordType.EXPENSE.value, 0)
+        frame = frame.assign(revenue=revenue, expenses=expenses)
+
+        time_grouped = plan.group_by in ("month", "quarter")
+        if time_grouped:
+            # periods line up by their position in each window: month 1 against month 1
+            months = pd.to_datetime(frame["key"])
+            window_start = pd.to_datetime(frame["window"].map({"current": start, "previous": previous_start}))
+            position = (months.dt.year - window_start.dt.year) * 12 + months.dt.month - window_start.dt.month
+            frame["key"] = position // 3 if plan.group_by == "quarter" else position
+
+        sums = frame.groupby(["key", "window"])[["revenue", "expenses", "record_count"]].sum()
+        values = sums.unstack("window", fill_value=0)
+
+        def window(column: str, name: str) -> pd.Series:
+            if (column, name) in values.columns:
+                return values[(column, name)]
+            return pd.Series(0, index=values.index, dtype=np.int64)
+
+        def metric_values(name: str, window_name: str) -> pd.Series:
+            rev, exp = window("revenue", window_name), window("expenses", window_name)
+            if name == "revenue":
+                return rev
+            if name == "expenses":
+                return exp
+            if name == "profit":
+                return rev - exp
+            if name == "margin":
+                return ((rev - exp) / rev.where(rev > 0) * 100).round(2)
+            return window("record_count", window_name)
+
+        compared = previous_start is not None
+        if time_grouped:
+            # label each position by its current-window period; drop positions the current window lacks
+            current_keys = frame.loc[frame["window"] == "current"].groupby("key")["key"].first().index
+            values = values.loc[values.index.isin(current_keys)]
+            labels = pd.Series(
+                [self._period_label(start, position, plan.group_by) for position in values.index], index=values.index
+            )
+        else:
+            labels = pd.Series(values.index, index=values.index)
+
+        rows, totals = [], []
+        for name in plan.metrics:
+            current = metric_values(name, "current")
+            prior = metric_values(name, "previous") if compared else None
+            table = pd.DataFrame({"group": labels, "value": current})
+            if compared:
+                change, change_pct = _change(current, prior)
+                table = table.assign(previous=prior, change=change, change_pct=change_pct)
+            if plan.group_by in ("category", "record_type"):
+                if name in ("revenue", "expenses"):
+                    # revenue categories have no expenses and vice versa
+                    table = table.loc[(table["value"] != 0) | (table["previous"] != 0 if compared else False)]
+                table = table.sort_values("value", ascending=plan.order == "asc", na_position="last")
+                if plan.limit:
+                    table = table.head(plan.limit)
+            elif time_grouped:
+                table = table.sort_index()
+
+            totals.append(self._total(name, values, compared, currency, window))
+            money = name not in ("margin", "transactions")
+            for record in table.to_dict("records"):
+                rows.append({"metric": name, **{
+                    field: self._number(value, currency, money and field != "change_pct")
+                    for field, value in record.items()
+                }})
+        return {"totals": totals, "rows": rows}
+
+    @staticmethod
+    def _period_label(start: date, position: int, group_by: str) -> str:
+        if group_by == "quarter":
+            month = pd.Timestamp(start) + pd.DateOffset(months=3 * int(position))
+            return f"{month.year}-Q{(month.month - 1) // 3 + 1}"
+        return (pd.Timestamp(start) + pd.DateOffset(months=int(position))).strftime("%Y-%m")
+
+    @staticmethod
+    def _number(value: Any, currency: str, money: bool) -> Any:
+        if isinstance(value, str) or value is None:
+            return value
+        if pd.isna(value):
+            return None
+        if money:
+            return to_number(int(value), currency)
+        return float(value) if isinstance(value, (float, np.floating)) else int(value)
+
+    def _total(self, name: str, values: pd.DataFrame, compared: bool, currency: str, window) -> Dict[str, Any]:
+        def overall(window_name: str) -> Any:
+            rev, exp = int(window("revenue", window_name).sum()), int(window("expenses", window_name).sum())
+            if name == "revenue":
+                return rev
+            if name == "expenses":
+                return exp
+            if name == "profit":
+                return rev - exp
+            if name == "margin":
+                return round((rev - exp) / rev * 100, 2) if rev > 0 else None
+            return int(window("record_count", window_name).sum())
+
+        money = name not in ("margin", "transactions")
+        total = {"metric": name, "value": self._number(overall("current"), currency, money)}
+        if compared:
+            current, prior = overall("current"), overall("previous")
+            change = current - prior if current is not None and prior is not None else None
+            total.update(
+                previous=self._number(prior, currency, money),
+                change=self._number(change, currency, money),
+                change_pct=round(change / abs(prior) * 100, 2) if change is not None and prior else None,
+            )
+        return total
+
+    @staticmethod
+    def _describe(plan: QueryPlan, result: Dict[str, Any]) -> str:
+        """A plain-language answer built from the computed figures only"""
+        currency = result["currency"]
+        span = f"{result['period']['from']} to {result['period']['to']}"
+
+        def amount(metric: str, value: Any) -> str:
+            if value is None:
+                return "n/a"
+            if metric == "margin":
+                return f"{value:.2f}%"
+            if metric == "transactions":
+                return f"{value:,}"
+            return f"{value:,.2f} {currency}"
+
+        sentences = []
+        for total in result["totals"]:
+            metric = total["metric"]
+            sentence = f"{METRIC_LABELS[metric]} for {span}: {amount(metric, total['value'])}"
+            if result["comparison_period"]:
+                previous = f"{amount(metric, total['previous'])} in {result['comparison_period']['from']} to {result['comparison_period']['to']}"
+                if total["change_pct"] is not None:
+                    direction = "up" if total["change_pct"] >= 0 else "down"
+                    sentence += f", {direction} {abs(total['change_pct']):.1f}% from {previous}"
+                else:
+                    sentence += f", against {previous}"
+            sentences.append(sentence + ".")
+
+            grouped = [row for row in result["rows"] if row["metric"] == metric and row["value"] is not None]
+            if plan.group_by in ("category", "record_type") and len(grouped) > 1:
+                leaders = ", ".join(f"{row['group']} ({amount(metric, row['value'])})" for row in grouped[:3])
+                sentences.append(f"{'Lowest' if plan.order == 'asc' else 'Largest'}: {leaders}.")
+            elif plan.group_by in ("month", "quarter") and len(grouped) > 1:
+                best = max(grouped, key=lambda row: row["value"])
+                worst = min(grouped, key=lambda row: row["value"])
+                sentences.append(
+                    f"Highest {plan.group_by}: {best['group']} ({amount(metric, best['value'])}); "
+                    f"lowest: {worst['group']} ({amount(metric, worst['value'])})."
+                )
+        if result["ignored_terms"]:
+            sentences.append(f"No category matched: {', '.join(result['ignored_terms'])}.")
+        return " ".join(sentences)
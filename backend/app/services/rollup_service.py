@@ -0,0 +1,87 @@
+"""
+Rollup Service - Incremental per-day aggregates of financial records
+"""
+
+from datetime import datetime, timedelta, date
+from typing import Union
+
+from sqlalchemy import select, func, and_, delete, insert, cast, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.financial_models import FinancialRecord, DailyRollup
+
+
+def day_bucket(column, dialect: str):
+    """Truncate a timestamp column to its calendar day"""
+    if dialect == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def month_bucket(column, dialect: str):
+    """Truncate a date/timestamp column to the first day of its month"""
+    if dialect == "sqlite":
+        return func.strftime("%Y-%m-01", column)
+    return func.date_trunc("month", column)
+
+
+def _as_date(value: Union[date, datetime]) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+class RollupService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.bind.dialect.name
+
+    async def refresh(self, dataset_id: int, date_from: Union[date, datetime], date_to: Union[date, datetime]) -> None:
+        """
+        Rebuild the daily rollups for the days in [date_from, date_to].
+
+        Only the touched days are deleted and re-aggregated, so a new upload
+        costs a scan of its own date span rather than the whole dataset.
+        """
+        day_from = _as_date(date_from)
+        day_to = _as_date(date_to)
+
+        await self.db.execute(
+            delete(DailyRollup).where(
+                and_(
+                    DailyRollup.dataset_id == dataset_id,
+                    DailyRollup.day >= day_from,
+                    DailyRollup.day <= day_to
+                )
+            )
+        )
+
+        await self.db.execute(
+            insert(DailyRollup).from_select(
+                ["dataset_id", "day", "record_type", "category", "total_minor", "record_count"],
+                self.record_totals(dataset_id, day_from, day_to)
+            )
+        )
+        await self.db.commit()
+
+    def record_totals(self, dataset_id: int, date_from: Union[date, datetime], date_to: Union[date, datetime]):
+        """SELECT of rollup rows (dataset_id, day, record_type, category, total, count) aggregated from raw records"""
+        day_from = _as_date(date_from)
+        day_to = _as_date(date_to)
+        day = day_bucket(FinancialRecord.date, self.dialect)
+        category = func.coalesce(FinancialRecord.category, "Uncategorized")
+        return select(
+            FinancialRecord.dataset_id,
+            day,
+            FinancialRecord.record_type,
+            category,
+            func.sum(FinancialRecord.base_amount_minor),
+            func.count(FinancialRecord.id)
+        ).where(
+            and_(
+                FinancialRecord.dataset_id == dataset_id,
+                FinancialRecord.date >= datetime.combine(day_from, datetime.min.time()),
+                FinancialRecord.date < datetime.combine(day_to + timedelta(days=1), datetime.min.time())
+            )
+        ).group_by(FinancialRecord.dataset_id, day, FinancialRecord.record_type, category)
@@ -0,0 +1,318 @@
+"""
+Scoring Service - Vectorized health and risk scores for every dataset, with daily history
+"""
+
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, dialect_insert
+from app.core.metrics import timed
+from app.core.money import DEFAULT_CURRENCY, exponent
+from app.core.scheduler import job
+from app.models.financial_models import DailyRollup, DatasetScore, FinancialDataset, RecordType
+from app.schemas.financial_schemas import DatasetScoreResponse
+from app.services.fx_service import FxService
+from app.services.rollup_service import month_bucket
+
+# Coefficient of variation of monthly totals above which a dataset counts as volatile
+VOLATILITY_THRESHOLD = 0.5
+# HHI (0-10000) above which revenue counts as concentrated in few categories
+CONCENTRATION_THRESHOLD = 5000
+# Share of active months with a net loss above which risk is raised
+LOSS_MONTH_THRESHOLD = 0.5
+
+FEATURE_COLUMNS = [
+    "total_revenue_minor", "total_expenses_minor", "total_records", "months_active", "last_month",
+    "revenue_volatility", "expense_volatility", "revenue_concentration_hhi",
+    "expense_concentration_hhi", "loss_month_share",
+]
+
+# Rows per upsert statement (17 columns each)
+UPSERT_BATCH_SIZE = 1000
+
+
+def _above(values: Optional[Any], threshold: float, shape) -> np.ndarray:
+    """Element-wise values > threshold; missing features (None or NaN) never count"""
+    if values is None:
+        return np.zeros(shape, dtype=bool)
+    return np.nan_to_num(np.asarray(values, dtype=np.float64), nan=-np.inf) > threshold
+
+
+def health_scores(
+    profit_margin: Any,
+    total_revenue: Any,
+    total_records: Any,
+    revenue_volatility: Any = None,
+    revenue_concentration_hhi: Any = None
+) -> np.ndarray:
+    """
+    Financial health score (1-10) for arrays of datasets.
+
+    The margin, size and volume rules are those the AI analysis has always
+    reported; volatile or concentrated revenue costs half a point each
+    when those features are known.
+    """
+    margin = np.asarray(profit_margin, dtype=np.float64)
+    revenue = np.asarray(total_revenue, dtype=np.float64)
+    records = np.asarray(total_records, dtype=np.float64)
+
+    score = np.full(margin.shape, 5.0)
+    score += np.select([margin > 20, margin > 10, margin < 0], [2.0, 1.0, -3.0], 0.0)
+    score += np.select([revenue > 1000000, revenue < 10000], [1.0, -1.0], 0.0)
+    score += np.where(records > 100, 0.5, 0.0)
+    score -= np.where(_above(revenue_volatility, VOLATILITY_THRESHOLD, margin.shape), 0.5, 0.0)
+    score -= np.where(_above(revenue_concentration_hhi, CONCENTRATION_THRESHOLD, margin.shape), 0.5, 0.0)
+    return np.clip(score, 1.0, 10.0)
+
+
+def risk_scores(
+    profit_margin: Any,
+    total_revenue: Any,
+    revenue_volatility: Any = None,
+    revenue_concentration_hhi: Any = None,
+    loss_month_share: Any = None
+) -> np.ndarray:
+    """Risk score (1-10, higher = more risky) for arrays of datasets; see health_scores"""
+    margin = np.asarray(profit_margin, dtype=np.float64)
+    revenue = np.asarray(total_revenue, dtype=np.float64)
+
+    score = np.full(margin.shape, 5.0)
+    score += np.select([margin < 0, margin < 5, margin > 20], [3.0, 2.0, -2.0], 0.0)
+    score += np.where(revenue < 50000, 1.0, 0.0)
+    score += np.where(_above(revenue_volatility, VOLATILITY_THRESHOLD, margin.shape), 1.0, 0.0)
+    score += np.where(_above(revenue_concentration_hhi, CONCENTRATION_THRESHOLD, margin.shape), 1.0, 0.0)
+    score += np.where(_above(loss_month_share, LOSS_MONTH_THRESHOLD, margin.shape), 1.0, 0.0)
+    return np.clip(score, 1.0, 10.0)
+
+
+def _coefficient_of_variation(matrix: np.ndarray, active: np.ndarray, months_active: np.ndarray) -> np.ndarray:
+    mean = np.where(active, matrix, 0).sum(axis=1) / months_active
+    variance = np.where(active, (matrix - mean[:, None]) ** 2, 0).sum(axis=1) / months_active
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cv = np.sqrt(variance) / mean
+    return np.where((mean > 0) & (months_active >= 2), cv, np.nan)
+
+
+def _hhi(totals: np.ndarray, dataset_index: np.ndarray, category_index: np.ndarray, dataset_count: int) -> np.ndarray:
+    category_count = int(category_index.max()) + 1 if len(category_index) else 1
+    by_category = np.bincount(
+        dataset_index * category_count + category_index, weights=totals, minlength=dataset_count * category_count
+    ).reshape(dataset_count, category_count)
+    overall = by_category.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = by_category / overall[:, None]
+    return np.where(overall > 0, (shares ** 2).sum(axis=1) * 10000, np.nan)
+
+
+@timed("scoring_features")
+def compute_features(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-dataset features from monthly (dataset, month, record type, category) totals.
+
+    The rows are scattered into dense (dataset x month) revenue and expense
+    matrices once; volatility, loss months and concentration for every
+    dataset are then whole-array operations. Volatility is measured over
+    each dataset's own span from its first to its last month with data.
+    """
+    dataset_ids, dataset_index = np.unique(frame["dataset_id"].to_numpy(), return_inverse=True)
+    months = (frame["month"].dt.year * 12 + frame["month"].dt.month - 1).to_numpy()
+    month_index = months - months.min()
+    category_index = pd.factorize(frame["category"])[0]
+    totals = frame["total"].to_numpy(dtype=np.float64)
+    counts = frame["record_count"].to_numpy(dtype=np.float64)
+    is_revenue = (frame["record_type"] == RecordType.REVENUE.value).to_numpy()
+    is_expense = (frame["record_type"] == RecordType.EXPENSE.value).to_numpy()
+    dataset_count, month_count = len(dataset_ids), int(month_index.max()) + 1
+
+    revenue = np.zeros((dataset_count, month_count))
+    expenses = np.zeros((dataset_count, month_count))
+    np.add.at(revenue, (dataset_index[is_revenue], month_index[is_revenue]), totals[is_revenue])
+    np.add.at(expenses, (dataset_index[is_expense], month_index[is_expense]), totals[is_expense])
+
+    first = np.full(dataset_count, month_count)
+    last = np.zeros(dataset_count, dtype=np.int64)
+    np.minimum.at(first, dataset_index, month_index)
+    np.maximum.at(last, dataset_index, month_index)
+    span = np.arange(month_count)
+    active = (span >= first[:, None]) & (span <= last[:, None])
+    months_active = last - first + 1
+
+    return pd.DataFrame({
+        "total_revenue_minor": revenue.sum(axis=1),
+        "total_expenses_minor": expenses.sum(axis=1),
+        "total_records": np.bincount(dataset_index, weights=counts, minlength=dataset_count).astype(np.int64),
+        "months_active": months_active,
+        "last_month": pd.to_datetime(
+            {"year": (last + months.min()) // 12, "month": (last + months.min()) % 12 + 1, "day": 1}
+        ),
+        "revenue_volatility": _coefficient_of_variation(revenue, active, months_active),
+        "expense_volatility": _coefficient_of_variation(expenses, active, months_active),
+        "revenue_concentration_hhi": _hhi(totals[is_revenue], dataset_index[is_revenue], category_index[is_revenue], dataset_count),
+        "expense_concentration_hhi": _hhi(totals[is_expense], dataset_index[is_expense], category_index[is_expense], dataset_count),
+        "loss_month_share": ((revenue - expenses < 0) & active).sum(axis=1) / months_active,
+    }, index=pd.Index(dataset_ids, name="dataset_id"))
+
+
+def _ranks(*keys: np.ndarray) -> np.ndarray:
+    """1-based rank ordering by the keys, first key most significant"""
+    order = np.lexsort(tuple(reversed(keys)))
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(1, len(order) + 1)
+    return ranks
+
+
+class ScoringService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.bind.dialect.name
+
+    async def _monthly_totals(self) -> pd.DataFrame:
+        """Monthly rollup totals of every dataset in one aggregate query"""
+        month = month_bucket(DailyRollup.day, self.dialect).label("month")
+        result = await self.db.execute(
+            select(
+                DailyRollup.dataset_id,
+                month,
+                DailyRollup.record_type,
+                DailyRollup.category,
+                func.sum(DailyRollup.total_minor).label("total"),
+                func.sum(DailyRollup.record_count).label("record_count")
+            ).group_by(DailyRollup.dataset_id, month, DailyRollup.record_type, DailyRollup.category)
+        )
+        frame = pd.DataFrame(result.all(), columns=["dataset_id", "month", "record_type", "category", "total", "record_count"])
+        frame["month"] = pd.to_datetime(frame["month"])
+        return frame
+
+    async def _reporting_revenue(self, features: pd.DataFrame, currencies: pd.Series) -> np.ndarray:
+        """
+        Total revenue in DEFAULT_CURRENCY units, for the size rules. Each
+        dataset converts at the rate of its last active month; NaN when its
+        currency has no rate.
+        """
+        revenue = np.full(len(features), np.nan)
+        fx = FxService(self.db)
+        for code, positions in features.groupby(currencies).indices.items():
+            rates = await fx.rates_on(code, DEFAULT_CURRENCY, features["last_month"].iloc[positions])
+            if rates is not None:
+                revenue[positions] = features["total_revenue_minor"].to_numpy()[positions] / 10 ** exponent(code) * rates
+        return revenue
+
+    async def score_all(self, scored_on: Optional[date] = None) -> int:
+        """Score every dataset with rollups and upsert the day's leaderboard; returns datasets scored"""
+        scored_on = scored_on or date.today()
+        frame = await self._monthly_totals()
+        if frame.empty:
+            return 0
+        features = compute_features(frame)
+        currencies = features.index.map(
+            dict((await self.db.execute(select(FinancialDataset.id, FinancialDataset.currency))).all())
+        ).fillna(DEFAULT_CURRENCY)
+        currencies = pd.Series(currencies, index=features.index)
+
+        revenue = features["total_revenue_minor"].to_numpy()
+        expenses = features["total_expenses_minor"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            margin = np.where(revenue > 0, (revenue - expenses) / revenue * 100, 0.0)
+        reporting_revenue = await self._reporting_revenue(features, currencies)
+
+        health = health_scores(
+            margin, reporting_revenue, features["total_records"],
+            features["revenue_volatility"], features["revenue_concentration_hhi"]
+        )
+        risk = risk_scores(
+            margin, reporting_revenue,
+            features["revenue_volatility"], features["revenue_concentration_hhi"], features["loss_month_share"]
+        )
+        volatility = np.nan_to_num(features["revenue_volatility"].to_numpy(), nan=np.inf)
+        health_rank = _ranks(-health, risk, volatility)
+        risk_rank = _ranks(-risk, health, -np.nan_to_num(features["revenue_volatility"].to_numpy(), nan=-np.inf))
+
+        scores = features.assign(
+            health_score=health,
+            risk_score=risk,
+            health_rank=health_rank,
+            risk_rank=risk_rank,
+            total_revenue=reporting_revenue,
+            profit_margin=margin,
+        ).reset_index()
+        scores = scores.astype(object).where(scores.notna(), None)
+        rows: List[Dict[str, Any]] = [
+            {
+                "dataset_id": int(row["dataset_id"]),
+                "scored_on": scored_on,
+                "health_score": float(row["health_score"]),
+                "risk_score": float(row["risk_score"]),
+                "health_rank": int(row["health_rank"]),
+                "risk_rank": int(row["risk_rank"]),
+                "currency": DEFAULT_CURRENCY,
+                "total_revenue": row["total_revenue"],
+                "profit_margin": row["profit_margin"],
+                "total_records": int(row["total_records"]),
+                "months_active": int(row["months_active"]),
+                "revenue_volatility": row["revenue_volatility"],
+                "expense_volatility": row["expense_volatility"],
+                "revenue_concentration_hhi": row["revenue_concentration_hhi"],
+                "expense_concentration_hhi": row["expense_concentration_hhi"],
+                "loss_month_share": row["loss_month_share"],
+            }
+            for row in scores.to_dict("records")
+        ]
+
+        insert = dialect_insert(self.db)
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            statement = insert(DatasetScore).values(rows[start:start + UPSERT_BATCH_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=["dataset_id", "scored_on"],
+                set_={
+                    **{column: statement.excluded[column] for column in rows[0] if column not in ("dataset_id", "scored_on")},
+                    "calculated_at": func.now(),
+                }
+            )
+            await self.db.execute(statement)
+        await self.db.commit()
+        return len(rows)
+
+    async def latest_scored_on(self) -> Optional[date]:
+        return await self.db.scalar(select(func.max(DatasetScore.scored_on)))
+
+    async def leaderboard(self, order_by: str = "health", limit: int = 50, scored_on: Optional[date] = None) -> List[DatasetScoreResponse]:
+        """One day's scores with dataset names, best health (or highest risk) first"""
+        scored_on = scored_on or await self.latest_scored_on()
+        if scored_on is None:
+            return []
+        rank = DatasetScore.health_rank if order_by == "health" else DatasetScore.risk_rank
+        result = await self.db.execute(
+            select(DatasetScore, FinancialDataset.name.label("dataset_name"))
+            .join(FinancialDataset, FinancialDataset.id == DatasetScore.dataset_id)
+            .where(DatasetScore.scored_on == scored_on)
+            .order_by(rank)
+            .limit(limit)
+        )
+        return [
+            DatasetScoreResponse.model_validate(score).model_copy(update={"dataset_name": name})
+            for score, name in result.all()
+        ]
+
+    async def history(self, dataset_id: int, limit: int = 90) -> List[DatasetScore]:
+        result = await self.db.execute(
+            select(DatasetScore)
+            .where(DatasetScore.dataset_id == dataset_id)
+            .order_by(desc(DatasetScore.scored_on))
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+
+@job("score_datasets", every_seconds=settings.SCORING_INTERVAL_SECONDS)
+async def score_datasets() -> Dict[str, Any]:
+    async with AsyncSessionLocal() as db:
+        return {"datasets_scored": await ScoringService(db).score_all()}
@@ -0,0 +1,141 @@
+"""
+Search Service - Ranked full-text and fuzzy search over record descriptions and categories
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, desc, func, literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import timed
+from app.core.money import to_number
+from app.core.search_index import DatasetIndex, query_terms, search_index
+from app.models.financial_models import SEARCH_CONFIG, FinancialDataset, FinancialRecord, search_document
+
+RESULT_COLUMNS = [
+    FinancialRecord.id,
+    FinancialRecord.date,
+    FinancialRecord.category,
+    FinancialRecord.amount_minor,
+    FinancialRecord.currency,
+    FinancialRecord.description,
+    FinancialRecord.record_type,
+]
+
+
+def _result(row: Any, score: float) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "date": row.date,
+        "category": row.category,
+        "amount": to_number(row.amount_minor, row.currency),
+        "currency": row.currency,
+        "description": row.description,
+        "record_type": row.record_type,
+        "score": round(float(score), 4),
+    }
+
+
+class SearchService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.bind.dialect.name
+
+    @timed("record_search")
+    async def search(
+        self,
+        dataset_id: int,
+        query: str,
+        skip: int = 0,
+        limit: int = 50,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        One page of a dataset's records matching every query word, best match first.
+
+        Words match whole, as a prefix ("inv" finds "invoice") or with a
+        typo or two; Postgres additionally matches stems ("invoices" finds
+        "invoiced"). Raises ValueError for an unknown dataset.
+        """
+        version = await self.db.scalar(select(FinancialDataset.version).where(FinancialDataset.id == dataset_id))
+        if version is None:
+            search_index.drop(dataset_id)
+            raise ValueError("Dataset not found")
+
+        page = {"query": query, "total": 0, "skip": skip, "limit": limit, "results": []}
+        if not query_terms(query):
+            return page
+        if self.dialect == "postgresql":
+            total, results = await self._search_postgres(dataset_id, query, skip, limit, date_from, date_to)
+        else:
+            total, results = await self._search_index(dataset_id, version, query, skip, limit, date_from, date_to)
+        return {**page, "total": total, "results": results}
+
+    async def _search_postgres(self, dataset_id, query, skip, limit, date_from, date_to):
+        """
+        tsvector prefix match on every word, or trigram word similarity for
+        typos, each served by its GIN index (see the FinancialRecord model)
+        """
+        document = search_document(FinancialRecord.description, FinancialRecord.category)
+        tsquery = func.to_tsquery(
+            literal_column(f"'{SEARCH_CONFIG}'"), " & ".join(f"{term}:*" for term in query_terms(query))
+        )
+        conditions = [
+            FinancialRecord.dataset_id == dataset_id,
+            or_(
+                document.op("@@")(tsquery),
+                FinancialRecord.description.op("%>")(query),
+                FinancialRecord.category.op("%")(query),
+            ),
+        ]
+        if date_from:
+            conditions.append(FinancialRecord.date >= date_from)
+        if date_to:
+            conditions.append(FinancialRecord.date <= date_to)
+
+        total = await self.db.scalar(select(func.count()).select_from(FinancialRecord).where(and_(*conditions)))
+        if not total:
+            return 0, []
+        score = (
+            func.ts_rank_cd(document, tsquery)
+            + func.word_similarity(query, func.coalesce(FinancialRecord.description, ""))
+            + func.similarity(func.coalesce(FinancialRecord.category, ""), query)
+        ).label("score")
+        result = await self.db.execute(
+            select(*RESULT_COLUMNS, score)
+            .where(and_(*conditions))
+            .order_by(desc(score), desc(FinancialRecord.date), desc(FinancialRecord.id))
+            .offset(skip)
+            .limit(limit)
+        )
+        return total, [_result(row, row.score) for row in result.all()]
+
+    async def _search_index(self, dataset_id, version, query, skip, limit, date_from, date_to):
+        index = await self._dataset_index(dataset_id, version)
+        hits = index.search(query, date_from, date_to)
+        page = hits[skip:skip + limit]
+        if not page:
+            return len(hits), []
+        result = await self.db.execute(select(*RESULT_COLUMNS).where(FinancialRecord.id.in_([record_id for record_id, _ in page])))
+        rows = {row.id: row for row in result.all()}
+        return len(hits), [_result(rows[record_id], score) for record_id, score in page if record_id in rows]
+
+    async def _dataset_index(self, dataset_id: int, version: int) -> DatasetIndex:
+        """This process's index of the dataset, built on first use and caught up to ``version``"""
+        index = search_index.get(dataset_id) or search_index.create(dataset_id)
+        if index.version != version:
+            result = await self.db.execute(
+                select(FinancialRecord.id, FinancialRecord.date, FinancialRecord.description, FinancialRecord.category)
+                .where(FinancialRecord.dataset_id == dataset_id, FinancialRecord.id > index.synced_id)
+                .order_by(FinancialRecord.id)
+            )
+            for record_id, when, description, category in result.all():
+                index.add(record_id, when, description, category)
+                index.synced_id = record_id
+            index.version = version
+        return index
@@ -0,0 +1,246 @@
+"""
+Simulation Service - Monte Carlo cash-flow scenarios from each category's monthly history
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.compute import map_in_processes
+from app.core.config import settings
+from app.core.metrics import timed
+from app.core.money import exponent
+from app.models.financial_models import FinancialDataset, RecordType
+from app.services.portfolio_service import PortfolioService
+
+METHODS = ("bootstrap", "normal")
+PERCENTILES = (5, 25, 50, 75, 95)
+BANDS = ("revenue", "expenses", "profit", "cash_position")
+
+
+def history_matrix(frame: pd.DataFrame, lookback: int) -> Tuple[np.ndarray, np.ndarray, pd.DatetimeIndex, float]:
+    """
+    Dense (category x month) totals from monthly rollup rows.
+
+    Months without activity inside the span count as zero. Returns the
+    last ``lookback`` months, a revenue flag per row, their month starts
+    and the net of the whole history, used as the opening cash position.
+    """
+    totals = frame.pivot_table(index=["record_type", "category"], columns="month", values="total", aggfunc="sum", fill_value=0)
+    months = pd.date_range(totals.columns.min(), totals.columns.max(), freq="MS")
+    totals = totals.reindex(columns=months, fill_value=0)
+    matrix = totals.to_numpy(dtype=np.float64)
+    is_revenue = (totals.index.get_level_values("record_type") == RecordType.REVENUE.value)
+    opening_cash = float(matrix[is_revenue].sum() - matrix[~is_revenue].sum())
+    return matrix[:, -lookback:], is_revenue, months[-lookback:], opening_cash
+
+
+def _trend_draws(
+    history: np.ndarray, is_revenue: np.ndarray, horizon: int, simulations: int, rng: np.random.Generator
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Each category's least-squares trend projected forward, plus jointly normal residual noise"""
+    months = history.shape[1]
+    t = np.arange(months, dtype=np.float64)
+    centred = t - t.mean()
+    spread = (centred ** 2).sum()
+    slope = (history - history.mean(axis=1, keepdims=True)) @ centred / spread if spread else np.zeros(len(history))
+    intercept = history.mean(axis=1) - slope * t.mean()
+    residuals = history - (intercept[:, None] + slope[:, None] * t)
+
+    future = np.arange(months, months + horizon, dtype=np.float64)
+    expected = np.clip(intercept[:, None] + slope[:, None] * future, 0, None)
+    mean = np.stack([expected[is_revenue].sum(axis=0), expected[~is_revenue].sum(axis=0)], axis=-1)
+    by_type = np.stack([residuals[is_revenue].sum(axis=0), residuals[~is_revenue].sum(axis=0)])
+    covariance = np.cov(by_type) if months > 2 else np.zeros((2, 2))
+
+    draws = mean + rng.multivariate_normal(np.zeros(2), covariance, size=(simulations, horizon), method="eigh")
+    draws = np.clip(draws, 0, None)
+    return draws[..., 0], draws[..., 1]
+
+
+def _growth_pct(simulated: np.ndarray, history: np.ndarray, horizon: int) -> Optional[np.ndarray]:
+    """Percentiles of each path's mean month against the mean of the last ``horizon`` actual months"""
+    base = history[-horizon:].mean()
+    if base <= 0:
+        return None
+    return np.percentile((simulated.mean(axis=1) / base - 1) * 100, PERCENTILES)
+
+
+def simulate_cash_flow(
+    history: np.ndarray,
+    is_revenue: np.ndarray,
+    horizon: int,
+    simulations: int,
+    method: str = "bootstrap",
+    seed: Any = None,
+    opening_cash: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Simulate ``simulations`` paths of the next ``horizon`` months at once.
+
+    ``bootstrap`` resamples whole historical months, so categories keep
+    their co-movement and seasonality mix; ``normal`` fits a linear trend
+    per category and draws revenue and expense residuals from their joint
+    normal distribution. Amounts stay in minor units. Runs in a worker
+    process for portfolio runs, so it only takes and returns plain data.
+    """
+    rng = np.random.default_rng(seed)
+    revenue_history = history[is_revenue].sum(axis=0)
+    expense_history = history[~is_revenue].sum(axis=0)
+
+    if method == "normal":
+        revenue, expenses = _trend_draws(history, is_revenue, horizon, simulations, rng)
+    else:
+        picks = rng.integers(0, history.shape[1], size=(simulations, horizon))
+        revenue, expenses = revenue_history[picks], expense_history[picks]
+
+    profit = revenue - expenses
+    cash_position = opening_cash + np.cumsum(profit, axis=1)
+    paths = {"revenue": revenue, "expenses": expenses, "profit": profit, "cash_position": cash_position}
+
+    return {
+        "bands": {name: np.percentile(paths[name], PERCENTILES, axis=0) for name in BANDS},
+        "horizon_profit": np.percentile(profit.sum(axis=1), PERCENTILES),
+        "probability_negative_profit": (profit < 0).mean(axis=0),
+        "probability_negative_horizon_profit": float((profit.sum(axis=1) < 0).mean()),
+        "probability_negative_cash": (cash_position < 0).mean(axis=0),
+        "revenue_growth_pct": _growth_pct(revenue, revenue_history, horizon),
+        "expense_growth_pct": _growth_pct(expenses, expense_history, horizon),
+    }
+
+
+def _percentiles(values: Optional[np.ndarray], scale: float = 1.0, digits: int = 2) -> Optional[Dict[str, Any]]:
+    if values is None:
+        return None
+    rounded = np.round(np.asarray(values) / scale, digits)
+    return {f"p{p}": rounded[i].tolist() for i, p in enumerate(PERCENTILES)}
+
+
+class SimulationService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.portfolio = PortfolioService(db)
+
+    @staticmethod
+    def _inputs(frame: pd.DataFrame, lookback: int):
+        if frame.empty:
+            return None
+        return history_matrix(frame, lookback)
+
+    @staticmethod
+    def _format(
+        raw: Optional[Dict[str, Any]],
+        inputs,
+        currency: str,
+        horizon: int,
+        simulations: int,
+        method: str
+    ) -> Dict[str, Any]:
+        """JSON-ready forecast in major units of ``currency``"""
+        result = {
+            "currency": currency,
+            "method": method,
+            "simulations": simulations,
+            "horizon_months": horizon,
+            "history_months": 0,
+            "percentiles": list(PERCENTILES),
+            "months": [],
+        }
+        if raw is None:
+            return result
+        _, _, months, opening_cash = inputs
+        scale, digits = 10 ** exponent(currency), exponent(currency)
+        future = pd.date_range(months[-1], periods=horizon + 1, freq="MS")[1:]
+        return {
+            **result,
+            "history_months": len(months),
+            "months": [month.strftime("%Y-%m") for month in future],
+            "opening_cash": round(opening_cash / scale, digits),
+            "bands": {name: _percentiles(raw["bands"][name], scale, digits) for name in BANDS},
+            "horizon_profit": _percentiles(raw["horizon_profit"], scale, digits),
+            "probability_negative_profit": np.round(raw["probability_negative_profit"], 4).tolist(),
+            "probability_negative_horizon_profit": round(raw["probability_negative_horizon_profit"], 4),
+            "probability_negative_cash": np.round(raw["probability_negative_cash"], 4).tolist(),
+            "revenue_growth_pct": _percentiles(raw["revenue_growth_pct"]),
+            "expense_growth_pct": _percentiles(raw["expense_growth_pct"]),
+        }
+
+    @timed("simulation_forecast")
+    async def forecast(
+        self,
+        dataset_id: int,
+        horizon: int = 6,
+        simulations: Optional[int] = None,
+        method: str = "bootstrap",
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Cash-flow scenarios for one dataset in its own currency"""
+        simulations = simulations or settings.SIMULATION_PATHS
+        currency = await self.db.scalar(select(FinancialDataset.currency).where(FinancialDataset.id == dataset_id))
+        if currency is None:
+            raise ValueError("Dataset not found")
+
+        inputs = self._inputs(await self.portfolio.monthly_totals([dataset_id]), settings.SIMULATION_LOOKBACK_MONTHS)
+        raw = None
+        if inputs is not None:
+            history, is_revenue, _, opening_cash = inputs
+            # one dataset is a single vectorized pass: a thread is enough
+            raw = await asyncio.to_thread(
+                simulate_cash_flow, history, is_revenue, horizon, simulations, method, seed, opening_cash
+            )
+        return {"dataset_id": dataset_id, **self._format(raw, inputs, currency, horizon, simulations, method)}
+
+    @timed("simulation_portfolio_forecast")
+    async def portfolio_forecast(
+        self,
+        currency: str,
+        dataset_ids: Optional[List[int]] = None,
+        owner_id: Optional[int] = None,
+        horizon: int = 6,
+        simulations: Optional[int] = None,
+        method: str = "bootstrap",
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Scenarios for the combined portfolio and for each dataset, in ``currency``.
+
+        History comes from the same single grouped query as the other
+        portfolio sections; the simulations then run in parallel across
+        the compute process pool, each with an independent random stream.
+        """
+        simulations = simulations or settings.SIMULATION_PATHS
+        lookback = settings.SIMULATION_LOOKBACK_MONTHS
+        datasets = await self.portfolio.resolve_datasets(dataset_ids, owner_id)
+        frame = pd.DataFrame(columns=["dataset_id", "month", "record_type", "category", "total"])
+        if not datasets.empty:
+            frame = await self.portfolio.convert_totals(
+                await self.portfolio.monthly_totals(datasets["dataset_id"].tolist()), datasets, currency
+            )
+
+        inputs = [self._inputs(frame, lookback)] + [
+            self._inputs(frame[frame["dataset_id"] == dataset_id], lookback) for dataset_id in datasets["dataset_id"]
+        ]
+        streams = np.random.SeedSequence(seed).spawn(len(inputs))
+        runnable = [i for i, entry in enumerate(inputs) if entry is not None]
+        results = await map_in_processes(simulate_cash_flow, [
+            (inputs[i][0], inputs[i][1], horizon, simulations, method, streams[i], inputs[i][3]) for i in runnable
+        ])
+        raw = dict(zip(runnable, results))
+
+        forecasts = [self._format(raw.get(i), entry, currency, horizon, simulations, method) for i, entry in enumerate(inputs)]
+        response = {
+            "currency": currency,
+            "dataset_count": len(datasets),
+            "portfolio": forecasts[0],
+            "datasets": [
+                {"dataset_id": dataset_id, "name": name, "dataset_currency": dataset_currency, "forecast": forecast}
+                for (dataset_id, name, dataset_currency), forecast in zip(datasets.itertuples(index=False), forecasts[1:])
+            ],
+        }
+        if dataset_ids:
+            response["missing_dataset_ids"] = sorted(set(dataset_ids) - set(datasets["dataset_id"].tolist()))
+        return response
@@ -0,0 +1,114 @@
+"""
+Cold-start import budget for API workers.
+
+Imports the application in fresh interpreters with ``python -X importtime``
+and fails when a module that should load lazily (pandas, NumPy, the OpenAI
+SDK) is imported at startup, in any run. Wall time depends on the machine,
+so it is only checked against a baseline recorded on the same machine
+(``--output`` of an earlier run, e.g. on the target branch) plus a
+tolerance, or against an explicit ``--budget-ms``.
+
+    python -m benchmarks.importtime --output baseline.json
+    python -m benchmarks.importtime --baseline baseline.json --tolerance 0.2
+    python -m benchmarks.importtime --budget-ms 1500 --runs 7 --top 15
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Must not be imported by ``import main``; each is loaded on first use
+LAZY_MODULES = ["pandas", "numpy", "openai"]
+
+
+def measure(module: str) -> Dict[str, Dict[str, int]]:
+    """Self and cumulative import time (microseconds) per module, from one fresh interpreter"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    timings: Dict[str, Dict[str, int]] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us)}
+    return timings
+
+
+def run(module: str, runs: int) -> Dict[str, Any]:
+    samples = [measure(module) for _ in range(runs)]
+    totals = [sample[module]["cumulative_us"] for sample in samples]
+    # the run closest to the median represents the breakdown
+    median_us = statistics.median(totals)
+    representative = min(samples, key=lambda sample: abs(sample[module]["cumulative_us"] - median_us))
+    top_level = sorted(
+        ((name, timing["cumulative_us"]) for name, timing in representative.items() if name != module),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": round(median_us / 1000, 1),
+        "min_ms": round(min(totals) / 1000, 1),
+        "max_ms": round(max(totals) / 1000, 1),
+        "eager_lazy_modules": [
+            name for name in LAZY_MODULES
+            if any(loaded == name or loaded.startswith(name + ".") for sample in samples for loaded in sample)
+        ],
+        "slowest": [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in top_level],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the application's cold-start import time")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, help="absolute limit on the median, in ms")
+    parser.add_argument("--baseline", help="JSON written by --output of an earlier run on this machine")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown over the baseline median, as a fraction")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--output")
+    args = parser.parse_args(argv)
+
+    budget_ms = args.budget_ms
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline_ms = json.load(f)["median_ms"]
+        limit_ms = round(baseline_ms * (1 + args.tolerance), 1)
+        budget_ms = limit_ms if budget_ms is None else min(budget_ms, limit_ms)
+
+    result = run(args.module, args.runs)
+    print(f"import {args.module}: median {result['median_ms']} ms "
+          f"(min {result['min_ms']}, max {result['max_ms']}, {args.runs} runs"
+          + (f", budget {budget_ms:g} ms)" if budget_ms is not None else ")"))
+    for entry in result["slowest"][:args.top]:
+        print(f"  {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+
+    failures = []
+    if budget_ms is not None and result["median_ms"] > budget_ms:
+        failures.append(f"median import time {result['median_ms']} ms exceeds the {budget_ms:g} ms budget")
+    for name in result["eager_lazy_modules"]:
+        failures.append(f"{name} is imported at startup; import it where it is used")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({**result, "budget_ms": budget_ms, "failures": failures}, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Seeded synthetic ledger generator.
+
+Produces upload-shaped frames (date, amount, category, description,
+record_type) with a revenue/expense mix, per-category lognormal amounts,
+annual seasonality, a weekday effect and slow growth. The same seed and
+size always yield the same rows, so benchmark runs are comparable across
+commits.
+"""
+
+from typing import Dict, Iterator, Optional
+import io
+
+import numpy as np
+import pandas as pd
+
+# Share of rows per category and the median amount (in currency units)
+REVENUE_CATEGORIES: Dict[str, Dict[str, float]] = {
+    "Sales": {"share": 0.55, "median": 420.0},
+    "Services": {"share": 0.30, "median": 1250.0},
+    "Subscriptions": {"share": 0.15, "median": 49.0},
+}
+EXPENSE_CATEGORIES: Dict[str, Dict[str, float]] = {
+    "Cost of Goods Sold": {"share": 0.30, "median": 260.0},
+    "Salaries": {"share": 0.12, "median": 4200.0},
+    "Rent": {"share": 0.03, "median": 3500.0},
+    "Marketing": {"share": 0.15, "median": 380.0},
+    "Utilities": {"share": 0.08, "median": 190.0},
+    "Software": {"share": 0.12, "median": 85.0},
+    "Travel": {"share": 0.12, "median": 310.0},
+    "Office Supplies": {"share": 0.08, "median": 45.0},
+}
+REVENUE_SHARE = 0.45
+
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+GENERATE_CHUNK_ROWS = 500_000
+
+
+def parse_size(value: str) -> int:
+    """Accept a row count with an optional k/m suffix (10k, 1m, 10m)"""
+    value = value.strip().lower().replace("_", "")
+    if value and value[-1] in SIZE_SUFFIXES:
+        return int(float(value[:-1]) * SIZE_SUFFIXES[value[-1]])
+    return int(value)
+
+
+def _draw(rng: np.random.Generator, rows: int, categories: Dict[str, Dict[str, float]]) -> Dict[str, np.ndarray]:
+    names = np.array(list(categories))
+    shares = np.array([spec["share"] for spec in categories.values()])
+    medians = np.array([spec["median"] for spec in categories.values()])
+    picks = rng.choice(len(names), size=rows, p=shares / shares.sum())
+    amounts = medians[picks] * rng.lognormal(mean=0.0, sigma=0.6, size=rows)
+    return {"category": names[picks], "amount": amounts}
+
+
+def generate_ledger(
+    rows: int,
+    seed: int = 42,
+    start: str = "2021-01-01",
+    years: int = 3,
+    signed_amounts: bool = False
+) -> pd.DataFrame:
+    """
+    Generate ``rows`` ledger entries spread over ``years`` years.
+
+    With ``signed_amounts`` expenses are negative and there is no
+    record_type column, like a bank export; otherwise amounts are positive
+    and record_type is explicit.
+    """
+    rng = np.random.default_rng(seed)
+    span_days = 365 * years
+
+    # seasonality: Q4 peak and a summer dip; growth of ~15% a year
+    day_weights = np.arange(span_days, dtype=float)
+    day_weights = (1.0 + 0.25 * np.cos(2 * np.pi * (day_weights - 335) / 365.0)) * (1.0 + 0.15 * day_weights / 365.0)
+    weekday = (pd.Timestamp(start).dayofweek + np.arange(span_days)) % 7
+    day_weights[weekday >= 5] *= 0.35
+    day_offsets = np.sort(rng.choice(span_days, size=rows, p=day_weights / day_weights.sum()))
+    seconds = rng.integers(8 * 3600, 19 * 3600, size=rows)
+
+    is_revenue = rng.random(rows) < REVENUE_SHARE
+    revenue = _draw(rng, int(is_revenue.sum()), REVENUE_CATEGORIES)
+    expense = _draw(rng, int((~is_revenue).sum()), EXPENSE_CATEGORIES)
+
+    category = np.empty(rows, dtype=object)
+    amount = np.empty(rows, dtype=float)
+    category[is_revenue], amount[is_revenue] = revenue["category"], revenue["amount"]
+    category[~is_revenue], amount[~is_revenue] = expense["category"], expense["amount"]
+
+    # revenue follows the seasonal curve harder than costs do
+    season = 1.0 + 0.2 * np.cos(2 * np.pi * (day_offsets - 335) / 365.0)
+    amount = np.where(is_revenue, amount * season, amount).round(2)
+
+    frame = pd.DataFrame({
+        "date": pd.Timestamp(start) + pd.to_timedelta(day_offsets, unit="D") + pd.to_timedelta(seconds, unit="s"),
+        "amount": np.where(is_revenue | ~signed_amounts, amount, -amount),
+        "category": category,
+        "description": np.char.add("INV-", rng.integers(100000, 999999, size=rows).astype(str)).astype(object),
+    })
+    if not signed_amounts:
+        frame["record_type"] = np.where(is_revenue, "revenue", "expense")
+    return frame
+
+
+def iter_ledger_chunks(rows: int, seed: int = 42, chunk_rows: int = GENERATE_CHUNK_ROWS, **kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Yield a large ledger in independently seeded chunks.
+
+    Each chunk covers the full date span, so every chunk touches every month;
+    that is the worst case for incremental rollup refreshes, which is what
+    the bulk load scenario should measure.
+    """
+    for index, start in enumerate(range(0, rows, chunk_rows)):
+        yield generate_ledger(min(chunk_rows, rows - start), seed=seed + index, **kwargs)
+
+
+def ledger_csv_bytes(frame: pd.DataFrame) -> bytes:
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, date_format="%Y-%m-%d %H:%M:%S")
+    return buffer.getvalue().encode("utf-8")
+
+
+def write_ledger_csv(path: str, rows: int, seed: int = 42, chunk_rows: Optional[int] = None) -> None:
+    """Write a ledger CSV without holding more than one chunk in memory"""
+    with open(path, "wb") as f:
+        for index, chunk in enumerate(iter_ledger_chunks(rows, seed, chunk_rows or GENERATE_CHUNK_ROWS)):
+            data = ledger_csv_bytes(chunk)
+            f.write(data if index == 0 else data.split(b"\n", 1)[1])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic ledger CSV")
+    parser.add_argument("path")
+    parser.add_argument("--rows", default="10k")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    write_ledger_csv(args.path, parse_size(args.rows), args.seed)
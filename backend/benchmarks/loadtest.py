@@ -0,0 +1,320 @@
+"""
+HTTP load test with latency SLOs.
+
+Boots ``main:app`` (or ``simple_main:app``) either in-process over an ASGI
+transport or as a uvicorn server on a local port, replays a weighted mix
+of dashboard reads, uploads and AI calls from concurrent virtual users,
+and reports throughput plus p50/p95/p99 per route. AI calls go to a stub
+OpenAI server with lognormal latency (benchmarks/stub_llm.py).
+
+The run exits non-zero when a route misses its SLO, so it can gate
+worker-count and pool-size changes:
+
+    python -m benchmarks.loadtest --config benchmarks/loadtest_main.json --duration 60 --concurrency 32
+    python -m benchmarks.loadtest --mode port --workers 4 --output /tmp/load.json
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.ledger import generate_ledger, ledger_csv_bytes, parse_size
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), "loadtest_main.json")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class RequestSpec:
+    name: str
+    method: str
+    path: str
+    weight: float
+    json_body: Optional[Dict[str, Any]] = None
+    upload: bool = False
+
+
+@dataclass
+class RouteStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+
+def fill_placeholders(value: Any, dataset_id: Optional[int]) -> Any:
+    """JSON body with every "{dataset_id}" string replaced by the seeded dataset's id"""
+    if isinstance(value, dict):
+        return {key: fill_placeholders(item, dataset_id) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill_placeholders(item, dataset_id) for item in value]
+    return dataset_id if value == "{dataset_id}" else value
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def load_config(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        config = json.load(f)
+    config["requests"] = [
+        RequestSpec(
+            name=item["name"],
+            method=item.get("method", "GET"),
+            path=item["path"],
+            weight=float(item.get("weight", 1)),
+            json_body=item.get("json"),
+            upload=item.get("upload", False),
+        )
+        for item in config["requests"]
+    ]
+    return config
+
+
+class LoadRecorder:
+    def __init__(self):
+        self.routes: Dict[str, RouteStats] = {}
+        self.recording = False
+
+    def record(self, name: str, seconds: float, status: str, failed: bool) -> None:
+        if not self.recording:
+            return
+        stats = self.routes.setdefault(name, RouteStats())
+        stats.latencies.append(seconds)
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        if failed:
+            stats.errors += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        routes = {}
+        for name, stats in sorted(self.routes.items()):
+            latencies = np.array(stats.latencies) * 1000
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            routes[name] = {
+                "requests": len(latencies),
+                "throughput_rps": round(len(latencies) / elapsed, 2),
+                "error_rate": round(stats.errors / len(latencies), 4),
+                "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2),
+                "p99_ms": round(float(p99), 2),
+                "max_ms": round(float(latencies.max()), 2),
+                "statuses": stats.statuses,
+            }
+        total = sum(route["requests"] for route in routes.values())
+        return {"duration_s": round(elapsed, 2), "requests": total, "throughput_rps": round(total / elapsed, 2), "routes": routes}
+
+
+def check_slos(report: Dict[str, Any], slo: Dict[str, Any]) -> List[str]:
+    """Human-readable SLO violations; empty when everything passed"""
+    violations = []
+    default = slo.get("default", {})
+    for name, route in report["routes"].items():
+        targets = {**default, **slo.get("routes", {}).get(name, {})}
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if key in targets and route[key] > targets[key]:
+                violations.append(f"{name}: {key} {route[key]} > {targets[key]}")
+        if "max_error_rate" in targets and route["error_rate"] > targets["max_error_rate"]:
+            violations.append(f"{name}: error_rate {route['error_rate']} > {targets['max_error_rate']}")
+    minimum = slo.get("min_throughput_rps")
+    if minimum is not None and report["throughput_rps"] < minimum:
+        violations.append(f"throughput {report['throughput_rps']} rps < {minimum} rps")
+    return violations
+
+
+async def seed_dataset(rows: int, seed: int) -> int:
+    """Create a dataset holding ``rows`` ledger rows with rollups and KPIs computed"""
+    from app.core.database import AsyncSessionLocal, async_engine, create_schema
+    from app.core.scheduler import get_job_backend
+    from app.services.ingestion_service import IngestionService
+    from benchmarks.scenarios import BenchContext, create_dataset
+
+    await create_schema()
+    ctx = BenchContext(rows=rows, seed=seed, csv_path="")
+    await create_dataset(ctx)
+    if rows:
+        async with AsyncSessionLocal() as db:
+            await IngestionService(db).ingest_dataframe(ctx.dataset_id, generate_ledger(rows, seed))
+        await get_job_backend().drain()
+    await async_engine.dispose()
+    return ctx.dataset_id
+
+
+async def virtual_user(client, specs: List[RequestSpec], weights: np.ndarray, uploads: List[bytes],
+                       dataset_id: Optional[int], deadline: float, rng: np.random.Generator,
+                       recorder: LoadRecorder, think_time: float) -> None:
+    while time.perf_counter() < deadline:
+        spec = specs[rng.choice(len(specs), p=weights)]
+        kwargs: Dict[str, Any] = {}
+        if spec.json_body is not None:
+            kwargs["json"] = fill_placeholders(spec.json_body, dataset_id)
+        if spec.upload:
+            kwargs["files"] = {"file": ("ledger.csv", uploads[rng.integers(len(uploads))], "text/csv")}
+        path = spec.path.format(dataset_id=dataset_id)
+        started = time.perf_counter()
+        try:
+            response = await client.request(spec.method, path, **kwargs)
+            status, failed = str(response.status_code), response.status_code >= 400
+        except Exception as e:
+            status, failed = type(e).__name__, True
+        recorder.record(spec.name, time.perf_counter() - started, status, failed)
+        if think_time:
+            await asyncio.sleep(think_time)
+
+
+async def drive(client, config: Dict[str, Any], args, dataset_id: Optional[int]) -> Dict[str, Any]:
+    specs: List[RequestSpec] = config["requests"]
+    weights = np.array([spec.weight for spec in specs])
+    weights = weights / weights.sum()
+    # pre-rendered so generating CSVs does not compete with the requests being timed
+    uploads = [ledger_csv_bytes(generate_ledger(args.upload_rows, seed=args.seed + 1000 + i)) for i in range(args.upload_variants)]
+
+    recorder = LoadRecorder()
+    deadline = time.perf_counter() + args.warmup + args.duration
+    users = [
+        asyncio.create_task(virtual_user(
+            client, specs, weights, uploads, dataset_id, deadline,
+            np.random.default_rng(args.seed + i), recorder, args.think_time
+        ))
+        for i in range(args.concurrency)
+    ]
+    await asyncio.sleep(args.warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    await asyncio.gather(*users)
+    return recorder.report(time.perf_counter() - started)
+
+
+async def run_in_process(config: Dict[str, Any], args, dataset_id: Optional[int]) -> Dict[str, Any]:
+    import importlib
+    import httpx
+
+    module_name, app_name = config["app"].split(":")
+    app = getattr(importlib.import_module(module_name), app_name)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+            return await drive(client, config, args, dataset_id)
+
+
+async def run_on_port(config: Dict[str, Any], args, dataset_id: Optional[int]) -> Dict[str, Any]:
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", config["app"], "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout, limits=limits) as client:
+            for _ in range(300):
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("server did not become healthy")
+            return await drive(client, config, args, dataset_id)
+    finally:
+        # shutdown drains queued precompute jobs, which still need the stub model
+        server.terminate()
+        try:
+            server.wait(timeout=args.shutdown_timeout)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+async def run(config: Dict[str, Any], args) -> Dict[str, Any]:
+    from benchmarks.stub_llm import start_stub_server
+
+    stub_port = _free_port()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1"
+    stub = await start_stub_server(stub_port, args.llm_latency, args.llm_sigma, args.seed)
+    try:
+        dataset_id = None
+        if config.get("seed_dataset", True):
+            dataset_id = await seed_dataset(args.seed_rows, args.seed)
+        if args.mode == "port":
+            return await run_on_port(config, args, dataset_id)
+        return await run_in_process(config, args, dataset_id)
+    finally:
+        stub.should_exit = True
+        await stub.serve_task
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"{'route':<20}{'reqs':>8}{'rps':>9}{'err%':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, route in report["routes"].items():
+        print(f"{name:<20}{route['requests']:>8}{route['throughput_rps']:>9}{route['error_rate'] * 100:>7.1f}"
+              f"{route['p50_ms']:>10}{route['p95_ms']:>10}{route['p99_ms']:>10}")
+    print(f"total {report['requests']} requests, {report['throughput_rps']} rps over {report['duration_s']}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the API against latency SLOs")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="traffic mix and SLO file")
+    parser.add_argument("--mode", choices=("inprocess", "port"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers in port mode")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before recording")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between a user's requests")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--shutdown-timeout", type=float, default=60.0, help="seconds to let the server drain jobs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-rows", default="50k", help="rows in the pre-loaded dataset")
+    parser.add_argument("--upload-rows", type=int, default=500, help="rows per uploaded CSV")
+    parser.add_argument("--upload-variants", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="median stub model latency (s)")
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="lognormal spread of the stub latency")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite database")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+    args.seed_rows = parse_size(args.seed_rows)
+    config = load_config(args.config)
+
+    with tempfile.TemporaryDirectory(prefix="fa-load-") as workdir:
+        os.environ.update({
+            "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}",
+            "OPENAI_API_KEY": "stub-key",
+            "JOB_BACKEND": "asyncio",
+            "CACHE_BACKEND": "memory",
+            "SCHEDULER_ENABLED": "false",
+            "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        })
+        report = asyncio.run(run(config, args))
+
+    report["config"] = {
+        "app": config["app"], "mode": args.mode, "workers": args.workers, "concurrency": args.concurrency,
+        "seed_rows": args.seed_rows, "llm_latency_s": args.llm_latency,
+    }
+    violations = check_slos(report, config.get("slo", {}))
+    report["slo_violations"] = violations
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    for violation in violations:
+        print(f"SLO violated: {violation}")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
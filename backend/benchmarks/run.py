@@ -0,0 +1,178 @@
+"""
+Benchmark runner.
+
+Generates a seeded ledger, loads it into a fresh dataset and times each
+scenario. Results are written as JSON (one file per commit, size and
+database) so they can be diffed, and ``--compare`` fails the run when a
+scenario's median regresses by more than ``--max-regression``.
+
+SQLite in a temporary directory is the default target. Pass
+``--database-url`` to run against Postgres; the tables are created if
+missing and a new dataset is used for each run.
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.ledger import parse_size, write_ledger_csv
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _configure_environment(database_url: str) -> None:
+    # settings are read at import time, so this must run before importing app
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["JOB_BACKEND"] = "asyncio"
+    os.environ["CACHE_BACKEND"] = "memory"
+    os.environ["SCHEDULER_ENABLED"] = "false"
+    # keeps the precompute job from answering insight prompts during the load
+    os.environ["OPENAI_API_KEY"] = ""
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _summarise(samples: List[float]) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    return {
+        "runs": len(samples),
+        "min_s": round(ordered[0], 6),
+        "median_s": round(statistics.median(ordered), 6),
+        "mean_s": round(statistics.fmean(ordered), 6),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 6),
+        "max_s": round(ordered[-1], 6),
+    }
+
+
+async def run_scenarios(args, csv_path: str) -> Dict[str, Any]:
+    from app.core.database import async_engine, create_schema
+    from app.core.metrics import db_queries
+    from benchmarks.scenarios import SCENARIOS, BenchContext, create_dataset
+    from benchmarks.stub_llm import install_stub_client
+
+    install_stub_client(args.llm_latency)
+    await create_schema()
+    ctx = BenchContext(rows=args.rows, seed=args.seed, csv_path=csv_path)
+    await create_dataset(ctx)
+
+    selected = set(args.scenarios.split(",")) if args.scenarios else None
+    results: Dict[str, Any] = {}
+    try:
+        for item in SCENARIOS:
+            # one-shot scenarios build the state the others read, so they always run
+            if selected and item.name not in selected and item.repeat:
+                continue
+            iterations = args.repeat if item.repeat else 1
+            if item.repeat and args.warmup:
+                await item.func(ctx)
+            samples, extra = [], None
+            queries_before = db_queries.total()
+            for _ in range(iterations):
+                started = time.perf_counter()
+                extra = await item.func(ctx)
+                samples.append(time.perf_counter() - started)
+            result = _summarise(samples)
+            result["queries_per_run"] = (db_queries.total() - queries_before) / iterations
+            if extra:
+                result.update(extra)
+                if "rows" in extra and result["median_s"] > 0:
+                    result["rows_per_s"] = round(extra["rows"] / result["median_s"], 1)
+            results[item.name] = result
+            print(f"{item.name:<22} median {result['median_s'] * 1000:10.2f} ms  "
+                  f"p95 {result['p95_s'] * 1000:10.2f} ms  queries {result['queries_per_run']:.0f}")
+    finally:
+        await async_engine.dispose()
+    return results
+
+
+def compare(results: Dict[str, Any], baseline_path: str, max_regression: float) -> List[str]:
+    """Scenarios whose median is more than ``max_regression`` slower than the baseline"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before or not before["median_s"]:
+            continue
+        change = result["median_s"] / before["median_s"] - 1.0
+        marker = "REGRESSION" if change > max_regression else ""
+        print(f"{name:<22} {before['median_s'] * 1000:10.2f} ms -> {result['median_s'] * 1000:10.2f} ms  {change:+7.1%} {marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the backend benchmark suite")
+    parser.add_argument("--rows", default="10k", help="10k, 100k, 1m, 10m or a row count")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="iterations of each read scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed iterations before measuring (0 or 1)")
+    parser.add_argument("--scenarios", help="comma-separated subset of read scenarios")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite database")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the stub model waits per call")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<commit>-<rows>-<db>.json)")
+    parser.add_argument("--compare", help="baseline result file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed median slowdown, e.g. 0.2 = 20%%")
+    args = parser.parse_args(argv)
+    args.rows = parse_size(args.rows)
+
+    with tempfile.TemporaryDirectory(prefix="fa-bench-") as workdir:
+        database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        _configure_environment(database_url)
+        dialect = database_url.split(":", 1)[0].split("+", 1)[0]
+
+        csv_path = os.path.join(workdir, "ledger.csv")
+        started = time.perf_counter()
+        write_ledger_csv(csv_path, args.rows, args.seed)
+        print(f"generated {args.rows} rows in {time.perf_counter() - started:.1f}s ({dialect})")
+
+        results = asyncio.run(run_scenarios(args, csv_path))
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "rows": args.rows,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "database": dialect,
+            "llm_latency_s": args.llm_latency,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'worktree'}-{args.rows}-{dialect}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_regression)
+        if regressions:
+            print(f"regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Benchmark scenarios.
+
+Each scenario is an async callable taking the run context. One-shot
+scenarios (bulk load, precompute) mutate the database and run once, in
+registration order; repeatable ones are read-only and timed over several
+iterations.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from app.core.database import AsyncSessionLocal
+from app.core.scheduler import get_job_backend
+from app.models.financial_models import FinancialDataset, User
+from app.services.ai_analysis_service import AIAnalysisService
+from app.services.financial_data_service import FinancialDataService
+from app.services.ingestion_service import IngestionService, normalize_upload_frame
+
+from benchmarks.ledger import iter_ledger_chunks
+
+# Rows per ingest call in the bulk load, matching a large chunked upload
+LOAD_CHUNK_ROWS = 200_000
+# Rows per read_csv chunk in the parse scenario
+PARSE_CHUNK_ROWS = 200_000
+PAGE_SIZE = 100
+
+
+@dataclass
+class BenchContext:
+    rows: int
+    seed: int
+    csv_path: str
+    user_id: Optional[int] = None
+    dataset_id: Optional[int] = None
+    counters: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Scenario:
+    name: str
+    func: Callable[[BenchContext], Awaitable[Optional[Dict[str, Any]]]]
+    repeat: bool = True
+
+
+SCENARIOS: List[Scenario] = []
+
+
+def scenario(name: str, repeat: bool = True):
+    def decorator(func):
+        SCENARIOS.append(Scenario(name, func, repeat))
+        return func
+    return decorator
+
+
+async def create_dataset(ctx: BenchContext) -> None:
+    async with AsyncSessionLocal() as db:
+        user = User(username=f"bench-{ctx.seed}-{ctx.rows}-{id(ctx)}", email=f"bench-{id(ctx)}@example.com")
+        db.add(user)
+        await db.flush()
+        dataset = FinancialDataset(name=f"benchmark {ctx.rows} rows", owner_id=user.id)
+        db.add(dataset)
+        await db.commit()
+        ctx.user_id, ctx.dataset_id = user.id, dataset.id
+
+
+@scenario("upload_parse")
+async def upload_parse(ctx: BenchContext) -> Dict[str, Any]:
+    """read_csv + normalisation of the generated file, chunked like the upload path"""
+    parsed = 0
+    for chunk in pd.read_csv(ctx.csv_path, chunksize=PARSE_CHUNK_ROWS):
+        parsed += len(normalize_upload_frame(chunk))
+    return {"rows": parsed}
+
+
+@scenario("bulk_load", repeat=False)
+async def bulk_load(ctx: BenchContext) -> Dict[str, Any]:
+    new_records = 0
+    async with AsyncSessionLocal() as db:
+        service = IngestionService(db)
+        for chunk in iter_ledger_chunks(ctx.rows, ctx.seed, LOAD_CHUNK_ROWS):
+            new_records += (await service.ingest_dataframe(ctx.dataset_id, chunk)).new_records
+    ctx.counters["loaded_records"] = new_records
+    return {"rows": new_records}
+
+
+@scenario("precompute", repeat=False)
+async def precompute(ctx: BenchContext) -> None:
+    """Rollups, KPIs and cache warm-up enqueued by the bulk load"""
+    await get_job_backend().drain()
+
+
+@scenario("reupload_duplicates", repeat=False)
+async def reupload_duplicates(ctx: BenchContext) -> Dict[str, Any]:
+    """Re-ingest the first chunk; every row should be skipped as a duplicate"""
+    chunk = next(iter_ledger_chunks(min(ctx.rows, LOAD_CHUNK_ROWS), ctx.seed, LOAD_CHUNK_ROWS))
+    async with AsyncSessionLocal() as db:
+        stats = await IngestionService(db).ingest_dataframe(ctx.dataset_id, chunk)
+    return {"rows": len(chunk), "new_records": stats.new_records}
+
+
+@scenario("data_summary")
+async def data_summary(ctx: BenchContext) -> None:
+    async with AsyncSessionLocal() as db:
+        await FinancialDataService(db).get_data_summary(ctx.dataset_id)
+
+
+@scenario("revenue_analysis")
+async def revenue_analysis(ctx: BenchContext) -> None:
+    async with AsyncSessionLocal() as db:
+        await FinancialDataService(db).get_revenue_analysis(ctx.dataset_id)
+
+
+@scenario("expense_analysis")
+async def expense_analysis(ctx: BenchContext) -> None:
+    async with AsyncSessionLocal() as db:
+        await FinancialDataService(db).get_expense_analysis(ctx.dataset_id)
+
+
+@scenario("profit_analysis")
+async def profit_analysis(ctx: BenchContext) -> None:
+    async with AsyncSessionLocal() as db:
+        await FinancialDataService(db).get_profit_analysis(ctx.dataset_id)
+
+
+@scenario("record_paging")
+async def record_paging(ctx: BenchContext) -> Dict[str, Any]:
+    """First, middle and last page of the dataset's records"""
+    total = ctx.counters.get("loaded_records", ctx.rows)
+    offsets = [0, max(total // 2 - PAGE_SIZE, 0), max(total - PAGE_SIZE, 0)]
+    async with AsyncSessionLocal() as db:
+        service = FinancialDataService(db)
+        for offset in offsets:
+            await service.get_financial_records(ctx.dataset_id, skip=offset, limit=PAGE_SIZE)
+    return {"pages": len(offsets)}
+
+
+@scenario("ai_context")
+async def ai_context(ctx: BenchContext) -> None:
+    """Full custom analysis against the stub model: queries, context, prompt, save"""
+    async with AsyncSessionLocal() as db:
+        await AIAnalysisService(db).analyze_financial_data(
+            ctx.dataset_id, ctx.user_id, "custom", custom_prompt="Where did margins change the most?"
+        )
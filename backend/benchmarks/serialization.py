@@ -0,0 +1,136 @@
+"""
+CPU cost per request of response serialisation, before and after orjson.
+
+Three apps serve the same data through an in-process ASGI transport:
+
+- ``baseline``: the previous path: ORM rows validated through
+  ``response_model`` and rendered by the stdlib-json JSONResponse.
+- ``orjson``: the current routers (column rows, ORJSONResponse).
+- ``orjson+gzip``: the same behind CompressionMiddleware.
+
+    python -m benchmarks.serialization --rows 100k --limit 1000 --requests 200
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.ledger import generate_ledger, parse_size
+
+
+def _build_apps(analysis: Dict[str, Any]):
+    from fastapi import Depends, FastAPI
+    from fastapi.responses import JSONResponse
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from app.api.endpoints import financial_data
+    from app.core.compression import CompressionMiddleware
+    from app.core.database import get_read_db
+    from app.core.responses import ORJSONResponse
+    from app.schemas.financial_schemas import FinancialRecordResponse
+    from app.services.financial_data_service import FinancialDataService
+
+    def with_analysis(app, response_class=None):
+        # mirrors the analytics routes: a cached dict, returned as-is or wrapped in ORJSONResponse
+        @app.get("/analysis")
+        async def cached_analysis():
+            return response_class(analysis) if response_class else analysis
+        return app
+
+    baseline = with_analysis(FastAPI(default_response_class=JSONResponse))
+
+    @baseline.get("/api/v1/financial-data/datasets/{dataset_id}/records", response_model=List[FinancialRecordResponse])
+    async def baseline_records(dataset_id: int, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
+        return await FinancialDataService(db).get_financial_records(dataset_id, skip, limit)
+
+    current = with_analysis(FastAPI(default_response_class=ORJSONResponse), ORJSONResponse)
+    current.include_router(financial_data.router, prefix="/api/v1/financial-data")
+
+    compressed = with_analysis(FastAPI(default_response_class=ORJSONResponse), ORJSONResponse)
+    compressed.include_router(financial_data.router, prefix="/api/v1/financial-data")
+    compressed.add_middleware(CompressionMiddleware)
+
+    return {"baseline": baseline, "orjson": current, "orjson+gzip": compressed}
+
+
+async def _measure(app, path: str, requests: int, headers: Dict[str, str]) -> Dict[str, Any]:
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        response = await client.get(path, headers=headers)
+        response.raise_for_status()
+        wire_bytes = len(response.content) if "content-encoding" not in response.headers else int(response.headers["content-length"])
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        for _ in range(requests):
+            await client.get(path, headers=headers)
+        cpu = time.process_time() - cpu_started
+        wall = time.perf_counter() - wall_started
+    return {
+        "cpu_ms_per_request": round(cpu / requests * 1000, 3),
+        "wall_ms_per_request": round(wall / requests * 1000, 3),
+        "response_bytes": wire_bytes,
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    from app.core.database import AsyncSessionLocal, async_engine, create_schema
+    from app.services.financial_data_service import FinancialDataService
+    from app.services.ingestion_service import IngestionService
+    from benchmarks.scenarios import BenchContext, create_dataset
+
+    await create_schema()
+    ctx = BenchContext(rows=args.rows, seed=args.seed, csv_path="")
+    await create_dataset(ctx)
+    async with AsyncSessionLocal() as db:
+        await IngestionService(db).ingest_dataframe(ctx.dataset_id, generate_ledger(args.rows, args.seed))
+        analysis = await FinancialDataService(db).get_profit_analysis(ctx.dataset_id)
+
+    apps = _build_apps(analysis)
+    paths = {
+        "records": f"/api/v1/financial-data/datasets/{ctx.dataset_id}/records?limit={args.limit}",
+        "profit_analysis": "/analysis",
+    }
+    results: Dict[str, Any] = {}
+    for payload, path in paths.items():
+        for variant, app in apps.items():
+            headers = {"accept-encoding": "gzip"} if variant.endswith("gzip") else {"accept-encoding": "identity"}
+            result = await _measure(app, path, args.requests, headers)
+            results[f"{payload}/{variant}"] = result
+            print(f"{payload:<16}{variant:<14} cpu {result['cpu_ms_per_request']:8.3f} ms/req  "
+                  f"wall {result['wall_ms_per_request']:8.3f} ms/req  {result['response_bytes']:>10} bytes")
+    await async_engine.dispose()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure response serialisation CPU per request")
+    parser.add_argument("--rows", default="100k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--limit", type=int, default=1000, help="records per page")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--output")
+    args = parser.parse_args(argv)
+    args.rows = parse_size(args.rows)
+
+    with tempfile.TemporaryDirectory(prefix="fa-serial-") as workdir:
+        os.environ.update({
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'serial.db')}",
+            "JOB_BACKEND": "asyncio",
+            "SCHEDULER_ENABLED": "false",
+            "OPENAI_API_KEY": "",
+        })
+        results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"rows": args.rows, "limit": args.limit, "requests": args.requests, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Stand-in for the OpenAI chat completions API.
+
+Benchmarks measure our side of an AI analysis (queries, context
+preparation, prompt building), so the model call is replaced with a
+canned answer after a configurable delay. StubOpenAIClient is used
+in-process; create_stub_app serves the same answer over HTTP for load
+tests, which point OPENAI_BASE_URL at it.
+"""
+
+from types import SimpleNamespace
+import asyncio
+import time
+
+import numpy as np
+
+STUB_ANSWER = (
+    "Revenue grew steadily with a pronounced Q4 peak. Cost of goods sold tracks "
+    "revenue closely; salaries and rent are the largest fixed costs. Margins are "
+    "healthy but marketing spend rose faster than revenue in the last two quarters."
+)
+
+
+class _StubCompletions:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=STUB_ANSWER))])
+
+
+class StubOpenAIClient:
+    """Quacks like openai.AsyncOpenAI for chat.completions.create"""
+
+    def __init__(self, latency: float = 0.0):
+        self.chat = SimpleNamespace(completions=_StubCompletions(latency))
+
+
+def install_stub_client(latency: float = 0.0) -> StubOpenAIClient:
+    """Make the AI service's shared client the stub"""
+    from app.services import ai_analysis_service
+
+    client = StubOpenAIClient(latency)
+    ai_analysis_service._openai_client = client
+    return client
+
+
+def create_stub_app(median_latency: float = 0.8, sigma: float = 0.5, seed: int = 0):
+    """
+    OpenAI-compatible ``POST /v1/chat/completions`` with lognormal latency.
+
+    A median of 0.8s with sigma 0.5 puts p99 around 2.5s, close to what
+    short completions see from the hosted API.
+    """
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    rng = np.random.default_rng(seed)
+    app.state.calls = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(body: dict):
+        app.state.calls += 1
+        if median_latency:
+            await asyncio.sleep(float(median_latency * rng.lognormal(0.0, sigma)))
+        return {
+            "id": f"chatcmpl-stub-{app.state.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_ANSWER},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    return app
+
+
+async def start_stub_server(port: int, median_latency: float = 0.8, sigma: float = 0.5, seed: int = 0):
+    """Serve the stub on 127.0.0.1:port from the running loop; returns the uvicorn server"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(
+        create_stub_app(median_latency, sigma, seed), host="127.0.0.1", port=port, log_level="warning", lifespan="off"
+    ))
+    server.install_signal_handlers = lambda: None
+    server.serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
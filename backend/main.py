@@ -1,18 +1,47 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-import uvicorn
 import os
-from app.api.endpoints import financial_data, ai_analysis, data_upload
-from app.core.database import engine, Base
+from app.api.endpoints import financial_data, ai_analysis, data_upload, events, portfolio
+from app.core.cache import analytics_cache
+from app.core.compression import CompressionMiddleware
+from app.core.compute import shutdown_process_pool
+from app.core.config import settings
+from app.core.database import async_engine, create_schema, pool_metrics, session_router
+from app.core.etag import ETagMiddleware
+from app.core.events import event_bus
+from app.core.metrics import InstrumentationMiddleware, registry, render_pool_metrics
+from app.core.responses import ORJSONResponse
+from app.core.scheduler import get_job_backend
+from app.services.ai_analysis_service import close_openai_client
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create missing tables without blocking the event loop at import time; deployments
+    # that migrate the schema separately skip the round trips with DB_CREATE_SCHEMA=false
+    if settings.DB_CREATE_SCHEMA:
+        await create_schema()
+    job_backend = get_job_backend()
+    if settings.SCHEDULER_ENABLED:
+        await job_backend.start()
+        if settings.FX_RATES_FILE:
+            await job_backend.enqueue("load_fx_rates")
+    yield
+    await job_backend.stop()
+    shutdown_process_pool()
+    await close_openai_client()
+    await analytics_cache.close()
+    await event_bus.close()
+    await session_router.dispose()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Financial Data Analyzer API",
     description="A comprehensive financial data analysis platform with AI-powered insights",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -22,12 +51,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
+)
+app.add_middleware(ETagMiddleware)
+app.add_middleware(InstrumentationMiddleware)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=settings.GZIP_LEVEL,
+    brotli_quality=settings.BROTLI_QUALITY,
 )
 
 # Include API routers
 app.include_router(financial_data.router, prefix="/api/v1/financial-data", tags=["financial-data"])
 app.include_router(ai_analysis.router, prefix="/api/v1/ai-analysis", tags=["ai-analysis"])
 app.include_router(data_upload.router, prefix="/api/v1/data-upload", tags=["data-upload"])
+app.include_router(events.router, prefix="/api/v1/events", tags=["events"])
+app.include_router(portfolio.router, prefix="/api/v1/portfolio", tags=["portfolio"])
 
 @app.get("/")
 async def root():
@@ -37,7 +77,20 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/db-pool")
+async def db_pool_metrics():
+    """Connection pool usage and checkout wait times, for sizing replicas"""
+    return {"pools": pool_metrics.snapshot(), "replicas": session_router.status()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    body = registry.render() + render_pool_metrics(pool_metrics.snapshot(), session_router.status())
+    return Response(body, media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
@@ -3,11 +3,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
 from datetime import datetime, timedelta
+import itertools
 import random
+from app.api.endpoints import events
+from app.core.events import event_bus
 
 # In-memory storage for uploaded files and generated data
 uploaded_files_data = []
 financial_records = []
+# Ids of uploaded files, used as the dataset id of their events; never reused
+upload_ids = itertools.count(1)
 
 app = FastAPI(
     title="Financial Data Analyzer API",
@@ -24,6 +29,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Push uploads to open dashboards instead of having them re-poll
+app.include_router(events.router, prefix="/api/v1/events", tags=["events"])
+
 @app.get("/")
 async def root():
     return {"message": "Financial Data Analyzer API", "version": "1.0.0", "status": "running"}
@@ -173,6 +181,7 @@ async def upload_financial_data(file: UploadFile = File(...)):
         
         # Create file data object
         file_data = {
+            "dataset_id": next(upload_ids),
             "filename": file.filename,
             "dataset_name": file.filename.split('.')[0],
             "total_records": records_count,
@@ -185,6 +194,12 @@ async def upload_financial_data(file: UploadFile = File(...)):
         
         # Store in memory for dashboard to use
         uploaded_files_data.append(file_data)
+        await event_bus.publish(
+            "records_ingested",
+            file_data["dataset_id"],
+            new_records=records_count,
+            total_records=sum(data["total_records"] for data in uploaded_files_data)
+        )
         
         # Return success response
         return {
@@ -3,6 +3,7 @@ import { BrowserRouter as Router, Routes, Route } from 'react-router-dom';
 import { ThemeProvider, createTheme } from '@mui/material/styles';
 import CssBaseline from '@mui/material/CssBaseline';
 import { QueryClient, QueryClientProvider } from 'react-query';
+import useLiveUpdates from './hooks/useLiveUpdates';
 
 // Components
 import Layout from './components/Layout/Layout';
@@ -91,9 +92,16 @@ const theme = createTheme({
   },
 });
 
+// Subscribes to backend change events; must render inside QueryClientProvider
+function LiveUpdates() {
+  useLiveUpdates();
+  return null;
+}
+
 function App() {
   return (
     <QueryClientProvider client={queryClient}>
+      <LiveUpdates />
       <ThemeProvider theme={theme}>
         <CssBaseline />
         <Router>
@@ -0,0 +1,51 @@
+import { useEffect } from 'react';
+import { useQueryClient } from 'react-query';
+
+// Queries showing data derived from financial records
+const LIVE_QUERY_KEYS = ['dashboardData', 'revenueAnalysis', 'expenseAnalysis', 'profitAnalysis', 'dataQuality'];
+
+// Used only when the event stream is unavailable
+const FALLBACK_POLL_INTERVAL = 60 * 1000;
+
+/**
+ * Refresh the analytics queries when the backend pushes a change event
+ * (new records, refreshed rollups, finished analyses) instead of polling.
+ * Falls back to slow polling if the server does not offer the stream.
+ */
+function useLiveUpdates() {
+  const queryClient = useQueryClient();
+
+  useEffect(() => {
+    const refresh = () => {
+      LIVE_QUERY_KEYS.forEach((key) => queryClient.invalidateQueries(key));
+    };
+
+    let fallbackTimer = null;
+    let reconnecting = false;
+    const source = new EventSource('/api/v1/events/stream');
+
+    source.onopen = () => {
+      // events may have been missed while disconnected
+      if (reconnecting) {
+        refresh();
+      }
+      reconnecting = false;
+    };
+    source.onmessage = refresh;
+    source.onerror = () => {
+      reconnecting = true;
+      if (source.readyState === EventSource.CLOSED && !fallbackTimer) {
+        fallbackTimer = setInterval(refresh, FALLBACK_POLL_INTERVAL);
+      }
+    };
+
+    return () => {
+      source.close();
+      if (fallbackTimer) {
+        clearInterval(fallbackTimer);
+      }
+    };
+  }, [queryClient]);
+}
+
+export default useLiveUpdates;
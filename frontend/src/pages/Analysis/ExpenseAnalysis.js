@@ -241,9 +241,6 @@ function ExpenseAnalysis() {
         topExpenses: generateTopExpensesData(summary.total_expenses),
         costOptimization: generateCostOptimizationData(summary.total_expenses)
       };
-    },
-    {
-      refetchInterval: 30 * 1000, // Refresh every 30 seconds
     }
   );
 
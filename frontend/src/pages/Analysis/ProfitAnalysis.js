@@ -225,9 +225,6 @@ function ProfitAnalysis() {
         profitMargins: generateProfitMarginData(summary.total_revenue, summary.total_expenses),
         breakevenAnalysis: generateBreakevenAnalysisData(summary.total_revenue, summary.total_expenses)
       };
-    },
-    {
-      refetchInterval: 30 * 1000, // Refresh every 30 seconds
     }
   );
 
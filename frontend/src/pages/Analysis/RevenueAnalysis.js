@@ -276,9 +276,6 @@ function RevenueAnalysis() {
         expensesByType: generateExpensesByTypeData(summary.total_expenses),
         profitTrend: generateProfitTrendData(summary.total_revenue, summary.total_expenses)
       };
-    },
-    {
-      refetchInterval: 30 * 1000, // Refresh every 30 seconds
     }
   );
 
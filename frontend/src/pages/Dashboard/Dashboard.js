@@ -274,9 +274,6 @@ function Dashboard() {
         revenueByCategory,
         expensesByType
       };
-    },
-    {
-      refetchInterval: 30 * 1000, // Refresh every 30 seconds for demo
     }
   );
 
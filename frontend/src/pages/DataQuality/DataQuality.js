@@ -249,9 +249,6 @@ function DataQuality() {
         distribution,
         recommendations
       };
-    },
-    {
-      refetchInterval: 60 * 1000, // Refresh every minute
     }
   );
 